@@ -0,0 +1,105 @@
+"""
+Discovery under a synthetic CAMPAIR-HSEC flood: `rate` datagrams per second
+from `cameras` source sockets in another process, received either by a RAW
+UDP SocketServer (its raw datagram loop and the message dispatcher) or by a
+bare recvfrom loop that checks the one pattern inline, a stricter baseline
+than discovery before the SocketServer loop, which also printed every
+datagram. Reports what arrived and the receiver's CPU time per 1000 datagrams.
+
+    python -m benchmarks.datagram_flood [rate] [seconds] [cameras]
+"""
+import multiprocessing
+import socket
+import sys
+import threading
+import time
+
+from package.camera_server.constants import Messages
+from package.socket_server_lib import constants
+from package.socket_server_lib.socket_server import SocketServer
+
+def _run_sender(port: int, rate: int, seconds: float, cameras: int, sent):
+    sockets = [socket.socket(socket.AF_INET, socket.SOCK_DGRAM) for _ in range(cameras)]
+    messages = [Messages.CAMERA_PAIRING_QUERY[0] + constants.Options.MESSAGE_SEPARATOR + f"12:34:56:00:{i // 256:02x}:{i % 256:02x}".encode() for i in range(cameras)]
+    count = 0
+    started = time.perf_counter()
+    while True:
+        elapsed = time.perf_counter() - started
+        if elapsed >= seconds:
+            break
+        # Catch up to the schedule, then sleep a millisecond
+        for _ in range(int(elapsed * rate) - count):
+            index = count % cameras
+            sockets[index].sendto(messages[index], ("127.0.0.1", port))
+            count += 1
+        time.sleep(0.001)
+    sent.value = count
+
+def server_receiver(received: list) -> tuple:
+    server = SocketServer("127.0.0.1", None, protocol=constants.ServerProtocol.UDP, logger=0)
+
+    def on_pairing_query(client, fields):
+        if len(fields) == 2:
+            received[0] += 1
+            bytes(fields[1]).decode()
+
+    server.add_custom_message_callback(Messages.CAMERA_PAIRING_QUERY, on_pairing_query)
+    server.start()
+    return server.port, server.get_receive_stats
+
+def recvfrom_receiver(received: list) -> tuple:
+    # One recvfrom, split and pattern check per datagram, nothing else
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 65536 * 3)
+    sock.bind(("127.0.0.1", 0))
+    sock.settimeout(1)
+    tag = Messages.CAMERA_PAIRING_QUERY[0]
+
+    def loop():
+        while True:
+            try:
+                data, addr = sock.recvfrom(1024)
+                data = data.split(constants.Options.MESSAGE_SEPARATOR)
+            except socket.timeout:
+                continue
+            if len(data) == 2 and data[0] == tag:
+                received[0] += 1
+                data[1].decode()
+
+    threading.Thread(target=loop, daemon=True).start()
+    return sock.getsockname()[1], lambda: {}
+
+def run(receiver, rate: int = 10_000, seconds: float = 5.0, cameras: int = 1000) -> dict:
+    received = [0]
+    port, receive_stats = receiver(received)
+
+    context = multiprocessing.get_context("spawn")
+    sent = context.Value("q", 0)
+    sender = context.Process(target=_run_sender, args=(port, rate, seconds, cameras, sent), daemon=True)
+
+    cpu_started = time.process_time()
+    sender.start()
+    sender.join()
+    time.sleep(0.5) # let the receiver drain
+    cpu = time.process_time() - cpu_started
+
+    results = {
+        "sent": sent.value,
+        "received": received[0],
+        "lost_percent": 100 * (1 - received[0] / sent.value) if sent.value else 0,
+        "cpu_ms_per_1000": cpu / received[0] * 1e6 if received[0] else 0,
+    }
+    stats = receive_stats()
+    if stats.get("datagram_batches"):
+        results["datagrams_per_batch"] = stats["datagrams_per_batch"]
+    return results
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    rate = int(args[0]) if len(args) > 0 else 10_000
+    seconds = float(args[1]) if len(args) > 1 else 5.0
+    cameras = int(args[2]) if len(args) > 2 else 1000
+
+    for name, receiver in (("recvfrom", recvfrom_receiver), ("server", server_receiver)):
+        results = run(receiver, rate, seconds, cameras)
+        print(name, "  ".join(f"{key} {value:.1f}" if isinstance(value, float) else f"{key} {value}" for key, value in results.items()))
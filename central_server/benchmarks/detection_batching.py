@@ -0,0 +1,96 @@
+"""
+Detection frames/s and p95 latency, batched across cameras against one
+frame per forward pass. `cameras` threads put frames into a
+LatestFrameMailbox at `fps` each and one loop consumes it the way
+CameraServer.__handle_frame_queue does: get_batch, decode at
+DETECTION_DECODE_SIZE, detect_frames. Latency is frame put -> detections
+ready. The one-by-one rows use batch size 1 (predict), and "track" is the
+old detect_frame path, yolo.track on a single frame.
+
+    python -m benchmarks.detection_batching [cameras] [fps per camera] [seconds]
+
+Needs ultralytics and assets/yolov8s.pt, run from central_server. The
+frames come from assets/jumpscare.mp4.
+"""
+import sys
+import threading
+import time
+
+import cv2
+
+from package.camera_server.constants import Constants
+from package.camera_server.frame import Frame
+from package.camera_server.frame_mailbox import LatestFrameMailbox
+from package.camera_server.movement_detection import MovementDetector
+from package.socket_server_lib.logger import DefaultLogger
+
+def test_jpegs(path: str = "assets/jumpscare.mp4", count: int = 30) -> list:
+    capture = cv2.VideoCapture(path)
+    jpegs = []
+    while len(jpegs) < count:
+        ok, image = capture.read()
+        if not ok:
+            break
+        jpegs.append(cv2.imencode(".jpg", image)[1].tobytes())
+    capture.release()
+    if not jpegs:
+        raise RuntimeError(f"No frames read from {path}")
+    return jpegs
+
+def _camera(mailbox: LatestFrameMailbox, index: int, jpegs: list, fps: float, stop: threading.Event):
+    mac = f"12:34:56:00:00:{index:02x}"
+    due = time.monotonic()
+    frame_index = index
+    while not stop.is_set():
+        mailbox.put(mac, Frame(mac, jpegs[frame_index % len(jpegs)]))
+        frame_index += 1
+        due += 1 / fps
+        stop.wait(max(0.0, due - time.monotonic()))
+
+def run(detector: MovementDetector, jpegs: list, batch_size: int, cameras: int = 8, fps: float = 5.0, seconds: float = 20.0, track: bool = False) -> dict:
+    mailbox = LatestFrameMailbox()
+    stop = threading.Event()
+    for index in range(cameras):
+        threading.Thread(target=_camera, args=(mailbox, index, jpegs, fps, stop), daemon=True).start()
+
+    latencies = []
+    detected = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        batch = mailbox.get_batch(batch_size, Constants.DETECTION_BATCH_MAX_WAIT if batch_size > 1 else 0)
+        images = [frame.downscaled(Constants.DETECTION_DECODE_SIZE)[0].copy() for _, frame, _ in batch]
+        if track:
+            for image in images:
+                detector.yolo.track(image, stream=False, verbose=False)
+        else:
+            detector.detect_frames(images, draw_box=True)
+        now = time.monotonic()
+        latencies += [now - frame.received_at for _, frame, _ in batch]
+        detected += len(batch)
+    elapsed = time.perf_counter() - started
+    stop.set()
+
+    latencies.sort()
+    return {
+        "frames_per_second": detected / elapsed,
+        "p95_latency_ms": latencies[int(len(latencies) * 0.95)] * 1000 if latencies else 0,
+        "coalesced_percent": 100 * mailbox.coalesced / mailbox.put_count if mailbox.put_count else 0,
+    }
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    cameras = int(args[0]) if len(args) > 0 else 8
+    fps = float(args[1]) if len(args) > 1 else 5.0
+    seconds = float(args[2]) if len(args) > 2 else 20.0
+
+    detector = MovementDetector(DefaultLogger(), threshold=Constants.RED_ZONE_DETECTION_THRESHOLD, cuda_batch_size=Constants.DETECTION_BATCH_SIZE_CUDA)
+    jpegs = test_jpegs()
+    # Warm up, the first passes allocate
+    detector.detect_frames([Frame("warmup", jpegs[0]).downscaled(Constants.DETECTION_DECODE_SIZE)[0].copy()] * 2)
+
+    print(f"{cameras} cameras at {fps} fps, {seconds} s per row")
+    print(f"default batch size on this machine: {detector.batch_size}")
+    rows = [("track", 1, True)] + [(f"batch {size}", size, False) for size in sorted({1, 2, 4, Constants.DETECTION_BATCH_SIZE_CUDA})]
+    for name, size, track in rows:
+        results = run(detector, jpegs, size, cameras, fps, seconds, track)
+        print(f"{name:10} {results['frames_per_second']:7.2f} frames/s  p95 {results['p95_latency_ms']:8.1f} ms  coalesced {results['coalesced_percent']:5.1f}%")
@@ -0,0 +1,94 @@
+"""
+Cost of turning one received CAMFRAME-HSEC message into the frame's JPEG,
+for 50-200 KB frames:
+
+- split: what the server did before binary framing, bytes.split on NUL then
+  re-joining the JPEG's pieces
+- nul_fields: _decode_message on the NUL framing (memoryview fields), then
+  the same re-join
+- binary_fields: _decode_message on BINARY_FIELDS, the JPEG is one field
+  and copied out as the server did before frames got their own receive buffer
+- binary_owned: the same, the JPEG field is kept as a view the way
+  CameraServer.__handle_frame keeps it now
+
+    python -m benchmarks.frame_parse [repeat]
+"""
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from package.camera_server.constants import Messages
+from package.socket_server_lib import constants
+from package.socket_server_lib.client import SocketClient
+from package.socket_server_lib.socket_server import SocketServer
+
+def test_jpeg(target_size: int) -> bytes:
+    """Noise image grown until its JPEG is about target_size bytes"""
+    rng = np.random.default_rng(0)
+    width = 64
+    while True:
+        image = cv2.resize(rng.integers(0, 255, (width // 8, width // 8, 3), dtype=np.uint8), (width, width * 9 // 16), interpolation=cv2.INTER_LINEAR)
+        jpeg = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()
+        if len(jpeg) >= target_size:
+            return jpeg
+        width += 32
+
+def per_call_us(function, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - started) / repeat * 1e6
+
+def run(jpeg: bytes, repeat: int = 500) -> dict:
+    server = SocketServer("127.0.0.1", 0, logger=0)
+    separator = constants.Options.MESSAGE_SEPARATOR
+    tag = Messages.CAMERA_FRAME[0]
+    field_size = constants.Options.FIELD_SIZE_BYTE_LENGTH
+
+    nul_message = tag + separator + jpeg
+    binary_message = (
+        constants.Options.BINARY_FIELDS_VERSION.to_bytes(1, 'big')
+        + len(tag).to_bytes(field_size, 'big') + tag
+        + len(jpeg).to_bytes(field_size, 'big') + jpeg
+    )
+    nul_client = SocketClient(None, ("bench", 0))
+    binary_client = SocketClient(None, ("bench", 1), constants.DataTransferOptions.WITH_SIZE | constants.DataTransferOptions.BINARY_FIELDS)
+    options = constants.DataTransferOptions.WITH_SIZE
+
+    def split():
+        fields = nul_message.split(separator)
+        return separator.join(fields[1:])
+
+    def nul_fields():
+        fields = server._decode_message(nul_client, nul_message, options)
+        return bytes(fields[1]) if len(fields) == 2 else separator.join(fields[1:])
+
+    def binary_fields():
+        fields = server._decode_message(binary_client, binary_message, options)
+        return bytes(fields[1]) if len(fields) == 2 else separator.join(fields[1:])
+
+    def binary_owned():
+        fields = server._decode_message(binary_client, binary_message, options)
+        jpeg = fields[1] if len(fields) == 2 else separator.join(fields[1:])
+        return bytes(jpeg) if binary_client.shares_recv_buffer(jpeg) else jpeg
+
+    for parse in (split, nul_fields, binary_fields, binary_owned):
+        assert parse() == jpeg
+
+    return {
+        "fields": nul_message.count(separator) + 1,
+        "split_us": per_call_us(split, repeat),
+        "nul_fields_us": per_call_us(nul_fields, repeat),
+        "binary_fields_us": per_call_us(binary_fields, repeat),
+        "binary_owned_us": per_call_us(binary_owned, repeat),
+    }
+
+if __name__ == "__main__":
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    print(f"{'jpeg':>8} {'fields':>7} {'split us':>9} {'nul us':>9} {'binary us':>10} {'owned us':>9}")
+    for target in (50_000, 100_000, 200_000):
+        jpeg = test_jpeg(target)
+        results = run(jpeg, repeat)
+        print(f"{len(jpeg):8} {results['fields']:7} {results['split_us']:9.1f} {results['nul_fields_us']:9.1f} {results['binary_fields_us']:10.1f} {results['binary_owned_us']:9.1f}")
@@ -0,0 +1,97 @@
+"""
+Camera ingest throughput against the number of CameraIngestCluster-style
+worker processes. Each worker binds one port with SO_REUSEPORT and does the
+per-frame work that doesn't need the detector: framing, rejoining the JPEG
+and the detection-size decode. Cameras are threads sending as fast as the
+workers take it.
+
+    python -m benchmarks.ingest_scaling [cameras] [seconds] [max workers]
+
+Linux only (SO_REUSEPORT). The speedup can't exceed the number of cores.
+"""
+import multiprocessing
+import os
+import socket
+import sys
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from package.camera_server.constants import Constants, Messages
+from package.camera_server.frame import Frame
+from package.socket_server_lib import constants
+from package.socket_server_lib.socket_server import SocketServer
+
+def test_jpeg(size=(1280, 720)) -> bytes:
+    rng = np.random.default_rng(0)
+    image = cv2.resize(rng.integers(0, 255, (size[1] // 16, size[0] // 16, 3), dtype=np.uint8), size)
+    return cv2.imencode(".jpg", image)[1].tobytes()
+
+def _run_worker(port: int, frames, ready):
+    def on_frame(client, fields):
+        jpeg = constants.Options.MESSAGE_SEPARATOR.join(fields[1:])
+        Frame("bench", jpeg).downscaled(Constants.DETECTION_DECODE_SIZE)
+        with frames.get_lock():
+            frames.value += 1
+
+    server = SocketServer("127.0.0.1", port, logger=0, reserve_port=False, reuse_port=True)
+    server.add_custom_message_callback(Messages.CAMERA_FRAME, on_frame)
+    server.start()
+    ready.set()
+    threading.Event().wait()
+
+def _camera(port: int, message: bytes, stop: threading.Event):
+    with socket.create_connection(("127.0.0.1", port)) as sock:
+        try:
+            while not stop.is_set():
+                sock.sendall(message)
+        except OSError:
+            pass # the workers are gone
+
+def run(cameras: int = 16, seconds: float = 5.0, workers: int = 1) -> float:
+    """Frames per second over `seconds`, after a one second warm up"""
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+
+    body = Messages.CAMERA_FRAME[0] + constants.Options.MESSAGE_SEPARATOR + test_jpeg()
+    message = len(body).to_bytes(constants.Options.MESSAGE_SIZE_BYTE_LENGTH, 'big') + body
+
+    context = multiprocessing.get_context("spawn")
+    frames = context.Value("q", 0)
+    processes = []
+    for _ in range(workers):
+        ready = context.Event()
+        process = context.Process(target=_run_worker, args=(port, frames, ready), daemon=True)
+        process.start()
+        ready.wait()
+        processes.append(process)
+
+    stop = threading.Event()
+    for _ in range(cameras):
+        threading.Thread(target=_camera, args=(port, message, stop), daemon=True).start()
+
+    time.sleep(1)
+    start_count, started = frames.value, time.perf_counter()
+    time.sleep(seconds)
+    fps = (frames.value - start_count) / (time.perf_counter() - started)
+
+    stop.set()
+    for process in processes:
+        process.terminate()
+    return fps
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    cameras = int(args[0]) if len(args) > 0 else 16
+    seconds = float(args[1]) if len(args) > 1 else 5.0
+    max_workers = int(args[2]) if len(args) > 2 else os.cpu_count()
+
+    print(f"{os.cpu_count()} cores, {cameras} cameras")
+    baseline = None
+    for workers in sorted({w for w in (1, 2, 4) if w < max_workers} | {max_workers}):
+        fps = run(cameras, seconds, workers)
+        baseline = baseline or fps
+        print(f"{workers:2} workers {fps:8.1f} frames/s  x{fps / baseline:.2f}")
@@ -0,0 +1,72 @@
+"""
+Per-message logging cost on the frame path, the old print logger against
+the leveled one. The disabled debug call is the one __handle_client makes
+for every received frame, with the frame's fields as an argument. Output
+goes to os.devnull, so this is the logger's own cost and not the terminal's.
+
+    python -m benchmarks.logging_cost [repeat]
+"""
+import contextlib
+import inspect
+import os
+import sys
+import time
+
+from package.socket_server_lib.logger import DefaultLogger, LogLevel, QueuedSink
+
+class OldDefaultLogger:
+    """socket_server.DefaultLogger before the leveled logger, kept as the reference"""
+
+    def _prefix(self):
+        frame = inspect.stack()[2]  # 0: _prefix, 1: error(), 2: caller
+        filename = frame.filename.split("/")[-1]
+        lineno = frame.lineno
+        return f"[{filename}:{lineno}]"
+
+    def info(self, message: str):
+        print(f"INFO: {message}")
+
+    def error(self, message: str):
+        print(f"ERROR {self._prefix()}: {message}")
+
+    def debug(self, message: str):
+        pass
+
+class FileSink:
+    def __init__(self, file):
+        self.file = file
+
+    def write(self, line: str):
+        print(line, file=self.file)
+
+def per_call_us(function, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - started) / repeat * 1e6
+
+def run(repeat: int = 2000) -> dict:
+    addr = ("192.168.1.20", 50000)
+    # A NUL framed 100 KB JPEG arrives as hundreds of fields
+    fields = [b"CAMFRAME-HSEC"] + [os.urandom(160) for _ in range(640)]
+
+    results = {}
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        old = OldDefaultLogger()
+        new = DefaultLogger(sink=FileSink(devnull))
+        queued = DefaultLogger(sink=QueuedSink(FileSink(devnull), max_queue=repeat * 2))
+
+        results["debug_old_us"] = per_call_us(lambda: old.debug(f"Data received from {addr}: {fields}"), repeat)
+        results["debug_new_us"] = per_call_us(lambda: new.debug("Data received from %s: %s", addr, fields), repeat)
+        results["info_old_us"] = per_call_us(lambda: old.info(f"Client {addr} disconnected"), repeat)
+        results["info_new_us"] = per_call_us(lambda: new.info("Client %s disconnected", addr), repeat)
+        results["info_queued_us"] = per_call_us(lambda: queued.info("Client %s disconnected", addr), repeat)
+        results["error_old_us"] = per_call_us(lambda: old.error(f"Error receiving raw bytes from {addr}: timed out"), repeat)
+        results["error_new_us"] = per_call_us(lambda: new.error("Error receiving raw bytes from %s: %s", addr, "timed out"), repeat)
+        results["debug_enabled_new_us"] = per_call_us(lambda: DefaultLogger(LogLevel.DEBUG, sink=new.sink).debug("Data received from %s: %s", addr, fields), repeat // 10)
+    return results
+
+if __name__ == "__main__":
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    for key, value in run(repeat).items():
+        print(f"{key:24} {value:10.2f}")
@@ -0,0 +1,101 @@
+"""
+CPU per camera for red zone checks with and without the MotionGate, on
+recorded footage and the real detector. A camera's checked frames (every
+FRAMES_BETWEEN_RED_ZONE_CHECKS-th frame of the footage, as
+CameraServer.__handle_frame queues them) go through what
+__handle_frame_queue does for one camera:
+
+- before: every checked frame is decoded at DETECTION_DECODE_SIZE and
+  goes to detect_frames
+- gated: MotionGate.has_motion first, only frames with motion in the red
+  zone are decoded and detected
+
+"static" is the first frame of the first footage held still with sensor
+noise, the common case for a home camera. CPU is process time over the
+footage's real duration, so 100% is one core per camera.
+
+    python -m benchmarks.motion_gate [loops] [sensitivity] [footage ...]
+
+Needs ultralytics and assets/yolov8s.pt, run from central_server. The
+footage defaults to assets/jumpscare.mp4 and assets/jumpscare2.mp4, looped
+`loops` times.
+"""
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from package.camera_server.constants import Constants
+from package.camera_server.frame import Frame
+from package.camera_server.motion_gate import MotionGate
+from package.camera_server.movement_detection import MovementDetector
+from package.socket_server_lib.logger import DefaultLogger
+
+def checked_jpegs(path: str, every: int) -> tuple:
+    """(every every-th frame as JPEG, seconds of footage they cover, (width, height))"""
+    capture = cv2.VideoCapture(path)
+    fps = capture.get(cv2.CAP_PROP_FPS) or 30
+    jpegs, index, size = [], 0, None
+    while True:
+        ok, image = capture.read()
+        if not ok:
+            break
+        if index % every == 0:
+            jpegs.append(cv2.imencode(".jpg", image)[1].tobytes())
+            size = (image.shape[1], image.shape[0])
+        index += 1
+    capture.release()
+    if not jpegs:
+        raise RuntimeError(f"No frames read from {path}")
+    return jpegs, index / fps, size
+
+def static_jpegs(path: str, count: int, every: int) -> tuple:
+    """The footage's first frame `count` times with fresh noise, as a still camera sends it"""
+    capture = cv2.VideoCapture(path)
+    fps = capture.get(cv2.CAP_PROP_FPS) or 30
+    ok, image = capture.read()
+    capture.release()
+    if not ok:
+        raise RuntimeError(f"No frames read from {path}")
+    rng = np.random.default_rng(0)
+    jpegs = []
+    for _ in range(count):
+        noisy = np.clip(image.astype(np.int16) + rng.normal(0, 2, image.shape).astype(np.int16), 0, 255).astype(np.uint8)
+        jpegs.append(cv2.imencode(".jpg", noisy)[1].tobytes())
+    return jpegs, count * every / fps, (image.shape[1], image.shape[0])
+
+def run(detector: MovementDetector, jpegs: list, red_zone: list, gate: MotionGate | None, sensitivity: int, loops: int) -> dict:
+    mac = "12:34:56:00:00:01"
+    detected = 0
+    cpu_started = time.process_time()
+    for _ in range(loops):
+        for jpeg in jpegs:
+            frame = Frame(mac, jpeg)
+            if gate is not None and not gate.has_motion(mac, frame, red_zone, sensitivity):
+                continue
+            image, _ = frame.downscaled(Constants.DETECTION_DECODE_SIZE)
+            detector.detect_frames([image.copy()], draw_box=True)
+            detected += 1
+    return {"cpu_seconds": time.process_time() - cpu_started, "checked": len(jpegs) * loops, "detected": detected}
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    loops = int(args[0]) if len(args) > 0 else 5
+    sensitivity = int(args[1]) if len(args) > 1 else MotionGate.DEFAULT_SENSITIVITY
+    paths = args[2:] or ["assets/jumpscare.mp4", "assets/jumpscare2.mp4"]
+    every = Constants.FRAMES_BETWEEN_RED_ZONE_CHECKS
+
+    detector = MovementDetector(DefaultLogger(), threshold=Constants.RED_ZONE_DETECTION_THRESHOLD, batch_size=1)
+    footage = [(path, *checked_jpegs(path, every)) for path in paths]
+    footage.append(("static", *static_jpegs(paths[0], len(footage[0][1]), every)))
+    # Warm up, the first passes allocate
+    detector.detect_frames([Frame("warmup", footage[0][1][0]).downscaled(Constants.DETECTION_DECODE_SIZE)[0].copy()] * 2)
+
+    print(f"check every {every} frames, sensitivity {sensitivity}, footage looped {loops} times")
+    for name, jpegs, seconds, (width, height) in footage:
+        red_zone = [(0, 0), (width, 0), (width, height), (0, height)] # the whole frame
+        for row, gate in (("before", None), ("gated", MotionGate())):
+            results = run(detector, jpegs, red_zone, gate, sensitivity, loops)
+            cpu_percent = results["cpu_seconds"] / (seconds * loops) * 100
+            print(f"{name:22} {row:6} CPU per camera {cpu_percent:6.1f}%  detected {results['detected']:4}/{results['checked']}")
@@ -0,0 +1,172 @@
+"""
+Reconnect storm: `cameras` emulated cameras connect at once and each runs the
+pair handshake (CAMLINK-HSEC, then the ECDH exchange) while `live` cameras
+keep streaming 25 fps. Compares the HandshakeScheduler with the key pool
+against running every exchange on its reader thread with inline keys, as
+before both existed.
+
+    python -m benchmarks.reconnect_storm [cameras] [live cameras]
+
+Reports how long the storm took, handshake latency, and the live cameras'
+frame rate and delivery latency before and during the storm.
+"""
+import multiprocessing
+import socket
+import sys
+import threading
+import time
+
+from Cryptodome.Cipher import AES
+from Cryptodome.PublicKey import ECC
+from Cryptodome.Util.Padding import pad
+
+from package.camera_server.constants import Constants, Messages
+from package.socket_server_lib import constants
+from package.socket_server_lib.handshake import EphemeralKeyPool, HandshakeScheduler
+from package.socket_server_lib.socket_server import SocketServer
+
+LIVE_FPS = 25
+LIVE_FRAME_SIZE = 50 * 1024
+SEPARATOR = constants.Options.MESSAGE_SEPARATOR
+
+def send_message(sock: socket.socket, body: bytes):
+    sock.sendall(len(body).to_bytes(constants.Options.MESSAGE_SIZE_BYTE_LENGTH, 'big') + body)
+
+def receive_message(sock: socket.socket) -> bytes:
+    size = int.from_bytes(receive_exactly(sock, constants.Options.MESSAGE_SIZE_BYTE_LENGTH), 'big')
+    return receive_exactly(sock, size)
+
+def receive_exactly(sock: socket.socket, size: int) -> bytes:
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("closed")
+        data += chunk
+    return bytes(data)
+
+def _pair(port: int, index: int, key: ECC.EccKey):
+    with socket.create_connection(("127.0.0.1", port)) as sock:
+        send_message(sock, Messages.CAMERA_PAIR_REQUEST[0] + SEPARATOR + f"12:34:56:00:{index // 256:02x}:{index % 256:02x}".encode())
+        server_pubkey = receive_message(sock).split(SEPARATOR, 3)[3]
+        point = key.public_key().pointQ
+        send_message(sock, b"exch\0ecdh\0aes\0" + int(point.x).to_bytes(32, 'big') + int(point.y).to_bytes(32, 'big'))
+        server_point = ECC.construct(curve='P-256', point_x=int.from_bytes(server_pubkey[:32], 'big'), point_y=int.from_bytes(server_pubkey[32:], 'big')).pointQ
+        secret = int((key.d * server_point).x).to_bytes(32, 'big')
+        send_message(sock, AES.new(secret, AES.MODE_CBC, secret[:16]).encrypt(pad(b"confirm", AES.block_size)))
+        receive_message(sock)
+
+def _live_camera(port: int, stop):
+    filler = b"x" * LIVE_FRAME_SIZE
+    with socket.create_connection(("127.0.0.1", port)) as sock:
+        due = time.monotonic()
+        while not stop.is_set():
+            send_message(sock, Messages.CAMERA_FRAME[0] + SEPARATOR + repr(time.monotonic()).encode() + SEPARATOR + filler)
+            due += 1 / LIVE_FPS
+            time.sleep(max(0.0, due - time.monotonic()))
+
+def _run_cameras(port: int, cameras: int, live: int, storm, stop):
+    live_threads = [threading.Thread(target=_live_camera, args=(port, stop), daemon=True) for _ in range(live)]
+    for thread in live_threads:
+        thread.start()
+
+    # Client keys up front, the storm should load the server and not this process
+    keys = [ECC.generate(curve='P-256') for _ in range(cameras)]
+    storm.wait()
+    for index, key in enumerate(keys):
+        threading.Thread(target=lambda i=index, k=key: _ignore_errors(_pair, port, i, k), daemon=True).start()
+    stop.wait()
+
+def _ignore_errors(func, *args):
+    try:
+        func(*args)
+    except OSError:
+        pass
+
+def percentile(values: list, fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0
+
+def run(scheduled: bool, cameras: int = 1000, live: int = 4, timeout: float = 120) -> dict:
+    server = SocketServer("127.0.0.1", None, logger=0, key_pool=EphemeralKeyPool(Constants.ECDH_KEY_POOL_SIZE) if scheduled else None)
+    scheduler = HandshakeScheduler(Constants.HANDSHAKE_MAX_CONCURRENT, Constants.HANDSHAKE_RATE, Constants.HANDSHAKE_BURST, Constants.HANDSHAKE_MAX_PENDING) if scheduled else None
+    lock = threading.Lock()
+    handshakes = [] # (finished at, seconds since the pair request, succeeded)
+    frames = [] # (received at, delivery latency)
+
+    def pair(client, requested_at):
+        try:
+            succeeded = server.exchange_aes_key_with_ecdh(client)
+        except ValueError:
+            # The NUL framing splits an encrypted confirm that contains a NUL, it doesn't decrypt
+            succeeded = False
+        with lock:
+            handshakes.append((time.monotonic(), time.monotonic() - requested_at, succeeded))
+
+    def on_pair_request(client, fields):
+        client.auto_recv = False
+        if scheduler is None:
+            pair(client, time.monotonic()) # on this client's reader thread, as many at once as cameras connect
+        elif not scheduler.submit("pair", pair, client, time.monotonic()):
+            client.auto_recv = True
+            server.disconnect_client(client)
+
+    def on_frame(client, fields):
+        now = time.monotonic()
+        with lock:
+            frames.append((now, now - float(bytes(fields[1]))))
+
+    server.add_custom_message_callback(Messages.CAMERA_PAIR_REQUEST, on_pair_request)
+    server.add_custom_message_callback(Messages.CAMERA_FRAME, on_frame)
+    server.start()
+
+    context = multiprocessing.get_context("spawn")
+    storm, stop = context.Event(), context.Event()
+    process = context.Process(target=_run_cameras, args=(server.port, cameras, live, storm, stop), daemon=True)
+    process.start()
+
+    time.sleep(max(5.0, cameras / 2000)) # client keys, live cameras settle
+    baseline_from = time.monotonic()
+    time.sleep(3)
+    storm_started = time.monotonic()
+    cpu_started = time.process_time()
+    storm.set()
+    while len(handshakes) < cameras and time.monotonic() - storm_started < timeout:
+        time.sleep(0.1)
+    storm_ended = time.monotonic()
+    cpu = time.process_time() - cpu_started
+    stop.set()
+    process.join(5)
+
+    with lock:
+        before = [latency for at, latency in frames if baseline_from <= at < storm_started]
+        during = [latency for at, latency in frames if storm_started <= at < storm_ended]
+        durations = [duration for _, duration, _ in handshakes]
+        succeeded = sum(ok for _, _, ok in handshakes)
+
+    results = {
+        "storm_s": storm_ended - storm_started,
+        "handshakes": len(handshakes),
+        "failed": len(handshakes) - succeeded,
+        "handshake_p50_ms": percentile(durations, 0.5) * 1000,
+        "handshake_p95_ms": percentile(durations, 0.95) * 1000,
+        "server_cpu_percent": cpu / (storm_ended - storm_started) * 100,
+        "live_fps_before": len(before) / (storm_started - baseline_from),
+        "live_fps_during": len(during) / (storm_ended - storm_started),
+        "live_p95_ms_before": percentile(before, 0.95) * 1000,
+        "live_p95_ms_during": percentile(during, 0.95) * 1000,
+    }
+    if scheduled:
+        results["keys_generated_inline"] = server.key_pool.generated_inline
+    return results
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    cameras = int(args[0]) if len(args) > 0 else 1000
+    live = int(args[1]) if len(args) > 1 else 4
+
+    for name, scheduled in (("unbounded", False), ("scheduled", True)):
+        results = run(scheduled, cameras, live)
+        print(name)
+        for key, value in results.items():
+            print(f"  {key:22} {value:10.1f}" if isinstance(value, float) else f"  {key:22} {value:10}")
@@ -0,0 +1,92 @@
+"""
+Timelapse encoding under load. `cameras` cameras each hand a
+TIMELAPSE_SIZE frame to an EncoderPool every 1/TIMELAPSE_FPS seconds, from
+RECORDING_WORKERS threads the way Recorder's workers do once the sampler
+kept a frame and it was downscaled. Reports encoded frames per second
+against the offered rate, chunks saved against the chunks the cameras
+recorded, and how many chunks got a faster preset or were skipped.
+
+    python -m benchmarks.recording_load [cameras] [encoder processes] [seconds]
+
+The frames come from assets/jumpscare.mp4, run from central_server. The
+chunks are written to a temporary directory.
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import cv2
+
+from package.camera_server.constants import Constants
+from package.camera_server.encoder_pool import EncoderPool
+
+def test_images(path: str = "assets/jumpscare.mp4", count: int = 50) -> list:
+    capture = cv2.VideoCapture(path)
+    images = []
+    while len(images) < count:
+        ok, image = capture.read()
+        if not ok:
+            break
+        images.append(cv2.resize(image, Constants.TIMELAPSE_SIZE))
+    capture.release()
+    if not images:
+        raise RuntimeError(f"No frames read from {path}")
+    return images
+
+def _recorder_worker(pool: EncoderPool, cameras: list, images: list, seconds: float, offered: list):
+    due = started = time.monotonic()
+    tick = 0
+    while time.monotonic() - started < seconds:
+        for index, camera_id in enumerate(cameras):
+            pool.submit(camera_id, images[(tick + index) % len(images)])
+        offered.append(len(cameras))
+        tick += 1
+        due += 1 / Constants.TIMELAPSE_FPS
+        time.sleep(max(0.0, due - time.monotonic()))
+
+def run(images: list, cameras: int = 200, processes: int = 1, seconds: float = 30.0) -> dict:
+    pool = EncoderPool(processes)
+    time.sleep(3) # spawned encoders import
+    camera_ids = [f"12:34:56:00:{index // 256:02x}:{index % 256:02x}" for index in range(cameras)]
+    offered = []
+    threads = [
+        threading.Thread(target=_recorder_worker, args=(pool, camera_ids[worker::Constants.RECORDING_WORKERS], images, seconds, offered), daemon=True)
+        for worker in range(Constants.RECORDING_WORKERS)
+    ]
+    cpu_started = time.process_time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    cpu = time.process_time() - cpu_started
+    while pool.in_flight and not pool.failed:
+        time.sleep(0.1) # what was queued still gets encoded
+    stats = pool.get_stats()
+    pool.close()
+
+    recorded_chunks = cameras * seconds / Constants.TIMELAPSE_CHUNK_DURATION
+    return {
+        "offered_per_second": sum(offered) / seconds,
+        "encoded_per_second": stats["encoded"] / seconds,
+        "chunks_saved_percent": 100 * stats["chunks"] / recorded_chunks,
+        "fast_chunks": stats["fast_chunks"],
+        "skipped_chunks": stats["skipped_chunks"],
+        "skipped_frames": stats["skipped_frames"],
+        "avg_encode_ms": stats["avg_encode_ms"],
+        "p95_latency_ms": stats["p95_latency_ms"],
+        "submit_cpu_percent": cpu / seconds * 100, # this process: copies into the slots, job and result queues
+    }
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    cameras = int(args[0]) if len(args) > 0 else 200
+    processes = int(args[1]) if len(args) > 1 else 1
+    seconds = float(args[2]) if len(args) > 2 else 30.0
+
+    images = test_images()
+    os.chdir(tempfile.mkdtemp(prefix="recording_load-"))
+    print(f"{cameras} cameras at {Constants.TIMELAPSE_FPS} fps, {processes} encoder processes, {seconds} s")
+    for key, value in run(images, cameras, processes, seconds).items():
+        print(f"  {key:22} {value:10.1f}" if isinstance(value, float) else f"  {key:22} {value:10}")
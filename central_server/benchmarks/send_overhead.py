@@ -0,0 +1,78 @@
+"""
+send_data cost per message against joining the fields and sending one
+bytes object, plain, AES-CBC and AEAD. send_data joins messages under
+SocketServer.SCATTER_MIN_BYTES itself and only scatter-gathers larger ones,
+without a payload size every size from 1 KiB to 1 MiB is run.
+
+    python -m benchmarks.send_overhead [payload bytes] [messages]
+"""
+import socket
+import sys
+import threading
+import time
+
+from Cryptodome.Cipher import AES
+from Cryptodome.Util.Padding import pad
+
+from package.socket_server_lib import constants
+from package.socket_server_lib.client import SocketClient
+from package.socket_server_lib.session_cipher import SessionCipher
+from package.socket_server_lib.socket_server import SocketServer
+
+def drain(sock: socket.socket):
+    while sock.recv(1 << 20):
+        pass
+
+def connected_client(options, session_cipher=None) -> tuple:
+    # Loopback TCP like a camera connection, a socketpair takes partial sends at different sizes
+    listener = socket.create_server(("127.0.0.1", 0))
+    ours = socket.create_connection(listener.getsockname())
+    theirs, _ = listener.accept()
+    listener.close()
+    threading.Thread(target=drain, args=(theirs,), daemon=True).start()
+    client = SocketClient(ours, ("bench", 0), options)
+    client.session_cipher = session_cipher
+    return client, ours
+
+def joined_send(sock: socket.socket, client: SocketClient, fields: list, options):
+    # What send_data did before: one join, encrypt the joined copy, one more copy for the size header
+    data = constants.Options.MESSAGE_SEPARATOR.join(fields)
+    if client.session_cipher is not None:
+        data = b"".join(client.session_cipher.seal(data))
+    elif constants.DataTransferOptions.ENCRYPT_AES in options:
+        data = client.get_aes().encrypt(pad(data, AES.block_size))
+    sock.sendall(len(data).to_bytes(constants.Options.MESSAGE_SIZE_BYTE_LENGTH, 'big') + data)
+
+def run(payload_size: int = 64 * 1024, messages: int = 2000) -> dict:
+    server = SocketServer("127.0.0.1", 0, logger=0)
+    fields = [b"CAMFRAME-HSEC", bytes(payload_size)]
+    with_size = constants.DataTransferOptions.WITH_SIZE
+    variants = {
+        "plain": (with_size, None),
+        "aes-cbc": (with_size | constants.DataTransferOptions.ENCRYPT_AES, None),
+        "aes-gcm": (with_size | constants.DataTransferOptions.ENCRYPT_AEAD, SessionCipher.AES_GCM),
+    }
+
+    results = {}
+    for name, (options, mode) in variants.items():
+        for path in ("send_data", "joined"):
+            client, sock = connected_client(options, SessionCipher(mode, bytes(32)) if mode else None)
+            send = (lambda: server.send_data(client, fields, options)) if path == "send_data" else (lambda: joined_send(sock, client, fields, options))
+            for _ in range(messages // 10): # warm up, the first sends grow the socket buffers
+                send()
+            started = time.perf_counter()
+            for _ in range(messages):
+                send()
+            results[f"{name}_{path}_us"] = (time.perf_counter() - started) / messages * 1e6
+            sock.close()
+    return results
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:3]]
+    sizes = args[:1] or [1024, 16 * 1024, 64 * 1024, 1024 * 1024]
+    for size in sizes:
+        messages = args[1] if len(args) > 1 else max(200, 2000 * 64 * 1024 // max(size, 64 * 1024))
+        results = run(size, messages)
+        print(f"{size} bytes, {'scatter-gather' if size >= SocketServer.SCATTER_MIN_BYTES else 'joined'} send_data")
+        for key, value in results.items():
+            print(f"  {key:24} {value:8.1f}")
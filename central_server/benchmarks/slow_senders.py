@@ -0,0 +1,85 @@
+"""
+Aggregate frame ingest with N cameras while some of them stall mid-frame,
+as a camera on a bad link does. A slow sender sends the size header and
+half of every frame, waits `stall` seconds (under the old 5 s receive
+timeout), then sends the rest.
+
+    python -m benchmarks.slow_senders [fast cameras] [slow cameras] [seconds] [stall]
+
+Prints frames/s received from the fast cameras, which shouldn't depend on
+the slow ones.
+"""
+import socket
+import sys
+import threading
+import time
+
+from package.camera_server.constants import Messages
+from package.socket_server_lib import constants
+from package.socket_server_lib.socket_server import SocketServer
+
+FRAME_SIZE = 100 * 1024
+
+def frame_message(fill: bytes) -> bytes:
+    # No NULs in the payload, so the fields don't depend on the framing
+    body = Messages.CAMERA_FRAME[0] + constants.Options.MESSAGE_SEPARATOR + fill * FRAME_SIZE
+    return len(body).to_bytes(constants.Options.MESSAGE_SIZE_BYTE_LENGTH, 'big') + body
+
+def fast_camera(port: int, stop: threading.Event):
+    message = frame_message(b"f")
+    with socket.create_connection(("127.0.0.1", port)) as sock:
+        while not stop.is_set():
+            sock.sendall(message)
+
+def slow_camera(port: int, stop: threading.Event, stall: float):
+    message = frame_message(b"s")
+    half = len(message) // 2
+    with socket.create_connection(("127.0.0.1", port)) as sock:
+        while not stop.is_set():
+            sock.sendall(message[:half])
+            stop.wait(stall)
+            sock.sendall(message[half:])
+
+def run(fast: int = 8, slow: int = 2, seconds: float = 10.0, stall: float = 2.0) -> dict:
+    counts = {b"f": 0, b"s": 0}
+    counts_lock = threading.Lock()
+
+    def on_frame(client, fields):
+        with counts_lock:
+            counts[bytes(fields[1][:1])] += 1
+
+    server = SocketServer("127.0.0.1", None, logger=0)
+    server.add_custom_message_callback(Messages.CAMERA_FRAME, on_frame)
+    server.start()
+
+    stop = threading.Event()
+    senders = [threading.Thread(target=fast_camera, args=(server.port, stop), daemon=True) for _ in range(fast)]
+    senders += [threading.Thread(target=slow_camera, args=(server.port, stop, stall), daemon=True) for _ in range(slow)]
+    for sender in senders:
+        sender.start()
+
+    time.sleep(1)
+    with counts_lock:
+        start = dict(counts)
+    started = time.perf_counter()
+    time.sleep(seconds)
+    with counts_lock:
+        end = dict(counts)
+    elapsed = time.perf_counter() - started
+    stop.set()
+
+    return {
+        "fast_fps": (end[b"f"] - start[b"f"]) / elapsed,
+        "slow_fps": (end[b"s"] - start[b"s"]) / elapsed,
+    }
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    fast = int(args[0]) if len(args) > 0 else 8
+    slow = int(args[1]) if len(args) > 1 else 2
+    seconds = float(args[2]) if len(args) > 2 else 10.0
+    stall = float(args[3]) if len(args) > 3 else 2.0
+
+    for slow_cameras in sorted({0, slow}):
+        results = run(fast, slow_cameras, seconds, stall)
+        print(f"{fast} fast + {slow_cameras} slow: {results['fast_fps']:8.1f} fast frames/s  {results['slow_fps']:5.2f} slow frames/s")
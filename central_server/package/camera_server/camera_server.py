@@ -1,3 +1,4 @@
+import json
 import time
 
 import cv2
@@ -6,14 +7,17 @@ import numpy as np
 from package.camera_server.movement_detection import MovementDetector
 
 from ..socket_server_lib.socket_server import DefaultLogger, SocketServer, constants, SocketClient
+from ..socket_server_lib.async_socket_server import AsyncSocketServer
+from ..socket_server_lib.handshake import EphemeralKeyPool, HandshakeScheduler
 from package.camera_server.constants import CATEGORY_TO_CLASS, Constants, Messages
-import socket
 from package.camera_server.database_manager import CameraDatabase, Camera
 import threading
 from Cryptodome.Util.Padding import pad, unpad
 from Cryptodome.Cipher import AES
-from queue import Queue
-from package.camera_server.playback_manager import PlaybackManager
+from package.camera_server.frame_mailbox import LatestFrameMailbox
+from package.camera_server.frame import Frame
+from package.camera_server.motion_gate import MotionGate
+from package.camera_server.recorder import Recorder
 
 def filter_detections(detections, red_zone, alert_categories):
     red_poly = np.array(red_zone, dtype=np.int32)
@@ -39,39 +43,88 @@ def filter_detections(detections, red_zone, alert_categories):
     
 
 class CameraServer:
-    def __init__(self, callbacks: dict, logger=DefaultLogger()):
+    """
+    discovery: UDP pairing broadcasts, pairing and unpairing.
+    ingest: the camera TCP server (handshakes, frames, red zone checks, recording).
+    CameraIngestCluster runs discovery in its own process and ingest in worker
+    processes that share the handler port through reuse_port.
+    """
+
+    def __init__(self, callbacks: dict, logger=DefaultLogger(), discovery=True, ingest=True, reuse_port=False):
         self.logger = logger
+        self.callbacks = callbacks
         self.connected_cameras: dict[str, Camera] = {}
-        self.movement_detector = MovementDetector(logger, threshold=Constants.RED_ZONE_DETECTION_THRESHOLD)
+        self.cameras_by_client: dict[SocketClient, Camera] = {} # connection -> camera, for per frame lookups
+        self.discovering_cameras = False
+        self.discovery_deadline = None
+        self.cameras_awaiting_pairing = set()
+        self.streaming_cameras = set()
+        self.last_frame_update_time = {}
 
+        self.frame_queue = LatestFrameMailbox() # frames waiting for detection, newest per camera
+        self.last_redzones = {} # {mac: (hash, frames_passed)}
+        self.timelapse_info = {} # {mac: (start_time, frames_passed)}
+
+        self.db = CameraDatabase()
+
+        self.camera_discover_server = None
+        self.camera_server = None
+        if discovery:
+            self.__init_discovery()
+        if ingest:
+            self.__init_ingest(reuse_port)
+
+    def __init_discovery(self):
         # This server listens for camera pairing mode broadcasts
         self.camera_discover_server = SocketServer(
             host="0.0.0.0",
             port=Constants.CAMERA_HEARTBEAT_LISTENER_PORT,
             protocol=constants.ServerProtocol.UDP,
-            logger=logger,
+            logger=self.logger,
         )
 
+        # Pairing broadcasts are matched by the discover server's datagram loop
+        self.camera_discover_server.add_custom_message_callback(
+            Messages.CAMERA_PAIRING_QUERY,
+            self.__handle_pairing_query,
+        )
+
+        self.camera_discover_server.add_custom_message_callback(
+            Messages.CAMERA_WRONG_CODE,
+            self.__handle_bad_code,
+        )
+
+        self.camera_discover_server.start()
+
+    def __init_ingest(self, reuse_port):
+        self.movement_detector = MovementDetector(
+            self.logger,
+            threshold=Constants.RED_ZONE_DETECTION_THRESHOLD,
+            batch_size=Constants.DETECTION_BATCH_SIZE,
+            cuda_batch_size=Constants.DETECTION_BATCH_SIZE_CUDA,
+        )
+        self.motion_gate = MotionGate()
+        self.recorder = Recorder(logger=self.logger)
+
+        self.handshake_scheduler = HandshakeScheduler(
+            max_concurrent=Constants.HANDSHAKE_MAX_CONCURRENT,
+            rate=Constants.HANDSHAKE_RATE,
+            burst=Constants.HANDSHAKE_BURST,
+            max_pending=Constants.HANDSHAKE_MAX_PENDING,
+        )
+        self.handshake_scheduler.logger = self.logger
+
         # This server registers new cameras and handles camera data
-        self.camera_server = SocketServer(
+        camera_server_cls = AsyncSocketServer if Constants.USE_ASYNC_CAMERA_SERVER else SocketServer
+        self.camera_server = camera_server_cls(
             host="0.0.0.0",
             port=Constants.CAMERA_HANDLER_PORT,
             protocol=constants.ServerProtocol.TCP,
-            logger=logger,
+            logger=self.logger,
+            key_pool=EphemeralKeyPool(size=Constants.ECDH_KEY_POOL_SIZE),
+            reuse_port=reuse_port,
         )
 
-        self.callbacks = callbacks
-        self.discovering_cameras = True
-        self.cameras_awaiting_pairing = set()
-        self.streaming_cameras = set()
-        self.last_frame_update_time = {}
-
-        self.frame_queue = Queue()
-        self.last_redzones = {} # {mac: (hash, frames_passed)}
-        self.timelapse_info = {} # {mac: (start_time, frames_passed)}
-
-        self.db = CameraDatabase()
-
         self.camera_server.set_callback(
             constants.SocketServerCallbacks.ON_DISCONNECT,
             self.__on_camera_disconnect,
@@ -97,21 +150,9 @@ class CameraServer:
             daemon=True,
         ).start()
 
-        self.camera_discover_server.start(no_loop=True)
         self.camera_server.start()
 
 
-    @staticmethod
-    def __does_match_pattern(data, pattern):
-        if len(data) != len(pattern):
-            return False
-        
-        for i in range(len(data)):
-            if data[i] != pattern[i] and pattern[i] != constants.Options.ANY_VALUE_TEMPLATE:
-                return False
-            
-        return True
-
     @staticmethod
     def __handle_template(template, *args):
         if template.count(constants.Options.ANY_VALUE_TEMPLATE) != len(args):
@@ -138,92 +179,85 @@ class CameraServer:
         )
 
     def discover_cameras(self, timeout=-1):
+        self.logger.info("Starting camera discovery...")
+        self.discovery_deadline = None if timeout == -1 else time.time() + timeout
         self.discovering_cameras = True
-        def func():
-            self.logger.info("Starting camera discovery...")
-            start = time.time()
-            if self.camera_discover_server.server_socket is None:
-                self.logger.error("Camera discover server socket is None")
-                return
-            self.camera_discover_server.server_socket.settimeout(1)
-            while self.discovering_cameras and (timeout == -1 or time.time() - start < timeout):
-                try:
-                    data, addr = self.camera_discover_server.server_socket.recvfrom(1024)
-                    data = data.split(constants.Options.MESSAGE_SEPARATOR)
-                except socket.timeout:
-                    continue
-                except Exception as e:
-                    self.logger.error(f"Error receiving data: {e}")
-                    continue
-                
-                print(f"Received data from {addr}: {data}")
 
-                if CameraServer.__does_match_pattern(data, Messages.CAMERA_PAIRING_QUERY):
-                    fields = data
-                    if len(fields) != 2:
-                        self.logger.error(f"Invalid camera pairing message: {data}")
-                        continue
+    def stop_discovery(self):
+        self.discovering_cameras = False
+        self.logger.info("Discovery stopped")
 
-                    camera_mac = fields[1].decode()
-                    if not self.__validate_camera_mac(camera_mac):
-                        self.logger.error(f"Invalid camera MAC address: {camera_mac}")
-                        continue
+    def __handle_pairing_query(self, camera_cli, fields):
+        if not self.discovering_cameras:
+            return
+        if self.discovery_deadline is not None and time.time() > self.discovery_deadline:
+            self.logger.info("Camera discovery timed out")
+            self.discovering_cameras = False
+            return
+
+        camera_mac = bytes(fields[1]).decode()
+        if not self.__validate_camera_mac(camera_mac):
+            self.logger.error("Invalid camera MAC address: %s", camera_mac)
+            return
+
+        self.callbacks["on_camera_discovered"](camera_cli.addr, camera_mac)
+
+    def expect_pairing(self, camera_ip):
+        self.cameras_awaiting_pairing.add(camera_ip)
+
+    def forget_pairing(self, camera_ip):
+        self.cameras_awaiting_pairing.discard(camera_ip)
 
-                    self.callbacks["on_camera_discovered"](addr, camera_mac)
-                elif CameraServer.__does_match_pattern(data, Messages.CAMERA_WRONG_CODE):
-                    self.__handle_bad_code(self.__build_camera_client(addr, self.camera_discover_server.server_socket), data)
-        t = threading.Thread(target=func, daemon=True)
-        t.start()
-            
-    
     def pair_camera(self, camera_addr, camera_code):
+        # Registered before the camera is told to connect
+        self.expect_pairing(camera_addr[0])
         self.camera_discover_server.send_data(
             self.__build_camera_client(camera_addr, self.camera_discover_server.server_socket),
             CameraServer.__handle_template(Messages.CAMERA_PAIRING_RESPONSE, Constants.CAMERA_HANDLER_PORT, camera_code),
             constants.DataTransferOptions.RAW
         )
-        self.cameras_awaiting_pairing.add(camera_addr[0])
 
-    def unpair_camera(self, camera_mac):
-        if camera_mac not in self.connected_cameras:
-            self.logger.error(f"Camera {camera_mac} not connected")
-            return False
-        
-        camera = self.connected_cameras[camera_mac]
-        if camera.client is None:
-            self.logger.error(f"Camera {camera_mac} client is None")
-            return False
-        
-        camera_ip = camera.client.addr[0]
-        self.camera_discover_server.server_socket.sendto(
-            constants.Options.MESSAGE_SEPARATOR.join(Messages.CAMERA_UNPAIR_REQUEST),
-            (camera_ip, Constants.CAMERA_HEARTBEAT_LISTENER_PORT)
+    def unpair_camera(self, camera_mac, camera_ip=None):
+        """camera_ip is passed when the camera's connection belongs to another process (CameraIngestCluster)"""
+        if camera_ip is None:
+            if camera_mac not in self.connected_cameras:
+                self.logger.error("Camera %s not connected", camera_mac)
+                return False
+            
+            camera = self.connected_cameras[camera_mac]
+            if camera.client is None:
+                self.logger.error("Camera %s client is None", camera_mac)
+                return False
+            
+            camera_ip = camera.client.addr[0]
+        self.camera_discover_server.send_datagrams(
+            [((camera_ip, Constants.CAMERA_HEARTBEAT_LISTENER_PORT), Messages.CAMERA_UNPAIR_REQUEST)]
         )
         
         self.db.remove_camera(camera_mac)
-        self.logger.info(f"Camera {camera_mac} unpaired successfully")
+        self.logger.info("Camera %s unpaired successfully", camera_mac)
         return True
 
     def get_current_frame(self, camera_mac):
         if camera_mac not in self.connected_cameras:
-            self.logger.error(f"Camera {camera_mac} not connected")
+            self.logger.error("Camera %s not connected", camera_mac)
             return None
         
         camera = self.connected_cameras[camera_mac]
         if camera.client is None:
-            self.logger.error(f"Camera {camera_mac} client is None")
+            self.logger.error("Camera %s client is None", camera_mac)
             return None
         
         return camera.last_frame
     
     def stream_camera(self, camera_mac):
         if camera_mac not in self.connected_cameras:
-            self.logger.error(f"Camera {camera_mac} not connected")
+            self.logger.error("Camera %s not connected", camera_mac)
             return None
         
         camera = self.connected_cameras[camera_mac]
         if camera.client is None:
-            self.logger.error(f"Camera {camera_mac} client is None")
+            self.logger.error("Camera %s client is None", camera_mac)
             return None
         
         self.streaming_cameras.add(camera_mac)
@@ -231,94 +265,129 @@ class CameraServer:
     
     def stop_stream(self, camera_mac):
         if camera_mac not in self.connected_cameras:
-            self.logger.error(f"Camera {camera_mac} not connected")
+            self.logger.error("Camera %s not connected", camera_mac)
             return None
         
         camera = self.connected_cameras[camera_mac]
         if camera.client is None:
-            self.logger.error(f"Camera {camera_mac} client is None")
+            self.logger.error("Camera %s client is None", camera_mac)
             return None
         
-        self.streaming_cameras.remove(camera_mac)
-
-    def __get_camera_by_ip(self, camera_ip):
-        for camera in self.connected_cameras.values():
-            # print(camera.client.addr, camera_ip)
-            if camera.client is None:
-                self.logger.error(f"Camera {camera.mac} client is None")
-                continue
-            if camera.client.addr[0] == camera_ip:
-                return camera
-        
-        return None
+        self.streaming_cameras.discard(camera_mac)
+
+    def set_red_zone(self, camera_mac, red_zone):
+        self.db.set_red_zone(camera_mac, json.dumps(red_zone))
+        self.last_redzones.pop(camera_mac, None) # checked again on the next frame
+        camera = self.connected_cameras.get(camera_mac)
+        if camera is not None:
+            camera.red_zone = red_zone
+
+    def set_motion_sensitivity(self, camera_mac, motion_sensitivity):
+        self.db.set_motion_sensitivity(camera_mac, motion_sensitivity)
+        camera = self.connected_cameras.get(camera_mac)
+        if camera is not None:
+            camera.motion_sensitivity = motion_sensitivity
+
+    def set_alert_categories(self, camera_mac, alert_categories):
+        self.db.set_alert_categories(camera_mac, json.dumps(alert_categories))
+        camera = self.connected_cameras.get(camera_mac)
+        if camera is not None:
+            camera.alert_categories = alert_categories
 
     def __on_camera_disconnect(self, camera_cli):
-        camera = self.__get_camera_by_ip(camera_cli.addr[0])
+        camera = self.cameras_by_client.pop(camera_cli, None)
         if camera is None:
-            self.logger.error(f"Camera {camera_cli.addr[0]} not found in connected cameras")
+            self.logger.error("Camera %s not found in connected cameras", camera_cli.addr[0])
             return
         if camera.mac in self.last_frame_update_time: del self.last_frame_update_time[camera.mac]
         if camera.mac in self.last_redzones: del self.last_redzones[camera.mac]
+        self.frame_queue.discard(camera.mac)
+        self.motion_gate.forget(camera.mac)
+        self.recorder.forget(camera.mac)
         
-        if camera is None:
-            self.logger.error(f"Camera {camera_cli.addr[0]} not found in connected cameras")
-            return
-        
-        if camera.mac in self.connected_cameras: del self.connected_cameras[camera.mac]
+        # The camera may already be connected again on a newer connection
+        if self.connected_cameras.get(camera.mac) is camera: del self.connected_cameras[camera.mac]
         self.callbacks["on_camera_disconnected"](camera_cli.addr, camera.mac)
 
     def __handle_bad_code(self, camera_cli, fields):
         if len(fields) != 2:
-            self.logger.error(f"Invalid camera code message: {fields}")
+            self.logger.error("Invalid camera code message: %s", fields)
             return
         
-        camera_mac = fields[1].decode()
+        camera_mac = bytes(fields[1]).decode()
         if not self.__validate_camera_mac(camera_mac):
-            self.logger.error(f"Invalid camera MAC address: {camera_mac}")
+            self.logger.error("Invalid camera MAC address: %s", camera_mac)
             return
         
-        self.logger.warning(f"Sent bad code to camera {camera_mac} at {camera_cli.addr[0]}")
+        self.logger.warning("Sent bad code to camera %s at %s", camera_mac, camera_cli.addr[0])
         if camera_cli.addr[0] in self.cameras_awaiting_pairing:
-            self.cameras_awaiting_pairing.remove(camera_cli.addr[0])
+            self.cameras_awaiting_pairing.discard(camera_cli.addr[0])
             self.callbacks["on_camera_pairing_failed"](camera_cli.addr, camera_mac, "Invalid pairing code")
         else:
-            self.logger.error(f"Camera {camera_mac} is not awaiting pairing, cannot handle bad code")
+            self.logger.error("Camera %s is not awaiting pairing, cannot handle bad code", camera_mac)
             return
 
     def __handle_frame_queue(self):
         while True:
             try:
-                camera, frame = self.frame_queue.get()
-                if camera is None or frame is None:
-                    continue
+                batch_size = self.movement_detector.batch_size
+                batch = self.frame_queue.get_batch(batch_size, Constants.DETECTION_BATCH_MAX_WAIT if batch_size > 1 else 0)
 
-                if camera.mac not in self.connected_cameras: continue
-                
-                cv2_image = cv2.imdecode(np.frombuffer(frame, np.uint8), cv2.IMREAD_COLOR)
+                cameras, images, scales, ages = [], [], [], []
+                for _, (camera, frame), age in batch:
+                    if camera.mac not in self.connected_cameras: continue
 
-                if camera.mac in self.last_redzones:
-                    frame, detections = self.movement_detector.detect_frame(cv2_image, draw_box=True)
+                    if camera.mac not in self.last_redzones:
+                        self.last_redzones[camera.mac] = 0
+                        continue
 
-                    allowed_classes = []
-                    for category in camera.alert_categories:
-                        allowed_classes.extend(CATEGORY_TO_CLASS[category])
+                    # Static scenes never reach the detector
+                    if not self.motion_gate.has_motion(camera.mac, frame, camera.red_zone, camera.motion_sensitivity):
+                        continue
 
+                    cv2_image, scale = frame.downscaled(Constants.DETECTION_DECODE_SIZE)
+                    if cv2_image is None:
+                        self.logger.error("Failed to decode frame from camera %s", camera.mac)
+                        continue
+                    cameras.append(camera)
+                    images.append(cv2_image.copy()) # boxes are drawn on it, the cached decode is shared
+                    scales.append(scale)
+                    ages.append(age)
+
+                if not images: continue
+
+                # One forward pass for every camera in the batch
+                started = time.perf_counter()
+                results = self.movement_detector.detect_frames(images, draw_box=True)
+                inference = time.perf_counter() - started
+                for age in ages:
+                    self.movement_detector.stats.record_latency(age + inference)
+
+                for camera, scale, (frame, detections) in zip(cameras, scales, results):
+                    # Red zones are in full frame coordinates
+                    for detection in detections:
+                        detection["coordinates"] = tuple(c * scale for c in detection["coordinates"])
                     filtered_detections = filter_detections(detections, camera.red_zone, camera.alert_categories)
                     if len(filtered_detections) > 0:
-                        del self.last_redzones[camera.mac]
+                        self.last_redzones.pop(camera.mac, None)
                         self.callbacks["on_red_zone_trigger"](camera.mac, frame, filtered_detections)
-                elif camera.mac not in self.last_redzones:
-                    self.last_redzones[camera.mac] = 0
             except Exception as e:
-                self.logger.error(f"Error processing frame queue: {e}")
+                self.logger.error("Error processing frame queue: %s", e)
 
     def __handle_frame(self, camera_cli, fields):
-        frame = constants.Options.MESSAGE_SEPARATOR.join(fields[1:])
-        camera = self.__get_camera_by_ip(camera_cli.addr[0])
+        # Binary field framing delivers the JPEG as one field, the old framing splits it on every NUL.
+        # A frame's message has a receive buffer of its own, the Frame keeps the view instead of a copy.
+        jpeg = fields[1] if len(fields) == 2 else constants.Options.MESSAGE_SEPARATOR.join(fields[1:])
+        if camera_cli.shares_recv_buffer(jpeg):
+            jpeg = bytes(jpeg)
+        camera = self.cameras_by_client.get(camera_cli)
         if camera is None:
-            self.logger.error(f"Camera {camera_cli.addr[0]} not found in connected cameras")
+            self.logger.error("Camera %s not found in connected cameras", camera_cli.addr[0])
             self.camera_server.disconnect_client(camera_cli)
             return
+
+        # Every consumer below shares this, each decode happens at most once
+        frame = Frame(camera.mac, jpeg)
         
         if camera.mac in self.streaming_cameras:
             self.callbacks["on_camera_frame"](camera.mac, frame)
@@ -334,33 +403,32 @@ class CameraServer:
             self.last_redzones[camera.mac] = 0
 
         if camera.red_zone is not None and check_red_zone:
-            self.frame_queue.put((camera, frame))
+            self.frame_queue.put(camera.mac, (camera, frame))
 
-        threading.Thread(target=PlaybackManager.add_frame, args=(camera.mac, frame)).start()
+        self.recorder.submit(frame)
 
         if self.last_frame_update_time.get(camera.mac) and time.time() - self.last_frame_update_time.get(camera.mac, 0) < Constants.STATIC_CAMERA_FRAME_UPDATE_INTERVAL:
-            self.logger.debug(f"Skipping frame update for camera {camera.mac} due to rate limiting")
+            self.logger.debug("Skipping frame update for camera %s due to rate limiting", camera.mac)
             return
-        camera.last_frame = frame
-        self.db.update_camera(camera.mac, frame)
+        camera.last_frame = frame.jpeg
+        self.db.update_camera(camera.mac, frame.jpeg)
         self.last_frame_update_time[camera.mac] = time.time()
 
     def __handle_repair_request(self, camera_cli, fields):
         def __handle_repair(camera_mac):
             try:
-                camera_cli.auto_recv = False
-                self.logger.info(f"Received repair request from camera {camera_mac} at {camera_cli.addr[0]}")
+                self.logger.info("Received repair request from camera %s at %s", camera_mac, camera_cli.addr[0])
                 if self.db.get_camera(camera_mac) is None:
-                    self.logger.error(f"Camera {camera_mac} not found in database")
+                    self.logger.error("Camera %s not found in database", camera_mac)
                     return
                 
                 camera = self.db.get_camera(camera_mac)
                 if camera is None:
-                    self.logger.error(f"Camera {camera_mac} not found in database")
+                    self.logger.error("Camera %s not found in database", camera_mac)
                     return
                 
                 camera.client = camera_cli
-                camera.client.transfer_options = constants.DataTransferOptions.WITH_SIZE | constants.DataTransferOptions.ENCRYPT_AES
+                camera.client.transfer_options |= constants.DataTransferOptions.WITH_SIZE | constants.DataTransferOptions.ENCRYPT_AES
                 camera.client.random = camera.key
 
                 # TODO: susceptible to replay attacks
@@ -368,60 +436,93 @@ class CameraServer:
                 self.camera_server.send_data(camera.client, CameraServer.__handle_template(Messages.CAMERA_REPAIR_CONFIRM, encrypted_confirm))
                 data = self.camera_server.receive_data_with_pattern(camera.client, Messages.CAMERA_REPAIR_CONFIRM_ACK)
                 if data is None:
-                    self.logger.error(f"Failed to receive repair confirmation from camera {camera_mac}")
+                    self.logger.error("Failed to receive repair confirmation from camera %s", camera_mac)
                     self.callbacks["on_camera_repair_failed"](camera_cli.addr, camera_mac, "Failed to receive repair confirmation")
                     self.camera_server.disconnect_client(camera.client)
                     return
                 
                 decrypted_data = unpad(camera.client.get_aes().decrypt(data[1]), AES.block_size)
                 if len(data) != 2 or decrypted_data != b"confirm-pair-ack":
-                    self.logger.error(f"Invalid repair confirmation message received from camera {camera_mac}")
+                    self.logger.error("Invalid repair confirmation message received from camera %s", camera_mac)
                     self.callbacks["on_camera_repair_failed"](camera_cli.addr, camera_mac, "Invalid repair confirmation message")
                     self.camera_server.disconnect_client(camera.client)
                     return
                     
-                self.logger.info(f"Camera {camera_mac} repaired successfully")
-                camera_cli.auto_recv = True
+                self.logger.info("Camera %s repaired successfully", camera_mac)
                 self.db.update_camera_ip(camera_mac, camera_cli.addr[0])
                 self.connected_cameras[camera_mac] = camera
+                self.cameras_by_client[camera_cli] = camera
                 self.callbacks["on_camera_paired"](camera_cli.addr, camera_mac)
             except Exception as e:
-                self.logger.error(f"Error handling repair request from camera {camera_mac}: {e}")
+                self.logger.error("Error handling repair request from camera %s: %s", camera_mac, e)
                 self.callbacks["on_camera_repair_failed"](camera_cli.addr, camera_mac, str(e))
                 self.camera_server.disconnect_client(camera_cli)
+            finally:
+                camera_cli.auto_recv = True
 
-        thread = threading.Thread(target=__handle_repair, args=(fields[1].decode(),))
-        thread.daemon = True
-        thread.start()
+        # Stop the reader before it returns to the socket, the repair handshake reads the ack itself
+        camera_cli.auto_recv = False
+        self.__schedule_handshake("repair", __handle_repair, camera_cli, bytes(fields[1]).decode())
 
     def __handle_pair_request(self, camera_cli, fields):
         if camera_cli.addr[0] not in self.cameras_awaiting_pairing:
-            self.logger.error(f"Camera {camera_cli.addr} is not awaiting pairing")
+            self.logger.error("Camera %s is not awaiting pairing", camera_cli.addr)
             return
         
         if len(fields) != 2:
-            self.logger.error(f"Invalid camera pairing message: {fields}")
+            self.logger.error("Invalid camera pairing message: %s", fields)
             return
 
         def __handle_pair(camera_mac):
-            success = self.camera_server.exchange_aes_key_with_ecdh(camera_cli)
-            if not success:
-                self.logger.error("Failed to exchange keys with camera.")
-                self.cameras_awaiting_pairing.remove(camera_cli.addr[0])
-                self.callbacks["on_camera_pairing_failed"](camera_cli.addr, camera_mac, "Failed to exchange keys")
-                return
-            
-            camera_name = f"HSEC {''.join(camera_mac.split(':')[-3:])}"
-            camera = self.db.add_camera(camera_mac, camera_name, camera_cli.random, camera_cli.addr[0])
-            camera.client = camera_cli
-            self.cameras_awaiting_pairing.remove(camera_cli.addr[0])
-            self.connected_cameras[camera_mac] = camera
+            try:
+                # The reader stays paused until the camera is registered, its first frame may already be on the wire
+                success = self.camera_server.exchange_aes_key_with_ecdh(camera_cli, resume=False)
+                if not success:
+                    self.logger.error("Failed to exchange keys with camera.")
+                    self.cameras_awaiting_pairing.discard(camera_cli.addr[0])
+                    self.callbacks["on_camera_pairing_failed"](camera_cli.addr, camera_mac, "Failed to exchange keys")
+                    return
+
+                camera_name = f"HSEC {''.join(camera_mac.split(':')[-3:])}"
+                camera = self.db.add_camera(camera_mac, camera_name, camera_cli.random, camera_cli.addr[0])
+                camera.client = camera_cli
+                self.cameras_awaiting_pairing.discard(camera_cli.addr[0])
+                self.connected_cameras[camera_mac] = camera
+                self.cameras_by_client[camera_cli] = camera
+            finally:
+                camera_cli.auto_recv = True
+
             self.callbacks["on_camera_paired"](camera_cli.addr, camera_mac)
-            self.logger.info(f"Camera {camera_mac} paired successfully with IP {camera_cli.addr[0]}")
+            self.logger.info("Camera %s paired successfully with IP %s", camera_mac, camera_cli.addr[0])
+
+        camera_cli.auto_recv = False
+        self.__schedule_handshake("pair", __handle_pair, camera_cli, bytes(fields[1]).decode())
+
+    def __schedule_handshake(self, name, func, camera_cli, camera_mac):
+        if self.handshake_scheduler.submit(name, func, camera_mac):
+            return
 
-        thread = threading.Thread(target=__handle_pair, args=(fields[1].decode(),))
-        thread.daemon = True
-        thread.start()
+        self.logger.warning("Too many pending handshakes, dropping %s request from camera %s", name, camera_mac)
+        self.cameras_awaiting_pairing.discard(camera_cli.addr[0])
+        camera_cli.auto_recv = True
+        self.camera_server.disconnect_client(camera_cli)
+
+    def get_detection_stats(self) -> dict:
+        """Detection queue health: coalesced frames were replaced by a newer one, ages are in seconds"""
+        stats = self.frame_queue.get_stats()
+        stats["detector"] = self.movement_detector.stats.snapshot()
+        stats["motion_gate"] = self.motion_gate.get_stats()
+        return stats
+
+    def get_recording_stats(self) -> dict:
+        """received: every frame, sampled: kept for the timelapse, dropped: the recorder was behind"""
+        return self.recorder.get_stats()
+
+    def get_handshake_stats(self) -> dict:
+        stats = self.handshake_scheduler.get_stats()
+        stats["pregenerated_keys"] = self.camera_server.key_pool.available()
+        stats["keys_generated_inline"] = self.camera_server.key_pool.generated_inline
+        return stats
         
 
 
@@ -11,15 +11,46 @@ class Constants:
     CAMERA_HANDLER_PORT = 5001
     SERVER_COMMS_PORT = 5002
 
+    USE_ASYNC_CAMERA_SERVER = False # serve all cameras from one asyncio loop instead of a thread per camera
+    CAMERA_INGEST_WORKERS = 0 # > 0: camera connections are sharded over this many processes (CameraIngestCluster, Linux)
+    INGEST_WORKER_CHECK_INTERVAL = 5 # seconds between checks for dead ingest workers, which are restarted
+
+    # Reconnect storms: pair/repair handshakes run on a bounded, rate limited scheduler
+    HANDSHAKE_MAX_CONCURRENT = 8
+    HANDSHAKE_RATE = 100 # per second
+    HANDSHAKE_BURST = 50
+    HANDSHAKE_MAX_PENDING = 2000
+    ECDH_KEY_POOL_SIZE = 64
+
     CAMERA_MAC_PREFIX = "12:34:56"
 
     STATIC_CAMERA_FRAME_UPDATE_INTERVAL = 30
     
     RED_ZONE_DETECTION_THRESHOLD = 50
+    # Frames from several cameras go through the detector together. Only on CUDA: on CPU a batch takes as
+    # long as its frames one by one, so it only adds latency. None picks by device, an int forces a size.
+    DETECTION_BATCH_SIZE = None
+    DETECTION_BATCH_SIZE_CUDA = 8
+    DETECTION_BATCH_MAX_WAIT = 0.02 # seconds after the first frame
     FRAMES_BETWEEN_RED_ZONE_CHECKS = 20
+    # Smallest (width, height) a frame is decoded at for detection, YOLO resizes to 640 anyway
+    DETECTION_DECODE_SIZE = (640, 360)
     
     TIMELAPSE_FPS = 5
     TIMELAPSE_CHUNK_DURATION = 5 # seconds
+    TIMELAPSE_SIZE = (320, 240) # recordings are encoded at this (width, height)
+    RECORDING_WORKERS = 4 # cameras are spread over these threads
+    RECORDING_QUEUE_SIZE = 256 # sampled frames waiting per worker, more are dropped
+    # > 0: timelapse encoding runs in this many processes (EncoderPool), frames go over shared memory
+    RECORDING_ENCODER_PROCESSES = 0
+    RECORDING_ENCODER_SLOTS = 256 # frames in flight to the encoder processes, the bounded queue
+    RECORDING_FAST_PRESET = "veryfast" # for chunks started while the encoders are behind
+    RECORDING_FAST_PRESET_DEPTH = 0.5 # fraction of slots in use from which new chunks get the fast preset
+    RECORDING_FASTEST_PRESET = "ultrafast" # about twice the file size, when the fast preset costs too much as well
+    RECORDING_ENCODER_TARGET_LOAD = 0.8 # share of the encoder processes' CPU a chunk's preset is picked to fit
+    RECORDING_SKIP_DEPTH = 0.75 # fraction of slots in use from which new chunks are skipped whole
+    RECORDING_ENCODER_CHECK_INTERVAL = 5 # seconds between checks for dead encoder processes, which are restarted
+    RECORDING_ENCODER_MAX_RESTARTS = 3 # past this the pool gives up and the recorder threads encode again
 
 class Messages:
     CAMERA_PAIRING_QUERY = [b"CAMPAIR-HSEC", Options.ANY_VALUE_TEMPLATE]
@@ -4,7 +4,7 @@ import ast
 from package.socket_server_lib.client import SocketClient
 
 class Camera:
-    def __init__(self, mac, name, last_frame, key, red_zone, last_known_ip, alert_categories):
+    def __init__(self, mac, name, last_frame, key, red_zone, last_known_ip, alert_categories, motion_sensitivity=50):
         self.mac = mac
         self.name = name
         self.last_frame = last_frame
@@ -13,6 +13,7 @@ class Camera:
         self.last_known_ip = last_known_ip
         self.client: SocketClient | None = None
         self.alert_categories = [] if alert_categories is None else (alert_categories if isinstance(alert_categories, list) else ast.literal_eval(alert_categories))
+        self.motion_sensitivity = 50 if motion_sensitivity is None else int(motion_sensitivity) # 0-100, see MotionGate
 
     def __repr__(self):
         return f"Camera(mac={self.mac}, name={self.name}, last_frame={self.last_frame}, key={self.key})"
@@ -39,9 +40,15 @@ class CameraDatabase:
                 key TEXT,
                 red_zone TEXT,
                 last_known_ip TEXT,
-                alert_categories TEXT DEFAULT '[]'
+                alert_categories TEXT DEFAULT '[]',
+                motion_sensitivity INTEGER DEFAULT 50
             )
         ''')
+
+        # Databases created before motion_sensitivity existed
+        cursor.execute('PRAGMA table_info(cameras)')
+        if 'motion_sensitivity' not in [column[1] for column in cursor.fetchall()]:
+            cursor.execute('ALTER TABLE cameras ADD COLUMN motion_sensitivity INTEGER DEFAULT 50')
         conn.commit()
 
     def remove_camera(self, mac):
@@ -60,11 +67,11 @@ class CameraDatabase:
 
         conn, cursor = self._get_conn()
         cursor.execute('''
-            INSERT OR REPLACE INTO cameras (mac, name, last_frame, key, red_zone, last_known_ip, alert_categories)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (mac, name, None, key, None, last_known_ip, '[]'))
+            INSERT OR REPLACE INTO cameras (mac, name, last_frame, key, red_zone, last_known_ip, alert_categories, motion_sensitivity)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (mac, name, None, key, None, last_known_ip, '[]', 50))
         conn.commit()
-        return Camera(mac, name, None, key, None, last_known_ip, [])
+        return Camera(mac, name, None, key, None, last_known_ip, [], 50)
 
     def get_camera(self, mac):
         _, cursor = self._get_conn()
@@ -103,6 +110,11 @@ class CameraDatabase:
         cursor.execute('UPDATE cameras SET alert_categories = ? WHERE mac = ?', (alert_categories, mac))
         conn.commit()
 
+    def set_motion_sensitivity(self, mac, motion_sensitivity):
+        conn, cursor = self._get_conn()
+        cursor.execute('UPDATE cameras SET motion_sensitivity = ? WHERE mac = ?', (motion_sensitivity, mac))
+        conn.commit()
+
     def close(self):
         if hasattr(self.local, 'conn'):
             self.local.conn.close()
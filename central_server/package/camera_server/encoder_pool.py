@@ -0,0 +1,278 @@
+import atexit
+import collections
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import zlib
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from package.camera_server.constants import Constants
+from package.camera_server.playback_manager import ChunkEncoder, PlaybackManager
+from package.socket_server_lib.logger import DefaultLogger
+
+FRAME_SHAPE = (Constants.TIMELAPSE_SIZE[1], Constants.TIMELAPSE_SIZE[0], 3)
+CHUNK_FRAMES = int(Constants.TIMELAPSE_FPS * Constants.TIMELAPSE_CHUNK_DURATION)
+SKIP = None # preset of a chunk that lost a frame, the rest of it is not sent
+
+def _run_encoder_worker(memory_name: str, slots: int, jobs, results):
+    memory = shared_memory.SharedMemory(name=memory_name)
+    frames = np.ndarray((slots, *FRAME_SHAPE), dtype=np.uint8, buffer=memory.buf)
+    chunks = {} # this process' cameras only
+
+    while True:
+        kind, camera_id, *args = jobs.get()
+        if kind == "frame":
+            slot, job, preset, queued_at = args
+            started = time.monotonic()
+            saved, error = False, None
+            try:
+                # from_ndarray copies, the slot is free again once this returns
+                saved = PlaybackManager.add_image(chunks, camera_id, frames[slot], preset)
+            except Exception as e:
+                error = str(e)
+            results.put((slot, job, camera_id, queued_at, started, time.monotonic(), saved, error))
+            continue
+
+        try:
+            if kind == "flush":
+                PlaybackManager.flush(chunks, camera_id)
+            elif kind == "abort":
+                PlaybackManager.abort(chunks, camera_id)
+        except Exception as e:
+            results.put((None, None, camera_id, 0, 0, 0, False, f"{kind}: {e}"))
+
+class EncoderPool:
+    """
+    Timelapse encoders in `processes` processes, so x264 and PyAV's Python
+    side never compete with ingest for the GIL. Cameras are sharded over the
+    processes, each keeps its cameras' open ChunkEncoders.
+
+    Frames travel through `slots` fixed TIMELAPSE_SIZE buffers in one shared
+    memory block, only the slot index goes over the job queue, and the slots
+    are the queue bound. A chunk gets the slowest of the default,
+    RECORDING_FAST_PRESET and RECORDING_FASTEST_PRESET whose measured cost
+    for all recording cameras fits RECORDING_ENCODER_TARGET_LOAD of the
+    processes, at least the fast one while more than
+    RECORDING_FAST_PRESET_DEPTH of the slots are in use. Past
+    RECORDING_SKIP_DEPTH new chunks are not started, and a frame that still
+    finds no free slot skips the rest of its chunk (a chunk with holes isn't
+    worth keeping).
+
+    A dead encoder process is restarted, the slots it held are freed and its
+    cameras' open chunks are lost. After RECORDING_ENCODER_MAX_RESTARTS the
+    pool is failed: submit refuses everything and Recorder encodes in its
+    own threads again.
+    """
+
+    LATENCY_WINDOW = 1000
+    COST_SMOOTHING = 0.05 # weight of the newest frame in a preset's average encode time
+
+    def __init__(self, processes: int, slots: int = Constants.RECORDING_ENCODER_SLOTS, logger=DefaultLogger()):
+        self.logger = logger
+        self.slots = slots
+        self.__memory = shared_memory.SharedMemory(create=True, size=slots * int(np.prod(FRAME_SHAPE)))
+        self.__frames = np.ndarray((slots, *FRAME_SHAPE), dtype=np.uint8, buffer=self.__memory.buf)
+        self.__free = list(range(slots))
+        self.__taken: dict[int, tuple] = {} # slot -> (job, process index, preset), a result only frees its own job's slot
+        self.__next_job = 0
+        self.__chunks: dict[str, tuple] = {} # camera -> (frames of its current chunk seen, preset or SKIP)
+        self.__frame_seconds: dict[str, float] = {} # preset -> moving average encode time of a frame
+        self.__cpus = min(processes, os.cpu_count() or 1)
+        self.__lock = threading.Lock()
+
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.encoded = 0
+        self.chunks = 0 # chunks saved
+        self.fast_chunks = 0
+        self.skipped_chunks = 0
+        self.skipped_frames = 0
+        self.restarts = 0
+        self.failed = False
+        self.encode_seconds = 0.0
+        self.__latencies = collections.deque(maxlen=EncoderPool.LATENCY_WINDOW)
+
+        # spawn: the encoders shouldn't inherit this process' threads and sockets
+        self.__context = multiprocessing.get_context("spawn")
+        self.__results = self.__context.Queue()
+        self.__jobs = [self.__context.Queue() for _ in range(processes)]
+        self.__processes = [None] * processes
+        for index in range(processes):
+            self.__start_process(index)
+
+        threading.Thread(target=self.__collect, daemon=True).start()
+        atexit.register(self.close)
+
+    def __start_process(self, index: int):
+        process = self.__context.Process(target=_run_encoder_worker, args=(self.__memory.name, self.slots, self.__jobs[index], self.__results), daemon=True)
+        process.start()
+        self.__processes[index] = process
+
+    def __index_of(self, camera_id: str) -> int:
+        return zlib.crc32(camera_id.encode()) % len(self.__jobs)
+
+    def __jobs_of(self, camera_id: str):
+        return self.__jobs[self.__index_of(camera_id)]
+
+    def submit(self, camera_id: str, image: np.ndarray) -> bool:
+        """
+        image: TIMELAPSE_SIZE BGR. One camera's frames must come from one
+        thread so they reach its encoder in order. False if it was skipped.
+        """
+        with self.__lock:
+            if self.failed:
+                return False
+            seen, preset = self.__chunks.get(camera_id, (0, SKIP))
+            if seen == 0:
+                # Picked once per chunk, one chunk is encoded with one preset
+                preset = self.__chunk_preset(camera_id)
+            seen = (seen + 1) % CHUNK_FRAMES
+
+            if preset is SKIP:
+                self.skipped_frames += 1
+                self.__chunks[camera_id] = (seen, SKIP)
+                return False
+
+            if not self.__free:
+                self.skipped_frames += 1
+                self.skipped_chunks += 1
+                self.__chunks[camera_id] = (seen, SKIP)
+                self.__jobs_of(camera_id).put(("abort", camera_id))
+                return False
+
+            slot = self.__free.pop()
+            job = self.__next_job
+            self.__next_job += 1
+            self.__taken[slot] = (job, self.__index_of(camera_id), preset)
+            self.__chunks[camera_id] = (seen, preset)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+            # Under the lock: __check_processes frees a dead process' slots and swaps its job queue at once,
+            # so this slot is either still ours and goes on the live queue, or was freed and nothing reads it
+            self.__frames[slot] = image
+            self.__jobs_of(camera_id).put(("frame", camera_id, slot, job, preset, time.monotonic()))
+            return True
+
+    def __chunk_preset(self, camera_id: str):
+        """For a chunk starting now: the slowest preset the encoders keep up with, SKIP if not even the fastest"""
+        if self.in_flight >= self.slots * Constants.RECORDING_SKIP_DEPTH:
+            self.skipped_chunks += 1
+            return SKIP
+        # By measured cost and not by queue depth alone: cameras start their chunks together, by the time the
+        # queue shows it the slots run out halfway through every chunk and their encoded frames are wasted
+        recording = 1 + sum(preset is not SKIP for other, (_, preset) in self.__chunks.items() if other != camera_id)
+        offered = recording * Constants.TIMELAPSE_FPS # frames a second
+        budget = self.__cpus * Constants.RECORDING_ENCODER_TARGET_LOAD
+        behind = self.in_flight >= self.slots * Constants.RECORDING_FAST_PRESET_DEPTH
+        presets = (ChunkEncoder.PRESET, Constants.RECORDING_FAST_PRESET, Constants.RECORDING_FASTEST_PRESET)
+        for preset in presets[1 if behind else 0:]:
+            if offered * self.__frame_seconds.get(preset, 0.0) <= budget:
+                if preset != ChunkEncoder.PRESET:
+                    self.fast_chunks += 1
+                return preset
+        # Skipped whole, the cameras that are recording keep their chunks
+        self.skipped_chunks += 1
+        return SKIP
+
+    def flush(self, camera_id: str):
+        """Saves the camera's partial chunk, for disconnects"""
+        with self.__lock:
+            self.__chunks.pop(camera_id, None)
+            self.__jobs_of(camera_id).put(("flush", camera_id))
+
+    def close(self):
+        """Stops the encoders, open chunks are lost, and frees the shared memory"""
+        atexit.unregister(self.close)
+        for process in self.__processes:
+            process.terminate()
+        self.__frames = None # the block can't close while a view of it exists
+        self.__memory.close()
+        self.__memory.unlink()
+
+    def __collect(self):
+        checked = time.monotonic()
+        while not self.failed:
+            if time.monotonic() - checked >= Constants.RECORDING_ENCODER_CHECK_INTERVAL:
+                self.__check_processes()
+                checked = time.monotonic()
+            try:
+                result = self.__results.get(timeout=Constants.RECORDING_ENCODER_CHECK_INTERVAL)
+            except queue.Empty:
+                continue
+
+            slot, job, camera_id, queued_at, started, finished, saved, error = result
+            if slot is not None:
+                with self.__lock:
+                    # A dead process' slots were already freed and may belong to another job now
+                    taken_job, _, preset = self.__taken.get(slot, (None, None, None))
+                    if taken_job != job:
+                        continue
+                    del self.__taken[slot]
+                    self.__free.append(slot)
+                    self.in_flight -= 1
+                    self.encoded += 1
+                    self.chunks += saved
+                    self.encode_seconds += finished - started
+                    average = self.__frame_seconds.get(preset)
+                    self.__frame_seconds[preset] = finished - started if average is None else average + (finished - started - average) * EncoderPool.COST_SMOOTHING
+                    self.__latencies.append(finished - queued_at)
+            if error is not None:
+                self.logger.error("Error encoding timelapse of camera %s: %s", camera_id, error)
+
+    def __check_processes(self):
+        for index, process in enumerate(self.__processes):
+            if process.is_alive():
+                continue
+
+            with self.__lock:
+                lost = [slot for slot, (_, owner, _) in self.__taken.items() if owner == index]
+                for slot in lost:
+                    del self.__taken[slot]
+                    self.__free.append(slot)
+                self.in_flight -= len(lost)
+                self.skipped_frames += len(lost)
+                # Their open chunks died with the process, the next frame starts a new one
+                for camera_id in [camera_id for camera_id in self.__chunks if self.__index_of(camera_id) == index]:
+                    del self.__chunks[camera_id]
+
+                if self.restarts >= Constants.RECORDING_ENCODER_MAX_RESTARTS:
+                    self.failed = True
+                else:
+                    # A fresh job queue in the same step as the slots, the old one holds jobs of freed slots.
+                    # Nothing reads it anymore, don't let its feeder thread hold up exit.
+                    self.__jobs[index].cancel_join_thread()
+                    self.__jobs[index] = self.__context.Queue()
+            if self.failed:
+                self.logger.error("Timelapse encoder %d died (exit code %s), restarted too often, giving up on the encoder processes", index, process.exitcode)
+                for other in self.__processes:
+                    other.terminate()
+                return
+
+            self.logger.error("Timelapse encoder %d died (exit code %s) with %d frames, restarting it", index, process.exitcode, len(lost))
+            self.restarts += 1
+            self.__start_process(index)
+
+    def get_stats(self) -> dict:
+        """Latency is slot filled -> frame encoded, in_flight is the queue depth"""
+        with self.__lock:
+            latencies = sorted(self.__latencies)
+            return {
+                "processes": len(self.__processes),
+                "slots": self.slots,
+                "in_flight": self.in_flight,
+                "max_in_flight": self.max_in_flight,
+                "encoded": self.encoded,
+                "chunks": self.chunks,
+                "fast_chunks": self.fast_chunks,
+                "skipped_chunks": self.skipped_chunks,
+                "skipped_frames": self.skipped_frames,
+                "restarts": self.restarts,
+                "failed": self.failed,
+                "avg_encode_ms": self.encode_seconds / self.encoded * 1000 if self.encoded else 0,
+                "p95_latency_ms": latencies[int(len(latencies) * 0.95)] * 1000 if latencies else 0,
+            }
@@ -0,0 +1,65 @@
+import base64
+import threading
+import time
+
+from package.camera_server.jpeg_decode import decode_jpeg, jpeg_size, reduction_for
+
+class Frame:
+    """
+    One camera JPEG as it fans out to streaming, detection, recording and the
+    snapshot. Derived forms (decodes at some reduction, base64) are computed
+    on first use and cached, so every form costs at most one decode per frame
+    however many consumers ask for it.
+
+    Consumers share the cached images: treat them as read-only and copy before
+    drawing on them. jpeg may be a memoryview of a receive buffer nothing else
+    writes to. Pickling (ingest worker -> parent) keeps only the JPEG.
+    """
+
+    __slots__ = ("mac", "jpeg", "received_at", "__lock", "__cache")
+
+    def __init__(self, mac: str, jpeg: bytes | memoryview, received_at: float | None = None):
+        self.mac = mac
+        self.jpeg = jpeg
+        self.received_at = time.monotonic() if received_at is None else received_at
+        self.__lock = threading.Lock()
+        self.__cache = {}
+
+    def __getstate__(self):
+        return self.mac, bytes(self.jpeg), self.received_at
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+    def __cached(self, key, compute: callable):
+        cached = self.__cache.get(key)
+        if cached is not None:
+            return cached
+        with self.__lock:
+            # Another consumer may have computed it while we waited
+            if key not in self.__cache:
+                self.__cache[key] = compute()
+            return self.__cache[key]
+
+    @property
+    def size(self) -> tuple | None:
+        """(width, height) from the JPEG header"""
+        return self.__cached("size", lambda: jpeg_size(self.jpeg))
+
+    def reduced(self, factor: int, grayscale: bool = False):
+        """Decoded at 1/factor (1, 2, 4 or 8), None if the JPEG is broken"""
+        return self.__cached(("image", factor, grayscale), lambda: decode_jpeg(self.jpeg, None, grayscale, factor)[0])
+
+    def bgr(self):
+        return self.reduced(1)
+
+    def downscaled(self, target_size: tuple) -> tuple:
+        """(image, factor) at the smallest reduction still at least target_size (width, height)"""
+        factor = reduction_for(self.size, target_size)
+        return self.reduced(factor), factor
+
+    def gray(self, factor: int = 1):
+        return self.reduced(factor, grayscale=True)
+
+    def base64(self) -> str:
+        return self.__cached("base64", lambda: base64.b64encode(self.jpeg).decode())
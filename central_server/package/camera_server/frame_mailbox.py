@@ -0,0 +1,96 @@
+import collections
+import threading
+import time
+
+class LatestFrameMailbox:
+    """
+    One pending item per camera, a newer put replaces the pending one
+    (coalesced) so memory stays at one frame per camera and detection never
+    works through a backlog of stale frames.
+
+    get() hands cameras out round robin: a camera with a pending frame joins
+    the back of the line and keeps its place while its frame is replaced.
+    """
+
+    def __init__(self):
+        self.__pending: dict = {} # key -> (item, put_at)
+        self.__ready = collections.deque() # keys with a pending item, in serving order
+        self.__condition = threading.Condition()
+
+        self.put_count = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.processed = 0
+        self.total_age = 0.0
+        self.max_age = 0.0
+        self.last_age = 0.0
+
+    def put(self, key, item):
+        with self.__condition:
+            self.put_count += 1
+            if key in self.__pending:
+                self.coalesced += 1
+            else:
+                self.__ready.append(key)
+            self.__pending[key] = (item, time.monotonic())
+            self.__condition.notify()
+
+    def get(self, timeout: float | None = None) -> tuple | None:
+        """Returns (key, item, seconds it waited), or None on timeout"""
+        with self.__condition:
+            if not self.__condition.wait_for(lambda: self.__ready, timeout):
+                return None
+            key = self.__ready.popleft()
+            item, put_at = self.__pending.pop(key)
+
+            age = time.monotonic() - put_at
+            self.processed += 1
+            self.total_age += age
+            self.last_age = age
+            self.max_age = max(self.max_age, age)
+            return key, item, age
+
+    def get_batch(self, max_items: int, max_wait: float) -> list:
+        """
+        Blocks for the first item, then keeps collecting until max_items or
+        max_wait seconds after the first one. Each camera is in a batch at most once.
+        """
+        first = self.get()
+        batch = {first[0]: first}
+        deadline = time.monotonic() + max_wait
+        while len(batch) < max_items:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            entry = self.get(remaining)
+            if entry is None:
+                break
+            if entry[0] in batch:
+                # A newer frame from a camera already in the batch replaces its frame
+                with self.__condition:
+                    self.coalesced += 1
+            batch[entry[0]] = entry
+        return list(batch.values())
+
+    def discard(self, key):
+        """Drops the pending item of a camera that went away"""
+        with self.__condition:
+            if self.__pending.pop(key, None) is not None:
+                self.__ready.remove(key)
+                self.dropped += 1
+
+    def get_stats(self) -> dict:
+        with self.__condition:
+            now = time.monotonic()
+            oldest = min((put_at for _, put_at in self.__pending.values()), default=now)
+            return {
+                "pending": len(self.__pending),
+                "put": self.put_count,
+                "coalesced": self.coalesced,
+                "dropped": self.dropped,
+                "processed": self.processed,
+                "oldest_pending_age": now - oldest,
+                "last_age": self.last_age,
+                "avg_age": self.total_age / self.processed if self.processed else 0,
+                "max_age": self.max_age,
+            }
@@ -0,0 +1,218 @@
+import multiprocessing
+import threading
+import time
+
+from package.camera_server.camera_server import CameraServer
+from package.camera_server.constants import Constants
+from package.socket_server_lib.logger import DefaultLogger
+
+# Worker -> parent callbacks, the rest (on_camera_discovered) only happen in the discovery process
+FORWARDED_EVENTS = (
+    "on_camera_paired",
+    "on_camera_pairing_failed",
+    "on_camera_repair_failed",
+    "on_camera_frame",
+    "on_red_zone_trigger",
+    "on_camera_disconnected",
+)
+
+# Parent -> worker CameraServer methods
+WORKER_COMMANDS = (
+    "stream_camera",
+    "stop_stream",
+    "set_red_zone",
+    "set_alert_categories",
+    "set_motion_sensitivity",
+    "expect_pairing",
+    "forget_pairing",
+)
+
+WORKER_DIED = "worker_died" # queued by the watcher behind whatever the dead worker sent before it died
+
+def _run_ingest_worker(index: int, events, commands):
+    logger = DefaultLogger()
+
+    def forward(name):
+        return lambda *args: events.put((index, name, args))
+
+    server = CameraServer(
+        {name: forward(name) for name in FORWARDED_EVENTS},
+        logger,
+        discovery=False,
+        ingest=True,
+        reuse_port=True,
+    )
+    logger.info("Ingest worker %d started", index)
+
+    while True:
+        name, args = commands.get()
+        if name not in WORKER_COMMANDS:
+            logger.error("Unknown ingest worker command: %s", name)
+            continue
+        try:
+            getattr(server, name)(*args)
+        except Exception as e:
+            logger.error("Ingest worker command %s%s failed: %s", name, args, e)
+
+class CameraIngestCluster:
+    """
+    CameraServer split over processes: this process keeps discovery and
+    pairing, `workers` processes each bind CAMERA_HANDLER_PORT with
+    SO_REUSEPORT and own the cameras the kernel hands them, so decrypt,
+    decode and recording don't share one GIL.
+
+    Workers send their callbacks here over one event queue and get commands
+    over a queue each. The methods ClientHandler uses are the same as
+    CameraServer's, connected_cameras maps mac -> (worker index, addr).
+
+    A worker that dies is restarted, its cameras are reported disconnected
+    and reconnect to whichever worker the kernel picks.
+    """
+
+    def __init__(self, callbacks: dict, workers: int, logger=DefaultLogger()):
+        self.logger = logger
+        self.callbacks = callbacks
+        self.connected_cameras: dict[str, tuple] = {}
+
+        # Bad codes arrive here over UDP, the workers have to forget the pending pairing too
+        discovery_callbacks = dict(callbacks)
+        discovery_callbacks["on_camera_pairing_failed"] = self.__on_bad_code
+        self.discovery = CameraServer(discovery_callbacks, logger, discovery=True, ingest=False)
+        self.db = self.discovery.db
+
+        # spawn: workers load their own detector model instead of inheriting this process' threads
+        self.__context = multiprocessing.get_context("spawn")
+        self.__events = self.__context.Queue()
+        self.__commands = [None] * workers
+        self.__workers = [None] * workers
+        for index in range(workers):
+            self.__start_worker(index)
+
+        threading.Thread(target=self.__forward_events, daemon=True).start()
+        threading.Thread(target=self.__watch_workers, daemon=True).start()
+
+    def __start_worker(self, index: int):
+        # A fresh command queue, the old one may hold commands for cameras the dead worker had
+        self.__commands[index] = self.__context.Queue()
+        process = self.__context.Process(target=_run_ingest_worker, args=(index, self.__events, self.__commands[index]), daemon=True)
+        process.start()
+        self.__workers[index] = process
+
+    def __watch_workers(self):
+        while True:
+            time.sleep(Constants.INGEST_WORKER_CHECK_INTERVAL)
+            for index, process in enumerate(self.__workers):
+                if process.is_alive():
+                    continue
+                self.logger.error("Ingest worker %d died (exit code %s), restarting it", index, process.exitcode)
+                # Queued before the new worker starts, so its events come after this one
+                self.__events.put((index, WORKER_DIED, (process.pid,)))
+                self.__start_worker(index)
+
+    def __on_worker_died(self, index: int):
+        # The worker's connections died with it. Cameras paired on the new worker come after this event and are kept
+        for mac, (owner, addr) in list(self.connected_cameras.items()):
+            if owner != index:
+                continue
+            del self.connected_cameras[mac]
+            try:
+                self.callbacks["on_camera_disconnected"](addr, mac)
+            except Exception as e:
+                self.logger.error("Error forwarding on_camera_disconnected for camera %s of dead ingest worker %d: %s", mac, index, e)
+
+    def __send(self, index: int, name: str, *args):
+        self.__commands[index].put((name, args))
+
+    def __send_all(self, name: str, *args):
+        for index in range(len(self.__commands)):
+            self.__send(index, name, *args)
+
+    def __forward_events(self):
+        while True:
+            index, name, args = self.__events.get()
+            if name == WORKER_DIED:
+                self.__on_worker_died(index)
+                continue
+            try:
+                self.__track_event(index, name, args)
+                self.callbacks[name](*args)
+            except Exception as e:
+                self.logger.error("Error forwarding %s from ingest worker %d: %s", name, index, e)
+
+    def __track_event(self, index: int, name: str, args: tuple):
+        if name == "on_camera_paired":
+            addr, mac = args
+            self.connected_cameras[mac] = (index, addr)
+            self.__forget_pairing(addr[0])
+        elif name in ("on_camera_pairing_failed", "on_camera_repair_failed"):
+            self.__forget_pairing(args[0][0])
+        elif name == "on_camera_disconnected":
+            addr, mac = args
+            # The camera may already be connected again, possibly to another worker
+            if self.connected_cameras.get(mac) == (index, addr):
+                del self.connected_cameras[mac]
+
+    def __forget_pairing(self, camera_ip):
+        self.discovery.forget_pairing(camera_ip)
+        self.__send_all("forget_pairing", camera_ip)
+
+    def __on_bad_code(self, addr, mac, reason):
+        self.__send_all("forget_pairing", addr[0])
+        self.callbacks["on_camera_pairing_failed"](addr, mac, reason)
+
+    def __owner(self, camera_mac):
+        owner = self.connected_cameras.get(camera_mac)
+        if owner is None:
+            self.logger.error("Camera %s not connected", camera_mac)
+        return owner
+
+    def discover_cameras(self, timeout=-1):
+        self.discovery.discover_cameras(timeout)
+
+    def stop_discovery(self):
+        self.discovery.stop_discovery()
+
+    def pair_camera(self, camera_addr, camera_code):
+        # Whichever worker the camera's connection lands on has to accept it
+        self.__send_all("expect_pairing", camera_addr[0])
+        self.discovery.pair_camera(camera_addr, camera_code)
+
+    def unpair_camera(self, camera_mac):
+        owner = self.__owner(camera_mac)
+        if owner is None:
+            return False
+        return self.discovery.unpair_camera(camera_mac, camera_ip=owner[1][0])
+
+    def stream_camera(self, camera_mac):
+        owner = self.__owner(camera_mac)
+        if owner is None:
+            return None
+        self.__send(owner[0], "stream_camera", camera_mac)
+        return True
+
+    def stop_stream(self, camera_mac):
+        owner = self.__owner(camera_mac)
+        if owner is None:
+            return None
+        self.__send(owner[0], "stop_stream", camera_mac)
+
+    def set_red_zone(self, camera_mac, red_zone):
+        owner = self.connected_cameras.get(camera_mac)
+        if owner is None:
+            self.discovery.set_red_zone(camera_mac, red_zone)
+        else:
+            self.__send(owner[0], "set_red_zone", camera_mac, red_zone)
+
+    def set_motion_sensitivity(self, camera_mac, motion_sensitivity):
+        owner = self.connected_cameras.get(camera_mac)
+        if owner is None:
+            self.discovery.set_motion_sensitivity(camera_mac, motion_sensitivity)
+        else:
+            self.__send(owner[0], "set_motion_sensitivity", camera_mac, motion_sensitivity)
+
+    def set_alert_categories(self, camera_mac, alert_categories):
+        owner = self.connected_cameras.get(camera_mac)
+        if owner is None:
+            self.discovery.set_alert_categories(camera_mac, alert_categories)
+        else:
+            self.__send(owner[0], "set_alert_categories", camera_mac, alert_categories)
@@ -0,0 +1,67 @@
+import time
+import cv2
+import numpy as np
+
+# reduction factor -> (colour flag, grayscale flag), libjpeg scales these in the DCT so the full image is never built
+REDUCED_MODES = {
+    1: (cv2.IMREAD_COLOR, cv2.IMREAD_GRAYSCALE),
+    2: (cv2.IMREAD_REDUCED_COLOR_2, cv2.IMREAD_REDUCED_GRAYSCALE_2),
+    4: (cv2.IMREAD_REDUCED_COLOR_4, cv2.IMREAD_REDUCED_GRAYSCALE_4),
+    8: (cv2.IMREAD_REDUCED_COLOR_8, cv2.IMREAD_REDUCED_GRAYSCALE_8),
+}
+
+# Start of frame markers (baseline, extended, progressive, lossless) carry the image size
+_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+def jpeg_size(jpeg: bytes) -> tuple | None:
+    """(width, height) from the JPEG header without decoding, None if it isn't a readable JPEG"""
+    if jpeg[:2] != b"\xff\xd8":
+        return None
+    offset = 2
+    while offset + 9 <= len(jpeg):
+        if jpeg[offset] != 0xFF:
+            return None
+        marker = jpeg[offset + 1]
+        if marker == 0xFF: # fill byte
+            offset += 1
+            continue
+        if marker in _SOF_MARKERS:
+            height = int.from_bytes(jpeg[offset + 5:offset + 7], "big")
+            width = int.from_bytes(jpeg[offset + 7:offset + 9], "big")
+            return width, height
+        if marker == 0xDA: # scan data starts, no frame header before it
+            return None
+        offset += 2 + int.from_bytes(jpeg[offset + 2:offset + 4], "big")
+    return None
+
+def reduction_for(source_size: tuple | None, target_size: tuple | None) -> int:
+    """Largest reduction that still leaves the image at least target_size (width, height)"""
+    if source_size is None or target_size is None:
+        return 1
+    for factor in (8, 4, 2):
+        if source_size[0] // factor >= target_size[0] and source_size[1] // factor >= target_size[1]:
+            return factor
+    return 1
+
+def decode_jpeg(jpeg: bytes, target_size: tuple | None = None, grayscale: bool = False, factor: int | None = None) -> tuple:
+    """
+    Decodes at the smallest DCT scale that is still at least target_size,
+    None target_size is a full decode, or at an explicit factor. Returns
+    (image or None, factor), the factor maps image coordinates back to the full frame.
+    """
+    if factor is None:
+        factor = reduction_for(jpeg_size(jpeg), target_size)
+    flag = REDUCED_MODES[factor][1 if grayscale else 0]
+    return cv2.imdecode(np.frombuffer(jpeg, np.uint8), flag), factor
+
+def benchmark(jpeg: bytes, repeat: int = 50) -> dict:
+    """Average milliseconds per decode for every reduction, colour and grayscale"""
+    buffer = np.frombuffer(jpeg, np.uint8)
+    results = {}
+    for factor, flags in REDUCED_MODES.items():
+        for name, flag in zip(("color", "grayscale"), flags):
+            started = time.perf_counter()
+            for _ in range(repeat):
+                cv2.imdecode(buffer, flag)
+            results[f"{name}_{factor}"] = (time.perf_counter() - started) / repeat * 1000
+    return results
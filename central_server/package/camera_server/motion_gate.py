@@ -0,0 +1,91 @@
+import threading
+import time
+import cv2
+import numpy as np
+
+from package.camera_server.frame import Frame
+
+class MotionGate:
+    """
+    Cheap check in front of the detector: the frame is decoded at 1/DOWNSCALE
+    in grayscale, blurred and diffed against the camera's previous checked
+    frame, only inside the red zone. Frames go to YOLO only when enough of the
+    zone changed. sensitivity is 0-100 per camera, higher lets smaller changes through.
+    """
+
+    DOWNSCALE = 4
+    PIXEL_THRESHOLD = 25 # per pixel gray level change that counts as changed
+    MIN_CHANGED_FRACTION = 0.001 # of the zone, at sensitivity 100
+    MAX_CHANGED_FRACTION = 0.05 # of the zone, at sensitivity 0
+    DEFAULT_SENSITIVITY = 50
+
+    def __init__(self):
+        self.__previous: dict[str, np.ndarray] = {}
+        self.__masks: dict[str, tuple] = {} # mac -> ((zone, shape), mask)
+        self.__lock = threading.Lock()
+        self.passed = 0
+        self.blocked = 0
+        self.seconds = 0.0
+
+    @staticmethod
+    def changed_fraction_threshold(sensitivity: int) -> float:
+        sensitivity = min(max(sensitivity, 0), 100)
+        return MotionGate.MIN_CHANGED_FRACTION + (100 - sensitivity) / 100 * (MotionGate.MAX_CHANGED_FRACTION - MotionGate.MIN_CHANGED_FRACTION)
+
+    def __get_mask(self, mac: str, red_zone: list, shape: tuple) -> np.ndarray:
+        key = (str(red_zone), shape)
+        cached = self.__masks.get(mac)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+        mask = np.zeros(shape, dtype=np.uint8)
+        polygon = np.array(red_zone, dtype=np.float32) / MotionGate.DOWNSCALE
+        cv2.fillPoly(mask, [polygon.astype(np.int32)], 255)
+        self.__masks[mac] = (key, mask)
+        return mask
+
+    def __record(self, passed: bool, started: float) -> bool:
+        with self.__lock:
+            if passed:
+                self.passed += 1
+            else:
+                self.blocked += 1
+            self.seconds += time.perf_counter() - started
+        return passed
+
+    def has_motion(self, mac: str, frame: Frame, red_zone: list | None, sensitivity: int = DEFAULT_SENSITIVITY) -> bool:
+        started = time.perf_counter()
+        if not red_zone or len(red_zone) < 3:
+            return self.__record(False, started) # nothing to watch
+
+        gray = frame.gray(MotionGate.DOWNSCALE)
+        if gray is None:
+            return self.__record(True, started) # let the detector path report the broken frame
+
+        gray = cv2.GaussianBlur(gray, (5, 5), 0) # a new array, the frame's cached decode stays untouched
+        previous = self.__previous.get(mac)
+        self.__previous[mac] = gray
+        if previous is None or previous.shape != gray.shape:
+            return self.__record(True, started)
+
+        mask = self.__get_mask(mac, red_zone, gray.shape)
+        zone_area = cv2.countNonZero(mask)
+        if zone_area == 0:
+            return self.__record(False, started)
+
+        _, changed = cv2.threshold(cv2.absdiff(gray, previous), MotionGate.PIXEL_THRESHOLD, 255, cv2.THRESH_BINARY)
+        changed_fraction = cv2.countNonZero(cv2.bitwise_and(changed, mask)) / zone_area
+        return self.__record(changed_fraction >= MotionGate.changed_fraction_threshold(sensitivity), started)
+
+    def forget(self, mac: str):
+        self.__previous.pop(mac, None)
+        self.__masks.pop(mac, None)
+
+    def get_stats(self) -> dict:
+        with self.__lock:
+            checked = self.passed + self.blocked
+            return {
+                "passed": self.passed,
+                "blocked": self.blocked,
+                "avg_ms": self.seconds / checked * 1000 if checked else 0,
+            }
@@ -1,13 +1,54 @@
+import collections
+import threading
+import time
 from tabnanny import verbose
 import cv2
+import torch
 from ultralytics import YOLO
 
+class DetectorStats:
+    LATENCY_WINDOW = 1000 # latest frames kept for the percentile
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.frames = 0
+        self.batches = 0
+        self.inference_seconds = 0.0
+        self.__latencies = collections.deque(maxlen=DetectorStats.LATENCY_WINDOW)
+
+    def record_batch(self, size: int, seconds: float):
+        with self.__lock:
+            self.frames += size
+            self.batches += 1
+            self.inference_seconds += seconds
+
+    def record_latency(self, seconds: float):
+        """Frame queued -> detections ready"""
+        with self.__lock:
+            self.__latencies.append(seconds)
+
+    def snapshot(self) -> dict:
+        with self.__lock:
+            latencies = sorted(self.__latencies)
+            return {
+                "frames": self.frames,
+                "batches": self.batches,
+                "avg_batch_size": self.frames / self.batches if self.batches else 0,
+                "frames_per_second": self.frames / self.inference_seconds if self.inference_seconds else 0,
+                "p95_latency_ms": latencies[int(len(latencies) * 0.95)] * 1000 if latencies else 0,
+            }
+
 class MovementDetector:
-    def __init__(self, logger, threshold=70):
+    def __init__(self, logger, threshold=70, batch_size=None, cuda_batch_size=8):
+        """batch_size: frames per forward pass, None for cuda_batch_size on CUDA and 1 on CPU"""
         self.threshold = threshold
         self.logger = logger
         self.logger.info("Setting up model...")
         self.yolo = YOLO('assets/yolov8s.pt')
+        self.stats = DetectorStats()
+        # predict runs on the first GPU when there is one. On CPU the batch costs its frames' time one by one.
+        self.batch_size = batch_size if batch_size else (cuda_batch_size if torch.cuda.is_available() else 1)
+        self.logger.info("Detection batch size %s", self.batch_size)
 
     def __get_colours(self, cls_num):
         base_colors = [(255, 0, 0), (0, 255, 0), (0, 0, 255)]
@@ -16,28 +57,37 @@ class MovementDetector:
         color = [base_colors[color_index][i] + increments[color_index][i] * (cls_num // len(base_colors)) % 256 for i in range(3)]
         return tuple(color)
 
-    def detect_frame(self, cv2_frame, draw_box=False):
-        results = self.yolo.track(cv2_frame, stream=False, verbose=False)
+    def __parse_result(self, result, cv2_frame, draw_box):
         detected_objects = []
+        classes_names = result.names
+        for box in result.boxes:
+            if box.conf[0] * 100 >= self.threshold:
+                [x1, y1, x2, y2] = box.xyxy[0]
+                x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
+                cls = int(box.cls[0])
+                class_name = classes_names[cls]
+
+                detected_objects.append({
+                    'class': class_name,
+                    'confidence': box.conf[0],
+                    'coordinates': (x1, y1, x2, y2)
+                })
+
+                if draw_box:
+                    colour = self.__get_colours(cls)
+                    cv2.rectangle(cv2_frame, (x1, y1), (x2, y2), colour, 2)
+        return detected_objects
 
-        for result in results:
-            classes_names = result.names
-            for box in result.boxes:
-                if box.conf[0] * 100 >= self.threshold:
-                    [x1, y1, x2, y2] = box.xyxy[0]
-                    x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
-                    cls = int(box.cls[0])
-                    class_name = classes_names[cls]
-
-                    detected_objects.append({
-                        'class': class_name,
-                        'confidence': box.conf[0],
-                        'coordinates': (x1, y1, x2, y2)
-                    })
-
-                    if draw_box:
-                        colour = self.__get_colours(cls)
-                        cv2.rectangle(cv2_frame, (x1, y1), (x2, y2), colour, 2)
-
-        return cv2_frame, detected_objects
-                    
\ No newline at end of file
+    def detect_frames(self, cv2_frames: list, draw_box=False) -> list:
+        """
+        One forward pass over frames from any number of cameras, returns
+        [(frame, detections)] in the same order. predict instead of track:
+        a tracker would mix up objects from different cameras in one batch.
+        """
+        started = time.perf_counter()
+        results = self.yolo.predict(cv2_frames, stream=False, verbose=False)
+        self.stats.record_batch(len(cv2_frames), time.perf_counter() - started)
+        return [(frame, self.__parse_result(result, frame, draw_box)) for frame, result in zip(cv2_frames, results)]
+
+    def detect_frame(self, cv2_frame, draw_box=False):
+        return self.detect_frames([cv2_frame], draw_box)[0]
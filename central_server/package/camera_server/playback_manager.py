@@ -7,41 +7,64 @@ import gzip
 import io
 
 from package.camera_server.constants import Constants
+from package.camera_server.frame import Frame
+
+class ChunkEncoder:
+    """
+    One camera's open timelapse segment. Frames are downscaled and encoded as
+    they arrive, so a camera costs one x264 context instead of a chunk of
+    decoded frames, and encode CPU comes per frame instead of in a burst at
+    the chunk boundary. zerolatency turns off x264's lookahead, which would
+    otherwise hold frames back until the flush. One thread per encoder, the
+    recorder already spreads cameras over threads.
+    """
+
+    PRESET = "veryslow"
+    OPTIONS = {"crf": "40", "tune": "zerolatency", "x264-params": "threads=1"}
+
+    def __init__(self, camera_id: str, preset: str = PRESET):
+        self.camera_id = camera_id
+        self.time_started = datetime.datetime.now()
+        self.frames = 0
+
+        self.__buffer = io.BytesIO()
+        self.__container = av.open(self.__buffer, 'w', format='mp4')
+        self.__stream = self.__container.add_stream('h264', rate=int(Constants.TIMELAPSE_FPS))  # use 5 fps for maximum size reduction
+        self.__stream.width, self.__stream.height = Constants.TIMELAPSE_SIZE
+        self.__stream.pix_fmt = 'yuv420p'
+        self.__stream.options = {**ChunkEncoder.OPTIONS, "preset": preset}
+
+    @property
+    def duration(self) -> float:
+        return self.frames / Constants.TIMELAPSE_FPS
+
+    def add(self, frame: np.ndarray):
+        """frame: TIMELAPSE_SIZE BGR, see PlaybackManager.timelapse_image"""
+        for packet in self.__stream.encode(av.VideoFrame.from_ndarray(frame, format='bgr24')):
+            self.__container.mux(packet)
+        self.frames += 1
+
+    def finish(self) -> bytes:
+        """Flushes the encoder and returns the finished mp4"""
+        for packet in self.__stream.encode():
+            self.__container.mux(packet)
+        self.__container.close()
+        return self.__buffer.getvalue()
 
-timelapse_current_chunks = {}  # {id: {time_started: datetime.datetime, frames: list, size, last_added}}
 class PlaybackManager:
 
     @staticmethod
-    def save_chunk(camera_id: str):
-        if camera_id not in timelapse_current_chunks:
+    def save_chunk(camera_id: str, chunk: ChunkEncoder):
+        if chunk.frames == 0:
+            chunk.finish()
             return
-
-        chunk = timelapse_current_chunks[camera_id]
-        frames = chunk["frames"]
-
-        buffer = io.BytesIO()
-        with av.open(buffer, 'w', format='mp4') as container:
-            stream = container.add_stream('h264', rate=int(Constants.TIMELAPSE_FPS))  # use 5 fps for maximum size reduction
-            stream.width = 320   # or chunk["size"][0] if you keep it small from start
-            stream.height = 240  # or chunk["size"][1]
-            stream.pix_fmt = 'yuv420p'
-            stream.options = {"crf": "40", "preset": "veryslow"}
-            for frame in frames:
-                # Optionally resize here to 320x240:
-                if frame.shape[0] != 240 or frame.shape[1] != 320:
-                    frame = cv2.resize(frame, (320, 240))
-                f = av.VideoFrame.from_ndarray(frame, format='bgr24')
-                for packet in stream.encode(f):
-                    container.mux(packet)
-            for packet in stream.encode():
-                container.mux(packet)
-        video_bytes = buffer.getvalue()
+        video_bytes = chunk.finish()
 
         chunk_bytes = b""
-        chunk_bytes += camera_id.encode() + b"\0" + chunk["time_started"].isoformat().encode() + b"\0" + (320).to_bytes(4, 'big') + b"\0" + (240).to_bytes(4, 'big') + b"\0"
+        chunk_bytes += camera_id.encode() + b"\0" + chunk.time_started.isoformat().encode() + b"\0" + Constants.TIMELAPSE_SIZE[0].to_bytes(4, 'big') + b"\0" + Constants.TIMELAPSE_SIZE[1].to_bytes(4, 'big') + b"\0"
         # compressed_video = gzip.compress(video_bytes, compresslevel=1)  # gzip is not very helpful here; can use lowest level for speed
         chunk_bytes += video_bytes
-        chunk_filename = f"recordings/{camera_id}/{chunk['time_started'].strftime('%Y-%m-%d_%H-%M-%S')}.mp4.gz"
+        chunk_filename = f"recordings/{camera_id}/{chunk.time_started.strftime('%Y-%m-%d_%H-%M-%S')}.mp4.gz"
         with open(chunk_filename, "wb") as f:
             f.write(chunk_bytes)
 
@@ -99,30 +122,55 @@ class PlaybackManager:
                 }
 
     @staticmethod
-    def add_frame(camera_id: str, jpg_frame: bytes):
+    def timelapse_image(frame: Frame) -> np.ndarray | None:
+        """The frame at exactly TIMELAPSE_SIZE, None if it doesn't decode"""
+        cv2_frame, _ = frame.downscaled(Constants.TIMELAPSE_SIZE)
+        # Frames are decoded at the nearest DCT scale above TIMELAPSE_SIZE, this only trims the rest
+        if cv2_frame is not None and (cv2_frame.shape[1], cv2_frame.shape[0]) != Constants.TIMELAPSE_SIZE:
+            cv2_frame = cv2.resize(cv2_frame, Constants.TIMELAPSE_SIZE, interpolation=cv2.INTER_AREA)
+        return cv2_frame
+
+    @staticmethod
+    def add_frame(chunks: dict, camera_id: str, frame: Frame) -> bool:
+        """
+        Encodes an already sampled frame into the camera's open chunk in chunks
+        ({id: ChunkEncoder}, owned by one recording worker). Returns True when
+        that filled the chunk and it was saved.
+        """
+        cv2_frame = PlaybackManager.timelapse_image(frame)
+        if cv2_frame is None:
+            return False
+        return PlaybackManager.add_image(chunks, camera_id, cv2_frame)
+
+    @staticmethod
+    def add_image(chunks: dict, camera_id: str, image: np.ndarray, preset: str = ChunkEncoder.PRESET) -> bool:
+        """add_frame for an already downscaled image, preset only applies when this starts a chunk"""
         camera_id = camera_id.replace(":", "-")
-        if camera_id in timelapse_current_chunks and (datetime.datetime.now() - timelapse_current_chunks[camera_id]["last_added"]).total_seconds() < Constants.TIMELAPSE_FPS:
-            return
+        if camera_id not in chunks:
+            if not os.path.exists(f"recordings/{camera_id}"):
+                os.makedirs(f"recordings/{camera_id}")
+            chunks[camera_id] = ChunkEncoder(camera_id, preset)
+
+        chunk = chunks[camera_id]
+        chunk.add(image)
+        if chunk.duration >= Constants.TIMELAPSE_CHUNK_DURATION:
+            PlaybackManager.save_chunk(camera_id, chunks.pop(camera_id))
+            return True
+        return False
 
-        if not os.path.exists(f"recordings/{camera_id}"):
-            os.makedirs(f"recordings/{camera_id}")
-
-        cv2_frame = cv2.imdecode(np.frombuffer(jpg_frame, np.uint8), cv2.IMREAD_COLOR)
-
-        if camera_id not in timelapse_current_chunks:
-            frame_height, frame_width = cv2_frame.shape[:2]
-            timelapse_current_chunks[camera_id] = {
-                "time_started": datetime.datetime.now(),
-                "frames": [],
-                "size": (frame_width, frame_height),
-                "last_added": datetime.datetime.now()
-            }
-
-        timelapse_current_chunks[camera_id]["frames"].append(cv2_frame)
-        elapsed_time = len(timelapse_current_chunks[camera_id]["frames"]) / Constants.TIMELAPSE_FPS
-        if elapsed_time >= Constants.TIMELAPSE_CHUNK_DURATION:
-            PlaybackManager.save_chunk(camera_id)
-            if camera_id in timelapse_current_chunks: del timelapse_current_chunks[camera_id]
+    @staticmethod
+    def flush(chunks: dict, camera_id: str):
+        """Saves whatever the camera's chunk has, e.g. when the camera goes away"""
+        chunk = chunks.pop(camera_id.replace(":", "-"), None)
+        if chunk is not None:
+            PlaybackManager.save_chunk(camera_id.replace(":", "-"), chunk)
+
+    @staticmethod
+    def abort(chunks: dict, camera_id: str):
+        """Drops the camera's open chunk without saving it"""
+        chunk = chunks.pop(camera_id.replace(":", "-"), None)
+        if chunk is not None:
+            chunk.finish()
 
     @staticmethod
     def get_chunks_merged(camera_id: str, start_time: datetime.datetime, chunks: int):
@@ -0,0 +1,155 @@
+import multiprocessing
+import queue
+import threading
+import time
+import zlib
+
+from package.camera_server.constants import Constants
+from package.camera_server.encoder_pool import EncoderPool
+from package.camera_server.frame import Frame
+from package.camera_server.playback_manager import PlaybackManager
+from package.socket_server_lib.logger import DefaultLogger
+
+class FrameSampler:
+    """Keeps one frame per camera every `interval` seconds, decided before anything is decoded"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.__next_due: dict[str, float] = {}
+
+    def should_keep(self, mac: str, now: float) -> bool:
+        due = self.__next_due.get(mac)
+        if due is not None and now < due:
+            return False
+        # From the previous slot, not from now, so jitter doesn't slowly lower the rate
+        self.__next_due[mac] = now + self.interval if due is None or now - due >= self.interval else due + self.interval
+        return True
+
+    def forget(self, mac: str):
+        self.__next_due.pop(mac, None)
+
+class Recorder:
+    """
+    Timelapse recording off the frame path. The sampler keeps TIMELAPSE_FPS
+    frames per camera, kept frames go to one of `workers` threads picked by
+    camera, so a camera's chunk is only ever touched by one thread and its
+    frames stay in order. Queues are bounded, a full queue drops the frame
+    (dropped) instead of stalling the camera's reader.
+
+    With encoder_processes the threads only decode and downscale, encoding
+    happens in an EncoderPool, until the pool fails.
+
+    Capacity is bound by the encode, not by this pool: every recorded camera
+    costs TIMELAPSE_FPS encodes a second, about 9 ms each at TIMELAPSE_SIZE
+    with the veryslow preset (1.2 ms with veryfast). One core keeps up with
+    about 20 cameras, 200 cameras need about 10 cores of encoder processes or
+    the fast preset. Past that frames are dropped or chunks skipped, ingest
+    never waits on recording.
+    """
+
+    def __init__(self, workers: int = Constants.RECORDING_WORKERS, queue_size: int = Constants.RECORDING_QUEUE_SIZE, logger=DefaultLogger(),
+                 encoder_processes: int = Constants.RECORDING_ENCODER_PROCESSES):
+        self.logger = logger
+        self.sampler = FrameSampler(1 / Constants.TIMELAPSE_FPS)
+        self.__sampler_lock = threading.Lock()
+        self.__queues = [queue.Queue(maxsize=queue_size) for _ in range(workers)]
+        self.__stats_lock = threading.Lock()
+
+        self.received = 0
+        self.sampled = 0
+        self.dropped = 0
+        self.encoded = 0 # frames added to a chunk
+        self.chunks = 0 # chunks saved
+        self.busy_seconds = 0.0
+
+        self.encoder_pool = None
+        if encoder_processes > 0:
+            if multiprocessing.current_process().daemon:
+                # CameraIngestCluster workers are daemon processes, those can't have children
+                self.logger.warning("Daemon process, timelapse encoding stays in the recorder threads")
+            else:
+                self.encoder_pool = EncoderPool(encoder_processes, logger=logger)
+
+        for index, frames in enumerate(self.__queues):
+            threading.Thread(target=self.__worker, args=(frames,), name=f"recorder-{index}", daemon=True).start()
+
+    def __queue_of(self, mac: str) -> queue.Queue:
+        return self.__queues[zlib.crc32(mac.encode()) % len(self.__queues)]
+
+    def submit(self, frame: Frame) -> bool:
+        """Called for every frame, True if it was kept for recording"""
+        with self.__sampler_lock:
+            self.received += 1
+            if not self.sampler.should_keep(frame.mac, frame.received_at):
+                return False
+            self.sampled += 1
+
+        try:
+            self.__queue_of(frame.mac).put_nowait((frame.mac, frame))
+            return True
+        except queue.Full:
+            with self.__stats_lock:
+                self.dropped += 1
+            return False
+
+    def forget(self, mac: str):
+        """Saves the camera's partial chunk and resets its sampling, for disconnects"""
+        with self.__sampler_lock:
+            self.sampler.forget(mac)
+        # Blocking put: the flush must not be dropped, it is once per disconnect
+        self.__queue_of(mac).put((mac, None))
+
+    def __worker(self, frames: queue.Queue):
+        chunks = {} # this worker's cameras only
+        while True:
+            mac, frame = frames.get()
+            started = time.perf_counter()
+            try:
+                pool = self.encoder_pool
+                if pool is not None and pool.failed:
+                    pool = None
+                    # Every worker sees it, only the first one logs
+                    with self.__stats_lock:
+                        if self.encoder_pool is not None:
+                            self.logger.error("Encoder processes failed, timelapse encoding is back in the recorder threads")
+                            self.encoder_pool = None
+                if pool is not None:
+                    self.__submit_to_pool(pool, mac, frame)
+                    continue
+                if frame is None:
+                    PlaybackManager.flush(chunks, mac)
+                    continue
+                saved = PlaybackManager.add_frame(chunks, mac, frame)
+                with self.__stats_lock:
+                    self.encoded += 1
+                    self.chunks += saved
+            except Exception as e:
+                self.logger.error("Error recording frame from camera %s: %s", mac, e)
+            finally:
+                with self.__stats_lock:
+                    self.busy_seconds += time.perf_counter() - started
+
+    @staticmethod
+    def __submit_to_pool(pool: EncoderPool, mac: str, frame: Frame | None):
+        if frame is None:
+            pool.flush(mac)
+            return
+        image = PlaybackManager.timelapse_image(frame)
+        if image is not None:
+            pool.submit(mac, image)
+
+    def get_stats(self) -> dict:
+        """With an encoder pool encoded and chunks stay 0, the pool's own stats are under encoder_pool"""
+        with self.__sampler_lock, self.__stats_lock:
+            stats = {
+                "received": self.received,
+                "sampled": self.sampled,
+                "dropped": self.dropped,
+                "encoded": self.encoded,
+                "chunks": self.chunks,
+                "queued": sum(frames.qsize() for frames in self.__queues),
+                "busy_seconds": self.busy_seconds,
+            }
+        if self.encoder_pool is not None:
+            stats["encoder_pool"] = self.encoder_pool.get_stats()
+        return stats
@@ -8,12 +8,15 @@ import websockets
 from websockets.asyncio.server import serve
 from package.camera_server.playback_manager import PlaybackManager
 from package.camera_server.constants import CATEGORY_TO_CLASS, Constants
+from package.camera_server.frame import Frame
 from package.client_handler_server.push_notification_manager import send_notification
 from package.client_handler_server.email_manager import send_reset_password_email, send_camera_share_email, send_motion_alert_email
 from package.camera_server.camera_server import CameraServer
+from package.camera_server.ingest_cluster import CameraIngestCluster
 from package.client_handler_server.constants import CHROMA_KEY_TOLERANCE, JUMPSACRE_CHROMA_KEY, JUMPSCARE, JUMPSCARE_VIDEO, RESET_CODE_VALIDITY_DURATION, WATCH_UNTIL_JUMPSCARE, ResponseStatus, RED_ZONE_ALERT_COOLDOWN
 from package.client_handler_server.database_manager import UserDatabase
 from package.socket_server_lib.socket_server import DefaultLogger
+from package.socket_server_lib.interfaces import default_registry
 import json
 import base64
 import hashlib
@@ -43,7 +46,7 @@ class ClientHandler:
         self.logger = logger
         self.running = False
         self.db = UserDatabase()
-        self.camera_server = CameraServer({
+        camera_callbacks = {
             "on_camera_discovered": lambda *a: self.__call_task(self.__on_camera_discovered, *a),
             "on_camera_paired": lambda *a: self.__call_task(self.__on_camera_paired, *a),
             "on_camera_pairing_failed": lambda *a: self.__call_task(self.__on_camera_pairing_failed, *a),
@@ -51,7 +54,11 @@ class ClientHandler:
             "on_camera_frame": lambda *a: self.__call_task(self.__on_camera_frame, *a),
             "on_red_zone_trigger": lambda *a: self.__call_task(self.__on_red_zone_trigger, *a),
             "on_camera_disconnected": lambda *a: self.__call_task(self.__on_camera_disconnect, *a),
-        })
+        }
+        if Constants.CAMERA_INGEST_WORKERS > 0:
+            self.camera_server = CameraIngestCluster(camera_callbacks, Constants.CAMERA_INGEST_WORKERS, logger)
+        else:
+            self.camera_server = CameraServer(camera_callbacks)
         
         self.CALLBACK_TABLE = {
             "discover_cameras": self.__discover_cameras,
@@ -63,6 +70,7 @@ class ClientHandler:
             "unpair_camera": self.__unpair_camera,
             "pair_camera": self.__pair_camera,
             "update_alert_categories": self.__update_alert_categories,
+            "update_motion_sensitivity": self.__update_motion_sensitivity,
             "get_playback_chunk": self.__get_playback_chunk,
             "get_playback_range": self.__get_playback_range,
 
@@ -136,29 +144,31 @@ class ClientHandler:
                 return email
         return None
 
-    def __manage_jumpscare(self, jpeg: bytes, email: str) -> bytes:
+    def __manage_jumpscare(self, frame: Frame, email: str) -> str:
+        """Base64 JPEG to stream to this user, the camera frame unless the jumpscare is playing"""
         js = self.jumpscare_data.get(email)
         if not js:
-            return jpeg
+            return frame.base64()
 
         if time.time() - js["started_watching"] < WATCH_UNTIL_JUMPSCARE:
-            return jpeg
+            return frame.base64()
 
         if js["last_video_frame"] >= self.js_frame_count:
             self.jumpscare_data.pop(email, None)
-            return jpeg
+            return frame.base64()
 
         js_frame = get_frame_at(self.js_cap, js["last_video_frame"])
         if js_frame is None:
             self.logger.error("Failed to read jumpscare frame")
             self.jumpscare_data.pop(email, None)
-            return jpeg
+            return frame.base64()
         js["last_video_frame"] += 1
 
-        cam_frame = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR)
+        # The composite goes out at no more than the jumpscare video's size
+        cam_frame, _ = frame.downscaled((js_frame.shape[1], js_frame.shape[0]))
         if cam_frame is None:
             self.logger.error("Failed to decode live camera frame")
-            return jpeg
+            return frame.base64()
 
         h, w = cam_frame.shape[:2]
         if js_frame.shape[:2] != (h, w):
@@ -170,15 +180,17 @@ class ClientHandler:
         bg = cv2.bitwise_and(cam_frame, cam_frame, mask=mask)
         out = cv2.add(bg, fg)
 
-        return cv2.imencode(".jpg", out, ENC_PARAMS)[1].tobytes()
+        return base64.b64encode(cv2.imencode(".jpg", out, ENC_PARAMS)[1]).decode()
         
 
-    async def __on_camera_frame(self, mac, frame):
+    async def __on_camera_frame(self, mac, frame: Frame):
         for websocket, jdata in self.streaming_transactions["frame"]:
             if jdata["mac"] == mac:
                 if self.do_jumpscare:
-                    frame = self.__manage_jumpscare(frame, self.__get_email_from_websocket(websocket))
-                await self.__send_websocket(websocket, self.__get_response(ResponseStatus.SUCCESS, {"mac": mac, "frame": base64.b64encode(frame).decode(), "type": "frame"}, jdata))
+                    b64_frame = self.__manage_jumpscare(frame, self.__get_email_from_websocket(websocket))
+                else:
+                    b64_frame = frame.base64() # encoded once for every viewer of this camera
+                await self.__send_websocket(websocket, self.__get_response(ResponseStatus.SUCCESS, {"mac": mac, "frame": b64_frame, "type": "frame"}, jdata))
 
     async def __on_camera_disconnect(self, addr, mac):
         self.logger.info(f"Camera {mac} disconnected")
@@ -275,11 +287,25 @@ class ClientHandler:
             await self.__send_websocket(websocket, self.__get_response(ResponseStatus.ERROR, "Invalid categories", jdata))
             return
         
-        self.camera_server.db.set_alert_categories(mac, json.dumps(categories))
-        self.camera_server.connected_cameras[mac].alert_categories = categories
+        self.camera_server.set_alert_categories(mac, categories)
         self.logger.info(f"Updated alert categories for camera {mac}: {categories}")
         await self.__send_websocket(websocket, self.__get_response(ResponseStatus.SUCCESS, "Alert categories updated", jdata))
 
+    async def __update_motion_sensitivity(self, websocket, jdata, email):
+        mac = jdata["mac"]
+        if mac not in self.db.get_linked_cameras(email):
+            await self.__send_websocket(websocket, self.__get_response(ResponseStatus.ERROR, "Camera not linked", jdata))
+            return
+        
+        sensitivity = jdata["sensitivity"]
+        if not isinstance(sensitivity, int) or isinstance(sensitivity, bool) or not 0 <= sensitivity <= 100:
+            await self.__send_websocket(websocket, self.__get_response(ResponseStatus.ERROR, "Invalid sensitivity", jdata))
+            return
+        
+        self.camera_server.set_motion_sensitivity(mac, sensitivity)
+        self.logger.info(f"Updated motion sensitivity for camera {mac}: {sensitivity}")
+        await self.__send_websocket(websocket, self.__get_response(ResponseStatus.SUCCESS, "Motion sensitivity updated", jdata))
+
     async def __get_playback_chunk(self, websocket, jdata, email):
         mac = jdata["mac"]
         if mac not in self.db.get_linked_cameras(email):
@@ -338,14 +364,13 @@ class ClientHandler:
         await self.__send_websocket(websocket, self.__get_response(ResponseStatus.SUCCESS, "Discovery stopped", jdata))
         self.__remove_transaction("discover_cameras", jdata["transaction_id"])
         if len(self.streaming_transactions["discover_cameras"]) == 0:
-            self.camera_server.discovering_cameras = False
-            self.logger.info("Discovery stopped")
+            self.camera_server.stop_discovery()
 
     async def __get_cameras(self, websocket, jdata, email):
         cameras = self.camera_server.db.get_all_cameras()
         linked_cameras = self.db.get_linked_cameras(email)
         connected_cameras = self.camera_server.connected_cameras
-        camera_list = [{"mac": cam.mac, "name": cam.name, "last_frame": base64.b64encode(cam.last_frame if cam.last_frame else b"").decode(), "ip": cam.last_known_ip, "connected": cam.mac in connected_cameras, "red_zone": cam.red_zone, "alert_categories": cam.alert_categories} for cam in cameras if cam.mac in linked_cameras]
+        camera_list = [{"mac": cam.mac, "name": cam.name, "last_frame": base64.b64encode(cam.last_frame if cam.last_frame else b"").decode(), "ip": cam.last_known_ip, "connected": cam.mac in connected_cameras, "red_zone": cam.red_zone, "alert_categories": cam.alert_categories, "motion_sensitivity": cam.motion_sensitivity} for cam in cameras if cam.mac in linked_cameras]
         await self.__send_websocket(websocket, self.__get_response(ResponseStatus.SUCCESS, {
             "cameras": camera_list,
             "categories": list(CATEGORY_TO_CLASS.keys())
@@ -461,15 +486,11 @@ class ClientHandler:
         
         polygon = jdata["polygon"]
         if not isinstance(polygon, list) or len(polygon) < 3:
-            self.camera_server.db.set_red_zone(mac, "[]")
-            self.camera_server.connected_cameras[mac].red_zone = []
-            if mac in self.camera_server.last_redzones: del self.camera_server.last_redzones[mac]
+            self.camera_server.set_red_zone(mac, [])
             await self.__send_websocket(websocket, self.__get_response(ResponseStatus.SUCCESS, "Polygon cleared", jdata))
             return
 
-        self.camera_server.db.set_red_zone(mac, json.dumps(polygon))
-        if mac in self.camera_server.last_redzones: del self.camera_server.last_redzones[mac]
-        self.camera_server.connected_cameras[mac].red_zone = polygon
+        self.camera_server.set_red_zone(mac, polygon)
         self.logger.info(f"Polygon saved for camera {mac} with {len(polygon)} points")
         await self.__send_websocket(websocket, self.__get_response(ResponseStatus.SUCCESS, "Polygon saved", jdata))
 
@@ -624,10 +645,7 @@ class ClientHandler:
         await self.__send_websocket(websocket, self.__get_response(ResponseStatus.SUCCESS, { "info": "Password reset successfully" }, jdata))
 
     def __generate_server_code(self):
-        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        s.connect(("8.8.8.8", 80))
-        local_ip = s.getsockname()[0]
-        s.close()
+        local_ip = default_registry.primary_address()
 
         local_ip_bytes = socket.inet_aton(local_ip)
         local_ip_base64 = base64.b64encode(local_ip_bytes).decode('utf-8')
@@ -0,0 +1,181 @@
+import asyncio
+import concurrent.futures
+from package.socket_server_lib import constants
+from package.socket_server_lib.client import SocketClient
+from package.socket_server_lib.socket_server import SocketServer
+
+class AsyncSocketServer(SocketServer):
+    """
+    SocketServer that serves every client from a single asyncio event loop
+    instead of a thread per client.
+
+    Same wire format, callbacks and add_custom_message_callback patterns as
+    SocketServer. The blocking helpers (send_data, receive_data,
+    exchange_aes_key_with_ecdh, ...) can still be used from other threads,
+    they are bridged onto the loop.
+
+    Message callbacks run on a bounded thread pool, never on the loop, so a
+    blocking callback only holds up its own connection. Sends are flow
+    controlled: past WRITE_HIGH_WATER buffered bytes the sending thread waits
+    for the client to drain, and a client that doesn't within SEND_DRAIN_TIMEOUT
+    (or buffers past WRITE_BUFFER_MAX) is disconnected.
+    """
+
+    STREAM_LIMIT = 1 << 20
+    CALLBACK_WORKERS = 32
+    WRITE_HIGH_WATER = 1 << 20
+    WRITE_BUFFER_MAX = 8 << 20
+    SEND_DRAIN_TIMEOUT = 10
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.protocol != constants.ServerProtocol.TCP:
+            raise ValueError("AsyncSocketServer only supports TCP")
+
+        self.loop: asyncio.AbstractEventLoop | None = None
+        self.__callback_pool = concurrent.futures.ThreadPoolExecutor(AsyncSocketServer.CALLBACK_WORKERS, thread_name_prefix="async-callback")
+
+    def __in_loop(self) -> bool:
+        try:
+            return asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            return False
+
+    def __run_in_loop(self, coro):
+        if self.__in_loop():
+            coro.close()
+            raise RuntimeError("Blocking socket call made from inside the event loop")
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def _close_client(self, client: SocketClient):
+        if self.__in_loop():
+            client.writer.close()
+        else:
+            self.loop.call_soon_threadsafe(client.writer.close)
+
+    async def __write(self, client: SocketClient, buffers: list) -> bool:
+        """Writes and waits while the transport is paused (above WRITE_HIGH_WATER), False if it never drains"""
+        client.writer.writelines(buffers)
+        try:
+            await asyncio.wait_for(client.writer.drain(), AsyncSocketServer.SEND_DRAIN_TIMEOUT)
+        except (asyncio.TimeoutError, ConnectionError):
+            return False
+        return True
+
+    def _send_buffers(self, client: SocketClient, buffers: list, options):
+        if not client.is_connected:
+            self.logger.error("Client %s is not connected", client.addr)
+            return
+
+        if self.__in_loop():
+            # Can't wait for a drain on the loop, only a hard cap on what a slow client may buffer
+            client.writer.writelines(buffers)
+            written = client.writer.transport.get_write_buffer_size() <= AsyncSocketServer.WRITE_BUFFER_MAX
+        else:
+            written = self.__run_in_loop(self.__write(client, buffers))
+
+        if not written:
+            self.logger.warning("Client %s is not draining its send buffer, disconnecting", client.addr)
+            self.disconnect_client(client)
+            return
+        self.logger.debug("Sent raw bytes to %s", client.addr)
+
+    def _receive_raw_bytes(self, client: SocketClient, size: int) -> bytes:
+        try:
+            # No read timeout, a silent client is dropped by the idle timer wheel, which also ends this read
+            return self.__run_in_loop(client.reader.readexactly(size))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            self.logger.error("Client %s disconnected", client.addr)
+        return b""
+
+    @staticmethod
+    def __resolve(future: asyncio.Future):
+        if not future.done():
+            future.set_result(None)
+
+    async def __wait_for_auto_recv(self, client: SocketClient):
+        resumed = self.loop.create_future()
+        client.on_auto_recv(lambda: self.loop.call_soon_threadsafe(AsyncSocketServer.__resolve, resumed))
+        await resumed
+
+    async def __receive_message(self, client: SocketClient) -> list[bytes]:
+        options = client.transfer_options
+        if constants.DataTransferOptions.WITH_SIZE not in options:
+            self.logger.error("Client %s has no WITH_SIZE option, cannot frame messages", client.addr)
+            return None
+
+        size_bytes = await client.reader.readexactly(constants.Options.MESSAGE_SIZE_BYTE_LENGTH)
+        message_size = int.from_bytes(size_bytes, 'big')
+        self.logger.debug("Message size received from %s: %s bytes", client.addr, message_size)
+        message = await client.reader.readexactly(message_size)
+        client.recv_allocated_bytes += message_size # StreamReader hands out a fresh bytes object
+        if not message:
+            return None
+
+        return self._decode_message(client, message, options)
+
+    async def __handle_client(self, client: SocketClient):
+        while client.is_connected:
+            if not client.auto_recv:
+                # A handshake thread owns the stream, it reads through _receive_raw_bytes
+                await self.__wait_for_auto_recv(client)
+                continue
+
+            try:
+                data = await self.__receive_message(client)
+            except (asyncio.IncompleteReadError, ConnectionError):
+                data = None
+            except ValueError as e:
+                self.logger.error("Failed to decode message from %s: %s", client.addr, e)
+                data = None
+
+            if not client.is_connected:
+                break
+
+            if not data:
+                self.logger.info("No data received from %s, disconnecting", client.addr)
+                self.disconnect_client(client)
+                break
+
+            callback = self.match_message(data, client)
+            if callback:
+                self.logger.debug("Executing callback (%s) for message from %s", callback.__name__, client.addr)
+                # Awaited, so this client's messages are still handled one at a time and in order
+                die = await self.loop.run_in_executor(self.__callback_pool, self._run_message_callback, callback, client, data)
+                if die:
+                    self.logger.info("Client %s disconnected due to callback execution", client.addr)
+                    self.disconnect_client(client)
+                    break
+            else:
+                self.logger.warning("No matching callback for message from %s", client.addr)
+                self._handle_callback(constants.SocketServerCallbacks.UNRECOGNIZED_MESSAGE, client, [bytes(field) for field in data])
+
+    async def __on_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        client_socket = writer.get_extra_info('socket')
+        addr = writer.get_extra_info('peername')
+        self._configure_client_socket(client_socket)
+        self._handle_callback(constants.SocketServerCallbacks.ON_BEFORE_CONNECT, client_socket, addr)
+
+        writer.transport.set_write_buffer_limits(high=AsyncSocketServer.WRITE_HIGH_WATER)
+        client = SocketClient(client_socket, addr, reader=reader, writer=writer)
+        self._handle_callback(constants.SocketServerCallbacks.ON_CONNECT, client)
+
+        self.clients[addr] = client
+        self._watch_idle(client)
+        self.logger.info("Accepted connection from %s", addr)
+        await self.__handle_client(client)
+
+    async def __serve(self):
+        self.loop = asyncio.get_running_loop()
+        server = await asyncio.start_server(
+            self.__on_connection,
+            sock=self.server_socket,
+            backlog=self.accept_buffer,
+            limit=AsyncSocketServer.STREAM_LIMIT,
+        )
+        async with server:
+            await server.serve_forever()
+
+    def main_loop(self):
+        self.logger.info("Entering main loop (asyncio)")
+        asyncio.run(self.__serve())
@@ -0,0 +1,162 @@
+import abc
+import asyncio
+import bisect
+import queue
+import threading
+import time
+
+class CallbackStats:
+    LATENCY_BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000, 5000)
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.submitted = 0
+        self.rejected = 0
+        self.completed = 0
+        self.failed = 0
+        self.max_queue_depth = 0
+        self.latency_histograms: dict[str, list[int]] = {} # name -> counts per bucket, last one is overflow
+
+    def on_submit(self, accepted: bool, queue_depth: int):
+        with self.__lock:
+            if not accepted:
+                self.rejected += 1
+                return
+            self.submitted += 1
+            self.max_queue_depth = max(self.max_queue_depth, queue_depth)
+
+    def on_done(self, name: str, seconds: float, failed: bool):
+        bucket = bisect.bisect_left(CallbackStats.LATENCY_BUCKETS_MS, seconds * 1000)
+        with self.__lock:
+            self.completed += 1
+            self.failed += failed
+            histogram = self.latency_histograms.setdefault(name, [0] * (len(CallbackStats.LATENCY_BUCKETS_MS) + 1))
+            histogram[bucket] += 1
+
+    def snapshot(self, queue_depth: int) -> dict:
+        with self.__lock:
+            return {
+                "queue_depth": queue_depth,
+                "max_queue_depth": self.max_queue_depth,
+                "submitted": self.submitted,
+                "rejected": self.rejected,
+                "completed": self.completed,
+                "failed": self.failed,
+                "latency_buckets_ms": list(CallbackStats.LATENCY_BUCKETS_MS),
+                "latency_histograms": {name: list(counts) for name, counts in self.latency_histograms.items()},
+            }
+
+class CallbackExecutor(abc.ABC):
+    """
+    Runs SocketServer event callbacks (ON_CONNECT, ON_DISCONNECT, ...).
+    submit() returns False when the callback was rejected instead of queued.
+    Latency is measured from submit to the end of the callback.
+    """
+
+    def __init__(self):
+        self.stats = CallbackStats()
+        self.logger = None # set by SocketServer
+
+    @abc.abstractmethod
+    def submit(self, name: str, func: callable, *args) -> bool:
+        ...
+
+    def queue_depth(self) -> int:
+        return 0
+
+    def get_stats(self) -> dict:
+        return self.stats.snapshot(self.queue_depth())
+
+    def _run(self, name: str, func: callable, args: tuple, submitted_at: float):
+        failed = False
+        try:
+            func(*args)
+        except Exception as e:
+            failed = True
+            if self.logger: self.logger.error("Callback %s raised: %s", name, e)
+        finally:
+            self.stats.on_done(name, time.perf_counter() - submitted_at, failed)
+
+class InlineCallbackExecutor(CallbackExecutor):
+    """Runs callbacks on the calling (reader) thread"""
+
+    def submit(self, name: str, func: callable, *args) -> bool:
+        self.stats.on_submit(True, 0)
+        self._run(name, func, args, time.perf_counter())
+        return True
+
+class ThreadPoolCallbackExecutor(CallbackExecutor):
+    """Fixed number of worker threads behind a bounded queue, callbacks are rejected when it is full"""
+
+    def __init__(self, max_workers: int = 8, max_queue: int = 1000):
+        super().__init__()
+        self.max_workers = max_workers
+        self.__queue = queue.Queue(maxsize=max_queue)
+        self.__workers: list[threading.Thread] = []
+        self.__workers_lock = threading.Lock()
+
+    def __worker(self):
+        while True:
+            name, func, args, submitted_at = self.__queue.get()
+            self._run(name, func, args, submitted_at)
+
+    def __ensure_workers(self):
+        if len(self.__workers) >= self.max_workers:
+            return
+        with self.__workers_lock:
+            while len(self.__workers) < self.max_workers:
+                thread = threading.Thread(target=self.__worker, daemon=True)
+                thread.start()
+                self.__workers.append(thread)
+
+    def submit(self, name: str, func: callable, *args) -> bool:
+        self.__ensure_workers()
+        try:
+            self.__queue.put_nowait((name, func, args, time.perf_counter()))
+        except queue.Full:
+            self.stats.on_submit(False, self.__queue.qsize())
+            return False
+
+        self.stats.on_submit(True, self.__queue.qsize())
+        return True
+
+    def queue_depth(self) -> int:
+        return self.__queue.qsize()
+
+class AsyncioCallbackExecutor(CallbackExecutor):
+    """Schedules callbacks on an asyncio loop, coroutine results are run as tasks"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, max_pending: int = 1000):
+        super().__init__()
+        self.loop = loop
+        self.max_pending = max_pending
+        self.__pending = 0
+        self.__pending_lock = threading.Lock()
+
+    def __call(self, name: str, func: callable, args: tuple, submitted_at: float):
+        with self.__pending_lock:
+            self.__pending -= 1
+
+        def run_and_schedule(*call_args):
+            result = func(*call_args)
+            if asyncio.iscoroutine(result):
+                self.loop.create_task(result)
+
+        self._run(name, run_and_schedule, args, submitted_at)
+
+    def submit(self, name: str, func: callable, *args) -> bool:
+        with self.__pending_lock:
+            if self.__pending >= self.max_pending:
+                accepted = False
+            else:
+                self.__pending += 1
+                accepted = True
+            depth = self.__pending
+
+        self.stats.on_submit(accepted, depth)
+        if accepted:
+            self.loop.call_soon_threadsafe(self.__call, name, func, args, time.perf_counter())
+        return accepted
+
+    def queue_depth(self) -> int:
+        return self.__pending
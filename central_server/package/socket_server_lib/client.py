@@ -1,21 +1,92 @@
 import os
 import socket
+import threading
 from package.socket_server_lib import constants
+from package.socket_server_lib.stats import ClientStats
 from Cryptodome.Cipher import AES
 
 class SocketClient:
-    def __init__(self, socket: socket.socket | None, addr: tuple, transfer_options: constants.DataTransferOptions | None = None, client_thread=None, random=None):
+    def __init__(self, socket: socket.socket | None, addr: tuple, transfer_options: constants.DataTransferOptions | None = None, client_thread=None, random=None, reader=None, writer=None):
         self.socket = socket
         self.addr = addr
         self.is_connected = True
         self.random = random if random else os.urandom(32)
         self.transfer_options = transfer_options if transfer_options else constants.DataTransferOptions.WITH_SIZE
         self.client_thread = client_thread
-        self.auto_recv = True
+        self.reader = reader # asyncio.StreamReader when served by AsyncSocketServer
+        self.writer = writer # asyncio.StreamWriter when served by AsyncSocketServer
         self.aes_obj = None
-        self.locked = False
+        self.recv_lock = threading.Lock()
+        self.send_lock = threading.Lock()
+        self.session_cipher = None # SessionCipher once ENCRYPT_AEAD is negotiated
+        self.recv_buffer = bytearray()
+        self.recv_messages = 0
+        self.recv_allocated_bytes = 0
+        self.stats = ClientStats()
+
+        # Set while the server's reader loop owns the connection, cleared while a handshake does
+        self.__reader_owns = threading.Event()
+        self.__reader_owns.set()
+        self.__owner_lock = threading.Lock()
+        self.__resume_hooks = []
         assert len(self.random) == 32, "Random value must be 32 bytes long"
         assert isinstance(self.random, bytes), "Random value must be of type bytes"
     
     def get_aes(self):
-        return AES.new(self.random, AES.MODE_CBC, self.random[:AES.block_size])
\ No newline at end of file
+        return AES.new(self.random, AES.MODE_CBC, self.random[:AES.block_size])
+
+    def get_recv_buffer(self, size: int) -> memoryview:
+        if size > constants.Options.RECV_BUFFER_REUSE_MAX:
+            self.recv_allocated_bytes += size
+            return memoryview(bytearray(size))
+        if len(self.recv_buffer) < size:
+            # Replaced instead of resized, views of the previous message may still be referenced
+            self.recv_buffer = bytearray(1 << (size - 1).bit_length())
+            self.recv_allocated_bytes += len(self.recv_buffer)
+        return memoryview(self.recv_buffer)[:size]
+
+    def shares_recv_buffer(self, field) -> bool:
+        """True if field is overwritten by the next receive, False if it can be kept without copying"""
+        return isinstance(field, memoryview) and field.obj is self.recv_buffer
+
+    @property
+    def auto_recv(self) -> bool:
+        return self.__reader_owns.is_set()
+
+    @auto_recv.setter
+    def auto_recv(self, value: bool):
+        """
+        False hands the connection over to whoever is running a handshake on it,
+        True gives it back to the reader loop and wakes it up.
+        """
+        if not value:
+            self.__reader_owns.clear()
+            return
+
+        with self.__owner_lock:
+            self.__reader_owns.set()
+            hooks, self.__resume_hooks = self.__resume_hooks, []
+        for hook in hooks:
+            hook()
+
+    def wait_for_auto_recv(self, timeout: float | None = None) -> bool:
+        return self.__reader_owns.wait(timeout)
+
+    def on_auto_recv(self, func: callable):
+        """Calls func once the reader loop owns the connection again (right away if it already does)"""
+        with self.__owner_lock:
+            if not self.__reader_owns.is_set():
+                self.__resume_hooks.append(func)
+                return
+        func()
+
+class DatagramPeer:
+    """
+    Sender of a RAW datagram, what callbacks of a RAW UDP server get instead of
+    a SocketClient. Address only: no per peer state, reply with send_datagrams.
+    """
+    __slots__ = ("socket", "addr")
+
+    def __init__(self, socket: socket.socket, addr: tuple):
+        self.socket = socket
+        self.addr = addr
@@ -18,6 +18,8 @@ class DataTransferOptions(enum.Flag):
     WITH_SIZE = enum.auto()
     ENCRYPT_AES = enum.auto()
     RAW = enum.auto()
+    BINARY_FIELDS = enum.auto() # fields are length prefixed instead of separated, negotiated per connection
+    ENCRYPT_AEAD = enum.auto() # SessionCipher (ChaCha20-Poly1305 / AES-GCM) instead of AES-CBC, negotiated per connection
 
 class Options:
     MESSAGE_SIZE_BYTE_LENGTH = 4
@@ -25,10 +27,45 @@ class Options:
     ANY_VALUE_TEMPLATE = b"\0"
     ANY_VALUE_ANY_LENGTH_TEMPLATE = b"\1"
 
+    # BINARY_FIELDS message body: version byte, then (field length, field) pairs
+    BINARY_FIELDS_VERSION = 1
+    FIELD_SIZE_BYTE_LENGTH = 4
+
+    # Reads never time out, a connection with no message for this long is dropped by the server's timer wheel.
+    # Handshakes own the connection (auto_recv off) while queued and running, so they get longer.
+    IDLE_TIMEOUT = {ServerProtocol.TCP: 15, ServerProtocol.UDP: 300}
+    HANDSHAKE_IDLE_TIMEOUT = 60
+    # TCP keepalive so the kernel notices a peer that vanished without closing the connection
+    TCP_KEEPALIVE_IDLE = 5
+    TCP_KEEPALIVE_INTERVAL = 2
+    TCP_KEEPALIVE_COUNT = 3
+
+    # UDP receive loop: datagrams drained per wakeup and the preallocated buffer for each of them
+    DATAGRAM_BATCH_SIZE = 64
+    DATAGRAM_BUFFER_SIZE = 8192
+
+    # Larger messages are received into a buffer of their own that callbacks may keep (camera frames),
+    # smaller ones reuse the client's receive buffer
+    RECV_BUFFER_REUSE_MAX = 32 * 1024
+    MAX_DATAGRAM_CLIENTS = 4096
+
 # \0 in a field means any value
 class SocketMessages:
     class AesKeyExchange:
         SERVER_HELLO = [b"exch", b"ecdh", b"aes", Options.ANY_VALUE_TEMPLATE]
         CLIENT_HELLO = [b"exch", b"ecdh",  b"aes", Options.ANY_VALUE_TEMPLATE]
         CLIENT_KEY_CONFIRM = [Options.ANY_VALUE_TEMPLATE]
-        SERVER_KEY_CONFIRM = [Options.ANY_VALUE_TEMPLATE]
\ No newline at end of file
+        SERVER_KEY_CONFIRM = [Options.ANY_VALUE_TEMPLATE]
+
+    # Sent by the client in the current framing, after the ack both sides switch to BINARY_FIELDS.
+    # The server answers with version 0 when it doesn't support the requested one.
+    class FieldFraming:
+        REQUEST = [b"framing", b"binary", Options.ANY_VALUE_TEMPLATE]
+        ACK = [b"framing", b"binary", Options.ANY_VALUE_TEMPLATE]
+
+    # Needs an ECDH key (ENCRYPT_AES) first. After the ack (still AES-CBC) both sides switch to ENCRYPT_AEAD.
+    # Request: mode, client random (hex). Ack: mode, server random (hex), the session key is derived from
+    # both (SessionCipher.derive_key). The server answers with b"none" when it won't switch.
+    class SessionCipher:
+        REQUEST = [b"cipher", Options.ANY_VALUE_TEMPLATE, Options.ANY_VALUE_TEMPLATE]
+        ACK = [b"cipher", Options.ANY_VALUE_TEMPLATE, Options.ANY_VALUE_TEMPLATE]
@@ -0,0 +1,82 @@
+import queue
+import threading
+import time
+from Cryptodome.PublicKey import ECC
+from package.socket_server_lib.callback_executor import ThreadPoolCallbackExecutor
+
+class EphemeralKeyPool:
+    """
+    Ephemeral ECDH keypairs generated ahead of time by a background thread,
+    so a reconnect storm only pays for the shared secret multiply. take() falls
+    back to generating inline (counted in generated_inline) when the pool is empty.
+    The filler pauses fill_interval between keys to stay off the ingest threads' CPU.
+    """
+
+    def __init__(self, size: int = 64, curve: str = 'P-256', fill_interval: float = 0.005):
+        self.curve = curve
+        self.fill_interval = fill_interval
+        self.generated_inline = 0
+        self.__keys = queue.Queue(maxsize=size)
+        threading.Thread(target=self.__fill, daemon=True).start()
+
+    @staticmethod
+    def generate(curve: str = 'P-256') -> tuple:
+        """Returns (private key, raw public key x || y)"""
+        privkey = ECC.generate(curve=curve)
+        pubkey = privkey.public_key()
+        x = int(pubkey.pointQ.x).to_bytes(32, 'big')
+        y = int(pubkey.pointQ.y).to_bytes(32, 'big')
+        return privkey, x + y
+
+    def __fill(self):
+        while True:
+            self.__keys.put(EphemeralKeyPool.generate(self.curve)) # blocks while the pool is full
+            time.sleep(self.fill_interval)
+
+    def take(self) -> tuple:
+        try:
+            return self.__keys.get_nowait()
+        except queue.Empty:
+            self.generated_inline += 1
+            return EphemeralKeyPool.generate(self.curve)
+
+    def available(self) -> int:
+        return self.__keys.qsize()
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.__tokens = float(burst)
+        self.__updated_at = time.monotonic()
+        self.__lock = threading.Lock()
+
+    def acquire(self):
+        """Takes one token, sleeping until one is available"""
+        while True:
+            with self.__lock:
+                now = time.monotonic()
+                self.__tokens = min(self.burst, self.__tokens + (now - self.__updated_at) * self.rate)
+                self.__updated_at = now
+                if self.__tokens >= 1:
+                    self.__tokens -= 1
+                    return
+                wait = (1 - self.__tokens) / self.rate
+            time.sleep(wait)
+
+class HandshakeScheduler(ThreadPoolCallbackExecutor):
+    """
+    Admission control for handshakes (key exchanges, re-pair confirmations).
+    At most max_concurrent run at once and they start no faster than rate per
+    second with bursts of up to burst. Up to max_pending wait in line, past
+    that submit() returns False and the caller should drop the connection.
+    Stats are the CallbackExecutor ones, latency includes the time spent waiting.
+    """
+
+    def __init__(self, max_concurrent: int = 8, rate: float = 100, burst: int = 50, max_pending: int = 2000):
+        super().__init__(max_workers=max_concurrent, max_queue=max_pending)
+        self.bucket = TokenBucket(rate, burst)
+
+    def _run(self, name: str, func: callable, args: tuple, submitted_at: float):
+        self.bucket.acquire()
+        super()._run(name, func, args, submitted_at)
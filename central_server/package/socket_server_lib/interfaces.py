@@ -0,0 +1,140 @@
+import ipaddress
+import socket
+import struct
+import threading
+import time
+
+# Linux ioctls reading one IPv4 property of an interface by name
+SIOCGIFADDR = 0x8915
+SIOCGIFBRDADDR = 0x8919
+SIOCGIFNETMASK = 0x891b
+
+class NetworkInterface:
+    def __init__(self, name: str, address: str, netmask: str, broadcast: str):
+        self.name = name
+        self.address = address
+        self.netmask = netmask
+        self.broadcast = broadcast
+
+    @property
+    def is_loopback(self) -> bool:
+        return ipaddress.IPv4Address(self.address).is_loopback
+
+    def __repr__(self):
+        return f"NetworkInterface({self.name}, {self.address}/{self.netmask}, broadcast={self.broadcast})"
+
+def _ioctl_address(sock: socket.socket, request: int, name: str) -> str:
+    import fcntl
+    ifreq = struct.pack('256s', name.encode()[:15])
+    return socket.inet_ntoa(fcntl.ioctl(sock.fileno(), request, ifreq)[20:24])
+
+def _enumerate_with_ioctl() -> list[NetworkInterface]:
+    interfaces = []
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        for _, name in socket.if_nameindex():
+            try:
+                address = _ioctl_address(sock, SIOCGIFADDR, name)
+            except OSError:
+                continue # down or no IPv4 address
+
+            netmask = _ioctl_address(sock, SIOCGIFNETMASK, name)
+            try:
+                broadcast = _ioctl_address(sock, SIOCGIFBRDADDR, name)
+            except OSError:
+                broadcast = str(ipaddress.IPv4Network(f"{address}/{netmask}", strict=False).broadcast_address)
+            interfaces.append(NetworkInterface(name, address, netmask, broadcast))
+    return interfaces
+
+def _enumerate_with_getaddrinfo() -> list[NetworkInterface]:
+    # No netmask available here, a /24 is assumed like the old broadcast address lookup did
+    addresses = {info[4][0] for info in socket.getaddrinfo(socket.gethostname(), None, socket.AF_INET)}
+    interfaces = []
+    for address in sorted(addresses, key=ipaddress.IPv4Address): # numeric, "10.x" < "192.168.x" < "172.x" as strings
+        network = ipaddress.IPv4Network(f"{address}/24", strict=False)
+        interfaces.append(NetworkInterface(address, address, str(network.netmask), str(network.broadcast_address)))
+    return interfaces
+
+def default_route_address(probe: str = "8.8.8.8") -> str | None:
+    """
+    Source address the OS picks for the default route. connect() on a UDP
+    socket only selects the route, nothing is sent. None without a route.
+    """
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.connect((probe, 80))
+            return sock.getsockname()[0]
+    except OSError:
+        return None
+
+def enumerate_interfaces() -> list[NetworkInterface]:
+    """IPv4 interfaces of this machine, read locally without sending anything"""
+    try:
+        return _enumerate_with_ioctl()
+    except (ImportError, AttributeError, OSError):
+        pass # not Linux
+    try:
+        return _enumerate_with_getaddrinfo()
+    except OSError:
+        return []
+
+class InterfaceRegistry:
+    """
+    Cached view of the local interfaces. Enumerated on first use and again
+    once the cache is older than ttl, or right away after refresh()/invalidate()
+    (SocketServer invalidates it when a broadcast fails). The enumerator and
+    route lookup can be swapped for tests or machines where the defaults don't work.
+    """
+
+    DEFAULT_TTL = 30
+
+    def __init__(self, enumerator: callable = enumerate_interfaces, ttl: float = DEFAULT_TTL, route_lookup: callable = default_route_address):
+        self.enumerator = enumerator
+        self.route_lookup = route_lookup
+        self.ttl = ttl
+        self.__interfaces: list[NetworkInterface] = []
+        self.__route_address = None
+        self.__expires_at = 0
+        self.__refresh_lock = threading.Lock()
+
+    def refresh(self) -> list[NetworkInterface]:
+        with self.__refresh_lock:
+            self.__interfaces = list(self.enumerator())
+            self.__route_address = self.route_lookup()
+            self.__expires_at = time.monotonic() + self.ttl
+            return self.__interfaces
+
+    def invalidate(self):
+        self.__expires_at = 0
+
+    def interfaces(self) -> list[NetworkInterface]:
+        if time.monotonic() >= self.__expires_at:
+            return self.refresh()
+        return self.__interfaces
+
+    def broadcast_addresses(self) -> list[str]:
+        """Broadcast address of every non loopback interface that has one, without duplicates"""
+        addresses = []
+        for interface in self.interfaces():
+            if interface.is_loopback or interface.broadcast == "0.0.0.0": # point to point links have none
+                continue
+            if interface.broadcast not in addresses:
+                addresses.append(interface.broadcast)
+        return addresses
+
+    def primary_address(self) -> str:
+        """
+        The default route's source address, the one LAN clients can reach even
+        with Hyper-V/WSL/VirtualBox adapters around. Without a route the first
+        non loopback interface, 127.0.0.1 on an isolated machine.
+        """
+        interfaces = self.interfaces()
+        address = self.__route_address
+        if address is not None and not ipaddress.IPv4Address(address).is_unspecified:
+            return address
+        for interface in interfaces:
+            if not interface.is_loopback:
+                return interface.address
+        return "127.0.0.1"
+
+# Shared by every SocketServer that isn't given its own registry
+default_registry = InterfaceRegistry()
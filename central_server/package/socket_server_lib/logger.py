@@ -0,0 +1,89 @@
+import enum
+import os
+import queue
+import sys
+import threading
+
+class LogLevel(enum.IntEnum):
+    DEBUG = 10
+    INFO = 20
+    WARNING = 30
+    ERROR = 40
+    NONE = 100
+
+class PrintSink:
+    def write(self, line: str):
+        print(line)
+
+class QueuedSink:
+    """
+    Hands lines to a background thread that writes them to another sink, so the
+    caller never blocks on stdout. Lines are dropped (and counted) when the queue is full.
+    """
+
+    def __init__(self, sink=None, max_queue: int = 10000):
+        self.sink = sink if sink else PrintSink()
+        self.dropped = 0
+        self.__queue = queue.Queue(maxsize=max_queue)
+        threading.Thread(target=self.__writer, daemon=True).start()
+
+    def __writer(self):
+        while True:
+            self.sink.write(self.__queue.get())
+
+    def write(self, line: str):
+        try:
+            self.__queue.put_nowait(line)
+        except queue.Full:
+            self.dropped += 1
+
+class Logger:
+    """
+    Level gated logger with lazy %-style arguments:
+
+        logger.debug("Frame from %s: %d bytes", client.addr, len(frame))
+
+    Disabled levels return before anything is formatted. Caller file:line is
+    taken from sys._getframe, only for levels >= caller_info_level.
+    """
+
+    def __init__(self, level: LogLevel = LogLevel.INFO, caller_info_level: LogLevel = LogLevel.ERROR, sink=None):
+        self.level = level
+        self.caller_info_level = caller_info_level
+        self.sink = sink if sink else PrintSink()
+
+    def is_enabled(self, level: LogLevel) -> bool:
+        return level >= self.level
+
+    def __log(self, level: LogLevel, message: str, args: tuple):
+        if args:
+            message = message % args
+
+        if level >= self.caller_info_level:
+            frame = sys._getframe(2)  # 0: __log, 1: error(), 2: caller
+            self.sink.write(f"{level.name} [{os.path.basename(frame.f_code.co_filename)}:{frame.f_lineno}]: {message}")
+        else:
+            self.sink.write(f"{level.name}: {message}")
+
+    def debug(self, message: str, *args):
+        if LogLevel.DEBUG >= self.level: self.__log(LogLevel.DEBUG, message, args)
+
+    def info(self, message: str, *args):
+        if LogLevel.INFO >= self.level: self.__log(LogLevel.INFO, message, args)
+
+    def warning(self, message: str, *args):
+        if LogLevel.WARNING >= self.level: self.__log(LogLevel.WARNING, message, args)
+
+    def error(self, message: str, *args):
+        if LogLevel.ERROR >= self.level: self.__log(LogLevel.ERROR, message, args)
+
+class DefaultLogger(Logger):
+    def __init__(self, level: LogLevel = LogLevel.INFO, sink=None):
+        super().__init__(level=level, caller_info_level=LogLevel.ERROR, sink=sink)
+
+class EmptyLogger:
+    def info(self, message: str, *args): pass
+    def error(self, message: str, *args): pass
+    def debug(self, message: str, *args): pass
+    def warning(self, message: str, *args): pass
+    def is_enabled(self, level: LogLevel) -> bool: return False
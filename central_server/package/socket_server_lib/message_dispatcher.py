@@ -0,0 +1,93 @@
+from package.socket_server_lib import constants
+
+class _PatternNode:
+    __slots__ = ("literals", "longest_literal", "any_value", "exact", "any_length")
+
+    def __init__(self):
+        self.literals: dict[bytes, _PatternNode] = {}
+        self.longest_literal = 0
+        self.any_value: _PatternNode | None = None
+        self.exact = None       # (order, pattern, callback) of the pattern ending at this node
+        self.any_length = None  # (order, pattern, callback) of the pattern with ANY_VALUE_ANY_LENGTH_TEMPLATE here
+
+class MessageDispatcher:
+    """
+    Message patterns compiled into a trie of their fields.
+
+    Literal fields are dict lookups, ANY_VALUE_TEMPLATE fields get their own
+    branch and ANY_VALUE_ANY_LENGTH_TEMPLATE ends the pattern. Same semantics
+    as the old linear scan: the first registered matching pattern wins and
+    registering a pattern again replaces its callback but keeps its place.
+    """
+
+    def __init__(self):
+        self.__root = _PatternNode()
+        self.__order: dict[tuple, int] = {}
+
+    def add(self, pattern: list, callback: callable):
+        pattern = tuple(pattern)
+        entry = (self.__order.setdefault(pattern, len(self.__order)), pattern, callback)
+
+        node = self.__root
+        for field in pattern:
+            if field == constants.Options.ANY_VALUE_ANY_LENGTH_TEMPLATE:
+                # Anything after it is ignored, so several patterns can end here, the first one wins
+                if node.any_length is None or entry[0] <= node.any_length[0]:
+                    node.any_length = entry
+                return
+
+            if field == constants.Options.ANY_VALUE_TEMPLATE:
+                if node.any_value is None:
+                    node.any_value = _PatternNode()
+                node = node.any_value
+            else:
+                if field not in node.literals:
+                    node.literals[field] = _PatternNode()
+                    node.longest_literal = max(node.longest_literal, len(field))
+                node = node.literals[field]
+        node.exact = entry
+
+    def match(self, data: list) -> tuple | None:
+        """Returns (pattern, callback) of the matching pattern, or None"""
+        # Walk without recursion while only one branch can match, usually the whole message
+        node = self.__root
+        index = 0
+        while index < len(data) and node.any_length is None:
+            if node.any_value is None:
+                field = data[index]
+                node = node.literals.get(bytes(field)) if len(field) <= node.longest_literal else None
+                if node is None:
+                    return None
+            elif not node.literals:
+                node = node.any_value
+            else:
+                break
+            index += 1
+
+        best = MessageDispatcher.__match(node, data, index, None)
+        return best[1:] if best else None
+
+    @staticmethod
+    def __match(node: _PatternNode, data: list, index: int, best: tuple | None) -> tuple | None:
+        if node.any_length is not None and (best is None or node.any_length[0] < best[0]):
+            best = node.any_length
+
+        if index >= len(data):
+            if index == len(data) and node.exact is not None and (best is None or node.exact[0] < best[0]):
+                best = node.exact
+            # Like the old scan, missing fields still satisfy ANY_VALUE_TEMPLATE when the pattern ends in ANY_VALUE_ANY_LENGTH_TEMPLATE
+            if node.any_value is not None:
+                best = MessageDispatcher.__match(node.any_value, data, index + 1, best)
+            return best
+
+        field = data[index]
+        # Fields longer than every literal can't match one, skips copying large payload fields
+        if node.literals and len(field) <= node.longest_literal:
+            child = node.literals.get(bytes(field))
+            if child is not None:
+                best = MessageDispatcher.__match(child, data, index + 1, best)
+
+        if node.any_value is not None:
+            best = MessageDispatcher.__match(node.any_value, data, index + 1, best)
+
+        return best
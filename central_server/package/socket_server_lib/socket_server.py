@@ -1,64 +1,73 @@
-import ipaddress
 from package.socket_server_lib import constants
 import socket
 import threading
-from package.socket_server_lib.client import SocketClient
+import time
+from package.socket_server_lib.client import DatagramPeer, SocketClient
+from package.socket_server_lib.message_dispatcher import MessageDispatcher
+from package.socket_server_lib.callback_executor import CallbackExecutor, ThreadPoolCallbackExecutor
+from package.socket_server_lib.session_cipher import SessionCipher
+from package.socket_server_lib.interfaces import InterfaceRegistry, default_registry
+from package.socket_server_lib.handshake import EphemeralKeyPool
+from package.socket_server_lib import stats
+from package.socket_server_lib.timer_wheel import TimerWheel
 from Cryptodome.PublicKey import ECC
 from Cryptodome.PublicKey.ECC import EccPoint
 from Cryptodome.Cipher import AES
 from Cryptodome.Util.Padding import pad, unpad
-import inspect
-
-sock_lock = threading.Lock()
-
-class EmptyLogger:
-    def info(self, message: str): pass
-    def error(self, message: str): pass
-    def debug(self, message: str): pass
-    def warning(self, message: str): pass
-
-import inspect
-
-class DefaultLogger:
-    def _prefix(self):
-        frame = inspect.stack()[2]  # 0: _prefix, 1: error(), 2: caller
-        filename = frame.filename.split("/")[-1]
-        lineno = frame.lineno
-        return f"[{filename}:{lineno}]"
-
-    def info(self, message: str):
-        print(f"INFO: {message}")
-
-    def error(self, message: str):
-        print(f"ERROR {self._prefix()}: {message}")
-
-    def debug(self, message: str):
-        pass  # or print(f"DEBUG: {message}")
-
-    def warning(self, message: str):
-        print(f"WARNING: {message}")
-
+from package.socket_server_lib.logger import DefaultLogger, EmptyLogger
 
 class SocketServer:
-    def __init__(self, host: str = '127.0.0.1', port: int = 8080, accept_buffer: int =1000, protocol: constants.ServerProtocol = constants.ServerProtocol.TCP, logger = None, reserve_port=True):
+    SPLIT_VIEWS_MAX_FIELDS = 16 # NUL framed messages with more fields are split into bytes instead of views
+    SCATTER_MIN_BYTES = 32 * 1024 # smaller messages are joined and sent as one buffer, copying them is cheaper than sendmsg
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 8080, accept_buffer: int =1000, protocol: constants.ServerProtocol = constants.ServerProtocol.TCP, logger = None, reserve_port=True, callback_executor: CallbackExecutor | None = None, interface_registry: InterfaceRegistry | None = None, key_pool: EphemeralKeyPool | None = None, idle_timeout: float | None = None, reuse_port=False):
         self.host = host
         self.port = port
         self.logger = (logger if logger else DefaultLogger()) if logger != 0 else EmptyLogger()
     
         if port is None:
-            self.logger.warning(f"Port is None, using a random port.")
+            self.logger.warning("Port is None, using a random port.")
             self.port = self.__get_free_port()
 
         self.accept_buffer = accept_buffer
         self.server_socket = None
         self.protocol = protocol
         self.reserve_port = reserve_port
+        # Several processes bind the same port and the kernel spreads connections between them
+        self.reuse_port = reuse_port
+        if reuse_port and not hasattr(socket, "SO_REUSEPORT"):
+            raise ValueError("SO_REUSEPORT is not supported on this platform")
 
-        self.clients = []
+        self.clients: dict[tuple, SocketClient] = {} # addr -> client
         self.callbacks: dict[constants.SocketServerCallbacks, callable] = {}
         self.message_callbacks: dict[tuple, callable] = {}
+        self.message_dispatcher = MessageDispatcher()
+
+        # UDP peers get a cached SocketClient per address, the oldest is dropped past MAX_DATAGRAM_CLIENTS.
+        # A RAW server (discovery) keeps nothing per peer, its callbacks get a DatagramPeer instead.
+        self.datagram_clients: dict[tuple, SocketClient] = {}
+        self.datagram_options = constants.DataTransferOptions.RAW
+        self.datagram_count = 0
+        self.datagram_batches = 0
+
+        self.interfaces = interface_registry if interface_registry else default_registry
+        self.__broadcast_socket = None
+
+        # Pre-generated ECDH keys for exchange_aes_key_with_ecdh, generated per exchange without one
+        self.key_pool = key_pool
 
-        self.logger.debug(f"SocketServer initialized with host={self.host}, port={self.port}, protocol={self.protocol}")
+        # Idle connections are found by the wheel checking last_seen, nothing is done per read
+        self.idle_timeout = idle_timeout if idle_timeout is not None else constants.Options.IDLE_TIMEOUT[protocol]
+        self.timer_wheel = TimerWheel(logger=self.logger)
+
+        # Where ON_CONNECT/ON_DISCONNECT/UNRECOGNIZED_MESSAGE/... callbacks run, bounded so a noisy client can't spawn threads without limit
+        self.callback_executor = callback_executor if callback_executor else ThreadPoolCallbackExecutor()
+        self.callback_executor.logger = self.logger
+
+        self.add_custom_message_callback(constants.SocketMessages.FieldFraming.REQUEST, self.__handle_field_framing_request)
+        self.add_custom_message_callback(constants.SocketMessages.SessionCipher.REQUEST, self.__handle_session_cipher_request)
+
+        self.logger.debug("SocketServer initialized with host=%s, port=%s, protocol=%s", self.host, self.port, self.protocol)
 
     def __handle_template(template: list, *args) -> list:
         if not isinstance(template, list):
@@ -82,13 +91,6 @@ class SocketServer:
         return new_template
         
 
-    def __get_broadcast_address(self):
-        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
-            s.connect(("8.8.8.8", 80))
-            ip = s.getsockname()[0]
-            net = ipaddress.IPv4Network(f"{ip}/24", strict=False)
-            return str(net.broadcast_address)
-
     def __get_free_port(self) -> int:
         with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
             s.bind((self.host, 0))
@@ -100,10 +102,12 @@ class SocketServer:
 
         if not self.reserve_port:
             self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if self.reuse_port:
+            self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
         self.server_socket.bind((self.host, self.port))
         if self.protocol != constants.ServerProtocol.UDP:
             self.server_socket.listen(self.accept_buffer)
-        self.logger.info(f"Server started on {self.host}:{self.port} with protocol {self.protocol}")
+        self.logger.info("Server started on %s:%s with protocol %s", self.host, self.port, self.protocol)
 
         if no_loop: return
         thread = threading.Thread(target=self.main_loop)
@@ -114,9 +118,9 @@ class SocketServer:
 
     def set_callback(self, callback: constants.SocketServerCallbacks, func: callable):
         if callback in self.callbacks:
-            self.logger.warning(f"Callback {callback} is already set. Overwriting.")
+            self.logger.warning("Callback %s is already set. Overwriting.", callback)
         self.callbacks[callback] = func
-        self.logger.debug(f"Callback {callback} set to {func.__name__}")
+        self.logger.debug("Callback %s set to %s", callback, func.__name__)
     
     def add_custom_message_callback(self, message_pattern: list, callback: callable):
         if not isinstance(message_pattern, list):
@@ -125,66 +129,172 @@ class SocketServer:
             raise TypeError("Callback must be callable")
         
         self.message_callbacks[tuple(message_pattern)] = callback
+        self.message_dispatcher.add(message_pattern, callback)
 
     def disconnect_client(self, client: SocketClient):
-        if client in self.clients:
-
-            client.socket.shutdown(socket.SHUT_RDWR)
-            client.socket.close()
+        # pop is atomic, only one of several concurrent disconnects gets the client
+        if self.clients.pop(client.addr, None) is None:
+            self.logger.error("Client %s not found in connected clients", client.addr)
+            return
 
-            self.clients.remove(client)
+        # Nothing retries a disconnect once the client is unregistered, teardown and ON_DISCONNECT must always finish
+        try:
+            self._close_client(client)
+        except OSError as e:
+            self.logger.warning("Error closing connection to %s: %s", client.addr, e)
+        finally:
             client.is_connected = False
-            self.logger.info(f"Client {client.addr} disconnected")
-            self.__handle_callback(constants.SocketServerCallbacks.ON_DISCONNECT, client)
-        else:
-            self.logger.error(f"Client {client.addr} not found in connected clients")
+            client.auto_recv = True # wake the reader loop so it can exit
+            self.logger.info("Client %s disconnected", client.addr)
+            self._handle_callback(constants.SocketServerCallbacks.ON_DISCONNECT, client)
+
+    def _close_client(self, client: SocketClient):
+        try:
+            client.socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass # already reset or closed by the peer (ENOTCONN), the socket still has to be closed
+        client.socket.close()
 
-    def __handle_callback(self, callback: constants.SocketServerCallbacks, *args):
+    def _handle_callback(self, callback: constants.SocketServerCallbacks, *args):
         if callback in self.callbacks:
-            self.logger.debug(f"Executing callback {callback} with args {args}")
-            thread = threading.Thread(target=self.callbacks[callback], args=args)
-            thread.daemon = True
-            thread.start()
+            self.logger.debug("Executing callback %s with args %s", callback, args)
+            if not self.callback_executor.submit(callback.value, self.callbacks[callback], *args):
+                self.logger.warning("Callback %s rejected, callback executor is full", callback)
+                return False
             return True
 
         return constants.SocketServerCallbacks.NO_CALLBACK
 
+    def get_callback_stats(self) -> dict:
+        return self.callback_executor.get_stats()
+
     def get_client(self, ip: str, port: int) -> SocketClient:
-        for client in self.clients:
-            if client.addr[0] == ip and client.addr[1] == port:
-                return client
-        return None
+        return self.clients.get((ip, port))
     
-    def __send_raw_bytes(self, client: SocketClient, data: bytes, options):
+    @staticmethod
+    def __sendmsg_all(sock: socket.socket, buffers: list):
+        if not hasattr(sock, "sendmsg"): # Windows
+            sock.sendall(b"".join(buffers))
+            return
+
+        # Usually everything goes out in the first call, the views are only built when it doesn't
+        sent = sock.sendmsg(buffers)
+        if sent == sum(map(len, buffers)):
+            return
 
+        views = [memoryview(buffer) for buffer in buffers if len(buffer)]
+        while views:
+            # sendmsg can stop anywhere, drop what went out and retry the rest
+            while sent:
+                if sent >= len(views[0]):
+                    sent -= len(views[0])
+                    views.pop(0)
+                else:
+                    views[0] = views[0][sent:]
+                    sent = 0
+            if views:
+                sent = sock.sendmsg(views)
+
+    def _send_buffers(self, client: SocketClient, buffers: list, options):
+        """Sends buffers as one message without joining them: one sendmsg on TCP, one datagram on UDP"""
         if not client.is_connected:
-            self.logger.error(f"Client {client.addr} is not connected")
+            self.logger.error("Client %s is not connected", client.addr)
             return
         try:
             if self.protocol == constants.ServerProtocol.UDP:
-                if constants.DataTransferOptions.WITH_SIZE in options:
-                    client.socket.sendto(data[:constants.Options.MESSAGE_SIZE_BYTE_LENGTH], client.addr)
-                    client.socket.sendto(data[constants.Options.MESSAGE_SIZE_BYTE_LENGTH:], client.addr)
+                if len(buffers) > 1 and hasattr(client.socket, "sendmsg"):
+                    client.socket.sendmsg(buffers, [], 0, client.addr)
                 else:
-                    client.socket.sendto(data, client.addr)
+                    client.socket.sendto(b"".join(buffers), client.addr)
+            elif len(buffers) == 1:
+                client.socket.sendall(buffers[0])
             else:
-                client.socket.sendall(data)
-            self.logger.debug(f"Sent raw bytes to {client.addr}")
+                SocketServer.__sendmsg_all(client.socket, buffers)
+            self.logger.debug("Sent raw bytes to %s", client.addr)
         except Exception as e:
-            self.logger.error(f"Error sending raw bytes to {client.addr}: {e}")
-    
-    def __data_to_bytes(self, data) -> bytes:
-        def encoding(d):
-            if isinstance(d, str): return d.encode('utf-8')
-            if isinstance(d, bytes): return d
-            if isinstance(d, int): return str(d).encode('utf-8')
-            if isinstance(d, list): return constants.Options.MESSAGE_SEPARATOR.join([encoding(item) for item in d])
-            raise TypeError(f"Unsupported data type: {type(d)}")
-        
-        return encoding(data)
-    
+            self.logger.error("Error sending raw bytes to %s: %s", client.addr, e)
+
+    @staticmethod
+    def __encode_field(d):
+        if isinstance(d, (bytes, bytearray, memoryview)): return d
+        if isinstance(d, str): return d.encode('utf-8')
+        if isinstance(d, int): return str(d).encode('utf-8')
+        if isinstance(d, list): return constants.Options.MESSAGE_SEPARATOR.join([SocketServer.__encode_field(item) for item in d])
+        raise TypeError(f"Unsupported data type: {type(d)}")
+
+    def __data_to_buffers(self, data, binary_fields=False) -> list:
+        encoding = SocketServer.__encode_field
+        if not isinstance(data, list):
+            data = [data]
+
+        if not binary_fields:
+            buffers = []
+            for field in data:
+                if buffers: buffers.append(constants.Options.MESSAGE_SEPARATOR)
+                buffers.append(encoding(field))
+            return buffers
+
+        buffers = [constants.Options.BINARY_FIELDS_VERSION.to_bytes(1, 'big')]
+        for field in data:
+            field = encoding(field)
+            buffers.append(len(field).to_bytes(constants.Options.FIELD_SIZE_BYTE_LENGTH, 'big'))
+            buffers.append(field)
+        return buffers
+
+    def send_datagrams(self, datagrams: list[tuple], options: constants.DataTransferOptions = constants.DataTransferOptions.RAW) -> int:
+        """
+        Sends (addr, data) pairs from the UDP server socket, one datagram and
+        one sendmsg call each: Python has no sendmmsg, so this only saves the
+        per call setup and logging of send_data, not syscalls. Returns how many went out.
+        """
+        sock = self.server_socket
+        scatter = hasattr(sock, "sendmsg")
+        sent = 0
+        for addr, data in datagrams:
+            buffers = self.__data_to_buffers(data)
+            if constants.DataTransferOptions.WITH_SIZE in options:
+                buffers.insert(0, sum(len(buffer) for buffer in buffers).to_bytes(constants.Options.MESSAGE_SIZE_BYTE_LENGTH, 'big'))
+            try:
+                if scatter:
+                    sock.sendmsg(buffers, [], 0, addr)
+                else:
+                    sock.sendto(b"".join(buffers), addr)
+                sent += 1
+            except OSError as e:
+                self.logger.error("Error sending datagram to %s: %s", addr, e)
+        self.logger.debug("Sent %d/%d datagrams", sent, len(datagrams))
+        return sent
+
+    @staticmethod
+    def __encrypt_cbc(cipher, buffers: list) -> list:
+        """
+        CBC over the buffers without joining them. The block aligned part of
+        each buffer is encrypted straight from it, only the under 16 bytes
+        that straddle a block boundary are copied, and the tail for padding.
+        """
+        encrypted = []
+        carry = b""
+        for buffer in buffers:
+            view = memoryview(buffer)
+            if carry:
+                taken = min(AES.block_size - len(carry), len(view))
+                carry += bytes(view[:taken])
+                view = view[taken:]
+                if len(carry) < AES.block_size:
+                    continue
+                encrypted.append(cipher.encrypt(carry))
+            aligned = len(view) - len(view) % AES.block_size
+            if aligned:
+                encrypted.append(cipher.encrypt(view[:aligned]))
+            carry = bytes(view[aligned:])
+        encrypted.append(cipher.encrypt(pad(carry, AES.block_size)))
+        return encrypted
+
+    def __data_to_bytes(self, data, binary_fields=False) -> bytes:
+        return b"".join(self.__data_to_buffers(data, binary_fields))
+
     def broadcast(self, data, target_port: int, options: constants.DataTransferOptions = constants.DataTransferOptions.WITH_SIZE):
-        data = self.__data_to_bytes(data, constants.DataTransferOptions.IS_PATTERN in options)
+        data = self.__data_to_bytes(data)
         modified_data = data
         if constants.DataTransferOptions.ENCRYPT_AES in options:
             cipher = AES.new(self.random, AES.MODE_CBC)
@@ -195,88 +305,195 @@ class SocketServer:
         if constants.DataTransferOptions.WITH_SIZE in options:
             message_size = len(modified_data).to_bytes(constants.Options.MESSAGE_SIZE_BYTE_LENGTH, 'big')
             modified_data = message_size + modified_data
-            self.logger.debug(f"Data size prepended for broadcast: {len(modified_data)} bytes")
+            self.logger.debug("Data size prepended for broadcast: %s bytes", len(modified_data))
         
-        broad_ip = self.__get_broadcast_address()
-        tmp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        tmp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
-        tmp_socket.sendto(modified_data, (broad_ip, target_port))
-        tmp_socket.close()
-        self.logger.debug(f"Broadcasted data to port {target_port}")
+        if self.__broadcast_socket is None:
+            self.__broadcast_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.__broadcast_socket.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
 
-    def send_data(self, client: SocketClient, data, options: constants.DataTransferOptions = constants.DataTransferOptions.WITH_SIZE):
-        data = self.__data_to_bytes(data)
-        modified_data = data
-        if constants.DataTransferOptions.ENCRYPT_AES in options:
-            cipher = client.get_aes()
-            modified_data = cipher.encrypt(pad(data, AES.block_size))
-            self.logger.debug(f"Data encrypted with AES for {client.addr}")
-        
+        # One datagram per interface, a camera may sit on any of the local networks
+        addresses = self.interfaces.broadcast_addresses()
+        for broad_ip in addresses:
+            try:
+                self.__broadcast_socket.sendto(modified_data, (broad_ip, target_port))
+            except OSError as e:
+                self.logger.error("Error broadcasting to %s:%s: %s", broad_ip, target_port, e)
+                self.interfaces.invalidate() # the interface may be gone, enumerate again next time
+        self.logger.debug("Broadcasted data to %s on port %s", addresses, target_port)
+
+    def __send_data(self, client: SocketClient, data, options: constants.DataTransferOptions):
+        buffers = self.__data_to_buffers(data, constants.DataTransferOptions.BINARY_FIELDS in client.transfer_options)
+        # Only frames and recordings are worth scatter-gather, everything else goes out as one joined buffer
+        joined = sum(map(len, buffers)) < SocketServer.SCATTER_MIN_BYTES
+        if joined:
+            buffers = [b"".join(buffers)]
+
+        # Flag "in" checks, & and | build new Flag members and cost more than a small message's send
+        aes = constants.DataTransferOptions.ENCRYPT_AES in options
+        if client.session_cipher is not None and (aes or constants.DataTransferOptions.ENCRYPT_AEAD in options):
+            buffers = client.session_cipher.seal(buffers)
+            self.logger.debug("Data encrypted with %s for %s", client.session_cipher.mode.decode(), client.addr)
+        elif aes:
+            buffers = [client.get_aes().encrypt(pad(buffers[0], AES.block_size))] if joined else SocketServer.__encrypt_cbc(client.get_aes(), buffers)
+            self.logger.debug("Data encrypted with AES for %s", client.addr)
+
+        message_size = sum(map(len, buffers))
         if constants.DataTransferOptions.WITH_SIZE in options:
-            message_size = len(modified_data).to_bytes(constants.Options.MESSAGE_SIZE_BYTE_LENGTH, 'big')
-            modified_data = message_size + modified_data
-            self.logger.debug(f"Data size prepended for {client.addr}: {len(modified_data)} bytes")
-        
-        self.__send_raw_bytes(client, modified_data, options)
+            buffers.insert(0, message_size.to_bytes(constants.Options.MESSAGE_SIZE_BYTE_LENGTH, 'big'))
+            self.logger.debug("Data size prepended for %s: %s bytes", client.addr, message_size)
+            message_size += constants.Options.MESSAGE_SIZE_BYTE_LENGTH
+        if joined and len(buffers) > 1:
+            buffers = [b"".join(buffers)]
+
+        client.stats.on_send(message_size)
+        self._send_buffers(client, buffers, options)
 
-    def __receive_raw_bytes(self, client: SocketClient, size: int) -> bytes:
+    def send_data(self, client: SocketClient, data, options: constants.DataTransferOptions = constants.DataTransferOptions.WITH_SIZE):
+        # Messages from different threads must not interleave on the wire, and session cipher nonces must go out in order
+        waiting_since = time.perf_counter() if client.stats.sample_next_send() else None
+        with client.send_lock:
+            if waiting_since is not None:
+                client.stats.send_lock_wait.add(time.perf_counter() - waiting_since)
+            self.__send_data(client, data, options)
+
+    def _receive_raw_bytes(self, client: SocketClient, size: int) -> memoryview:
+        """
+        Reads exactly size bytes straight into the client's reusable receive buffer.
+        The returned view is only valid until the next receive on the same client.
+        """
         try:
-            client.socket.settimeout(5)
-            def enter():
-                data = bytearray()
-                while len(data) < size:
-                    try:
-                        chunk = client.socket.recv(min(4096, size - len(data)))
-                    except socket.timeout:
-                        self.logger.error(f"Timeout receiving from {client.addr}")
-                        return b""
-
-                    if not chunk:
-                        self.logger.error(f"Client {client.addr} disconnected")
-                        return b""
-
-                    data.extend(chunk)
-                self.logger.debug(f"Received raw bytes from {client.addr}: {len(data)} bytes")
-                return bytes(data)
-            ret_val = enter()
-            client.socket.settimeout(None)
-            return ret_val
+            view = client.get_recv_buffer(size)
+            received = 0
+            while received < size:
+                n = client.socket.recv_into(view[received:], size - received)
+                if not n:
+                    self.logger.error("Client %s disconnected", client.addr)
+                    return b""
+
+                received += n
+            self.logger.debug("Received raw bytes from %s: %s bytes", client.addr, received)
+            return view
         except Exception as e:
-            self.logger.error(f"Error receiving raw bytes from {client.addr}: {e}")
+            self.logger.error("Error receiving raw bytes from %s: %s", client.addr, e)
             return b""
 
-    def receive_data(self, client: SocketClient, options: constants.DataTransferOptions = constants.DataTransferOptions.WITH_SIZE, optional_buffer_size = None) -> list[bytes]:
-        # while client.locked: pass
-        # client.locked = True
-        with sock_lock:
+    def receive_data(self, client: SocketClient, options: constants.DataTransferOptions = constants.DataTransferOptions.WITH_SIZE, optional_buffer_size = None) -> list[memoryview]:
+        """
+        Receives one message and returns its fields as memoryview slices of the
+        client's receive buffer. They are overwritten by the next receive on this
+        client, so copy (bytes(field)) anything that has to outlive the callback
+        unless client.shares_recv_buffer(field) is False.
+        """
+        # Per connection lock, cameras are received in parallel but one message at a time per socket
+        waiting_since = time.perf_counter() if client.stats.sample_next_receive() else None
+        with client.recv_lock:
+            if waiting_since is not None:
+                client.stats.recv_lock_wait.add(time.perf_counter() - waiting_since)
             if constants.DataTransferOptions.WITH_SIZE not in options and optional_buffer_size is None:
                 self.logger.error("Buffer size must be specified if WITH_SIZE option is not set")
                 return None
             
             message = None
             if constants.DataTransferOptions.WITH_SIZE in options:
-                a = self.__receive_raw_bytes(client, constants.Options.MESSAGE_SIZE_BYTE_LENGTH)
+                a = self._receive_raw_bytes(client, constants.Options.MESSAGE_SIZE_BYTE_LENGTH)
                 if not a:
-                    self.logger.error(f"Failed to receive message size from {client.addr}")
+                    self.logger.error("Failed to receive message size from %s", client.addr)
                     return None
                 message_size = int.from_bytes(a, 'big')
-                self.logger.debug(f"Message size received from {client.addr}: {message_size} bytes")
-                message = self.__receive_raw_bytes(client, message_size)
+                self.logger.debug("Message size received from %s: %s bytes", client.addr, message_size)
+                message = self._receive_raw_bytes(client, message_size)
             
             if message is None:
-                print("Before receiving raw bytes")
-                message = self.__receive_raw_bytes(client, optional_buffer_size)
-                print(f"After receiving raw bytes ({len(message)} bytes)")
+                self.logger.debug("Receiving raw bytes from %s", client.addr)
+                message = self._receive_raw_bytes(client, optional_buffer_size)
+                self.logger.debug("Received %d raw bytes from %s", len(message) if message else 0, client.addr)
             if not message:
-                self.logger.error(f"No data received from {client.addr}")
+                self.logger.error("No data received from %s", client.addr)
                 return None
 
-            if constants.DataTransferOptions.ENCRYPT_AES in options:
-                cipher = client.get_aes()
-                message = unpad(cipher.decrypt(message), AES.block_size)
-                self.logger.debug(f"Data decrypted with AES for {client.addr}")
-            
-            return message.split(constants.Options.MESSAGE_SEPARATOR)
+            return self._decode_message(client, message, options)
+
+    def _decode_message(self, client: SocketClient, message, options: constants.DataTransferOptions) -> list[memoryview]:
+        message = memoryview(message)
+        client.recv_messages += 1
+        # Flag "in" checks, & and | build new Flag members and cost more than the rest of a small message's decode
+        size_header = constants.Options.MESSAGE_SIZE_BYTE_LENGTH if constants.DataTransferOptions.WITH_SIZE in options else 0
+        aes = constants.DataTransferOptions.ENCRYPT_AES in options
+        encrypted = aes or constants.DataTransferOptions.ENCRYPT_AEAD in options
+        client.stats.on_receive(len(message) + size_header)
+        decrypt_started = time.perf_counter() if encrypted and client.stats.sampling else None
+        if encrypted and client.session_cipher is not None:
+            if message.readonly:
+                client.recv_allocated_bytes += len(message)
+            message = client.session_cipher.open(message)
+            self.logger.debug("Data decrypted with %s for %s", client.session_cipher.mode.decode(), client.addr)
+        elif aes:
+            cipher = client.get_aes()
+            if message.readonly:
+                message = memoryview(cipher.decrypt(message))
+                client.recv_allocated_bytes += len(message)
+            else:
+                cipher.decrypt(message, output=message)
+            message = unpad(message, AES.block_size)
+            self.logger.debug("Data decrypted with AES for %s", client.addr)
+
+        if decrypt_started is not None:
+            client.stats.decrypt.add(time.perf_counter() - decrypt_started)
+
+        if constants.DataTransferOptions.BINARY_FIELDS in client.transfer_options:
+            return SocketServer.__parse_binary_fields(message)
+        return SocketServer.__split_fields(message)
+
+    @staticmethod
+    def __parse_binary_fields(message: memoryview) -> list[memoryview]:
+        if len(message) == 0 or message[0] != constants.Options.BINARY_FIELDS_VERSION:
+            raise ValueError(f"Unsupported binary field framing version: {message[0] if len(message) else None}")
+
+        size_length = constants.Options.FIELD_SIZE_BYTE_LENGTH
+        fields = []
+        offset = 1
+        while offset < len(message):
+            field_size = int.from_bytes(message[offset:offset + size_length], 'big')
+            offset += size_length
+            if offset + field_size > len(message):
+                raise ValueError("Binary field runs past the end of the message")
+            fields.append(message[offset:offset + field_size])
+            offset += field_size
+        return fields
+
+    @staticmethod
+    def __split_fields(message: memoryview) -> list[memoryview]:
+        # Receive buffers and bytes are always viewed from offset 0, so the
+        # separator can be searched in the underlying object without copying
+        source = message.obj
+        separator = constants.Options.MESSAGE_SEPARATOR
+        end = len(message)
+        fields = []
+        start = 0
+        while True:
+            index = source.find(separator, start, end)
+            if index == -1:
+                fields.append(message[start:end])
+                return fields
+            fields.append(message[start:index])
+            start = index + len(separator)
+            if len(fields) >= SocketServer.SPLIT_VIEWS_MAX_FIELDS:
+                # A JPEG on this framing has hundreds of NULs, one copy and bytes.split beat a view per field there
+                return fields + bytes(message[start:]).split(separator)
+
+    def get_receive_stats(self) -> dict:
+        """Receive path allocations of the connected clients, bytes_allocated_per_message is the per frame cost"""
+        clients = list(self.clients.values())
+        messages = sum(client.recv_messages for client in clients)
+        allocated = sum(client.recv_allocated_bytes for client in clients)
+        return {
+            "messages": messages,
+            "bytes_allocated": allocated,
+            "bytes_allocated_per_message": allocated / messages if messages else 0,
+            "datagrams": self.datagram_count,
+            "datagram_batches": self.datagram_batches,
+            "datagrams_per_batch": self.datagram_count / self.datagram_batches if self.datagram_batches else 0,
+        }
 
     def receive_data_with_pattern(self, client: SocketClient, pattern: constants.SocketMessages, options: constants.DataTransferOptions = constants.DataTransferOptions.WITH_SIZE):
         if not isinstance(pattern, list):
@@ -284,7 +501,7 @@ class SocketServer:
         
         data = self.receive_data(client, options)
         if not data:
-            self.logger.error(f"No data received from {client.addr}")
+            self.logger.error("No data received from %s", client.addr)
             self.disconnect_client(client)
             return None
 
@@ -303,131 +520,346 @@ class SocketServer:
         y = int.from_bytes(raw[32:], 'big')
         return ECC.construct(curve=curve, point_x=x, point_y=y)
 
-    def exchange_aes_key_with_ecdh(self, client: SocketClient):
+    def exchange_aes_key_with_ecdh(self, client: SocketClient, resume=True):
         """
         Elliptic Curve Diffie-Hellman key exchange using pycryptodome
 
         server -> client: exch, ecdh, aes, server_pubkey
         client -> server: exch, ecdh, aes, client_pubkey
         client -> server: confirm & shared_secret
+
+        The reader loop is paused for the whole exchange and resumed afterwards,
+        even if the exchange fails. With resume=False it stays paused and the
+        caller sets auto_recv once it is ready for the client's next message.
         """
 
         client.auto_recv = False
-        server_privkey = ECC.generate(curve='P-256')
-        server_pubkey = server_privkey.public_key()
-        x = int(server_pubkey.pointQ.x).to_bytes(32, 'big')
-        y = int(server_pubkey.pointQ.y).to_bytes(32, 'big')
-        server_pubkey_bytes = x + y
+        try:
+            return self.__exchange_aes_key_with_ecdh(client)
+        finally:
+            if resume: client.auto_recv = True
 
-        self.logger.debug(f"Server ECDH public key generated for {client.addr}")
+    def __exchange_aes_key_with_ecdh(self, client: SocketClient):
+        if self.key_pool:
+            server_privkey, server_pubkey_bytes = self.key_pool.take()
+        else:
+            server_privkey, server_pubkey_bytes = EphemeralKeyPool.generate('P-256')
+
+        self.logger.debug("Server ECDH public key ready for %s", client.addr)
         self.send_data(client, SocketServer.__handle_template(constants.SocketMessages.AesKeyExchange.SERVER_HELLO, server_pubkey_bytes), constants.DataTransferOptions.WITH_SIZE)
-        self.logger.debug(f"Sent server ECDH public key ({server_pubkey_bytes.hex()})")
+        self.logger.debug("Sent server ECDH public key (%s)", server_pubkey_bytes.hex())
 
         client_pubkey = self.receive_data_with_pattern(client, constants.SocketMessages.AesKeyExchange.CLIENT_HELLO, constants.DataTransferOptions.WITH_SIZE)
         if not client_pubkey:
-            self.logger.error(f"Client ECDH public key not received from {client.addr}")
+            self.logger.error("Client ECDH public key not received from %s", client.addr)
             return False
 
         raw_client_pubkey = constants.Options.MESSAGE_SEPARATOR.join(client_pubkey[3:])
         client_pubkey_obj = self.__import_raw_pubkey(raw_client_pubkey)
         shared_point = server_privkey.d * client_pubkey_obj.pointQ
         shared_secret = int(shared_point.x).to_bytes(32, 'big')
-        self.logger.info("Shared secret:" + shared_secret.hex())
+        self.logger.debug("Shared secret: %s", shared_secret.hex())
 
         confirm_message = self.receive_data_with_pattern(client, constants.SocketMessages.AesKeyExchange.CLIENT_KEY_CONFIRM, constants.DataTransferOptions.WITH_SIZE)
         if not confirm_message:
-            self.logger.error(f"Client confirmation not received from {client.addr}")
+            self.logger.error("Client confirmation not received from %s", client.addr)
             return False
 
         client.random = shared_secret
 
         decrypted_message = unpad(client.get_aes().decrypt(confirm_message[0]), AES.block_size)
         if decrypted_message != b"confirm":
-            self.logger.error(f"Client confirmation message not received correctly from {client.addr}")
+            self.logger.error("Client confirmation message not received correctly from %s", client.addr)
             return False
         
         encrypted_message = client.get_aes().encrypt(pad(b"confirm", AES.block_size))
         self.send_data(client, SocketServer.__handle_template(constants.SocketMessages.AesKeyExchange.SERVER_KEY_CONFIRM, encrypted_message), constants.DataTransferOptions.WITH_SIZE)
-        self.logger.debug(f"Client confirmation message sent to {client.addr}")
+        self.logger.debug("Client confirmation message sent to %s", client.addr)
 
-        self.logger.debug(f"Client confirmation message received from {client.addr}")
+        self.logger.debug("Client confirmation message received from %s", client.addr)
         client.transfer_options = client.transfer_options | constants.DataTransferOptions.ENCRYPT_AES
-        client.auto_recv = True
         return True
 
+    def __handle_field_framing_request(self, client: SocketClient, fields: list[memoryview]):
+        try:
+            version = int(bytes(fields[2]))
+        except ValueError:
+            version = 0
+
+        if version != constants.Options.BINARY_FIELDS_VERSION:
+            self.logger.warning("Client %s requested unsupported field framing version %s", client.addr, bytes(fields[2]))
+            self.send_data(client, SocketServer.__handle_template(constants.SocketMessages.FieldFraming.ACK, b"0"), client.transfer_options)
+            return
+
+        # The ack still goes out in the old framing, everything after it uses the new one
+        self.send_data(client, SocketServer.__handle_template(constants.SocketMessages.FieldFraming.ACK, str(version).encode()), client.transfer_options)
+        client.transfer_options = client.transfer_options | constants.DataTransferOptions.BINARY_FIELDS
+        self.logger.info("Client %s switched to binary field framing v%s", client.addr, version)
+
+    def __handle_session_cipher_request(self, client: SocketClient, fields: list[memoryview]):
+        mode = bytes(fields[1])
+        try:
+            client_random = bytes.fromhex(bytes(fields[2]).decode())
+        except ValueError:
+            client_random = b""
+        if constants.DataTransferOptions.ENCRYPT_AES not in client.transfer_options or mode not in SessionCipher.MODES or len(client_random) != SessionCipher.RANDOM_SIZE:
+            self.logger.warning("Client %s requested session cipher %s before key exchange, unsupported or without a valid random", client.addr, mode)
+            self.send_data(client, SocketServer.__handle_template(constants.SocketMessages.SessionCipher.ACK, b"none", b"0"), client.transfer_options)
+            return
+
+        # Acked under AES-CBC, everything after it is sealed with the session cipher.
+        # client.random is the long term camera key after a repair, the randoms make every session's key new.
+        server_random = SessionCipher.new_random()
+        self.send_data(client, SocketServer.__handle_template(constants.SocketMessages.SessionCipher.ACK, mode, server_random.hex().encode()), client.transfer_options)
+        client.session_cipher = SessionCipher(mode, SessionCipher.derive_key(client.random, client_random, server_random, mode))
+        client.transfer_options = (client.transfer_options & ~constants.DataTransferOptions.ENCRYPT_AES) | constants.DataTransferOptions.ENCRYPT_AEAD
+        self.logger.info("Client %s switched to %s", client.addr, mode.decode())
+
     def match_message(self, data: list[bytes], client: SocketClient) -> callable:
-        for pattern, callback in self.message_callbacks.items():
-            if len(data) != len(pattern) and not constants.Options.ANY_VALUE_ANY_LENGTH_TEMPLATE in pattern:
-                continue
-            
-            for i in range(len(pattern)):
-                if pattern[i] == constants.Options.ANY_VALUE_ANY_LENGTH_TEMPLATE:
-                    self.logger.debug(f"Matching message found (via ANY_VALUE_ANY_LENGTH_TEMPLATE) for {client.addr}: {pattern}")
-                    return callback
-                if pattern[i] != constants.Options.ANY_VALUE_TEMPLATE and data[i] != pattern[i]:
-                    break
-            else:
-                self.logger.debug(f"Matching message found for {client.addr}: {pattern}")
-                return callback
-        
-        self.logger.warning(f"No matching message found for {client.addr}")
-        return None        
+        match = self.message_dispatcher.match(data)
+        if match is None:
+            self.logger.warning("No matching message found for %s", client.addr)
+            return None
+
+        pattern, callback = match
+        self.logger.debug("Matching message found for %s: %s", client.addr, pattern)
+        return callback
+
+    def _configure_client_socket(self, client_socket: socket.socket):
+        """Set once per connection, the socket then stays blocking with no timeout for its whole life"""
+        client_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4<<20)
+        client_socket.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        if hasattr(socket, "TCP_KEEPIDLE"): # Linux
+            client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, constants.Options.TCP_KEEPALIVE_IDLE)
+            client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, constants.Options.TCP_KEEPALIVE_INTERVAL)
+            client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPCNT, constants.Options.TCP_KEEPALIVE_COUNT)
+
+    def _watch_idle(self, client: SocketClient):
+        """Drops the client once it goes idle_timeout without a message, checked from the timer wheel"""
+        if self.idle_timeout:
+            self.timer_wheel.schedule(self.idle_timeout, self.__check_idle, client)
+
+    def __check_idle(self, client: SocketClient):
+        if not client.is_connected:
+            return
+
+        timeout = self.idle_timeout if client.auto_recv else max(self.idle_timeout, constants.Options.HANDSHAKE_IDLE_TIMEOUT)
+        idle = time.monotonic() - client.stats.last_seen
+        if idle < timeout:
+            self.timer_wheel.schedule(timeout - idle, self.__check_idle, client)
+            return
+
+        if self.protocol == constants.ServerProtocol.UDP:
+            # Only forgets the peer, a new datagram from it starts over
+            if self.datagram_clients.get(client.addr) is client:
+                del self.datagram_clients[client.addr]
+            return
+
+        self.logger.warning("Client %s idle for %.1fs, disconnecting", client.addr, idle)
+        self.disconnect_client(client)
+
+    def _run_message_callback(self, callback: callable, client: SocketClient, data: list):
+        if not client.stats.sampling:
+            return callback(client, data)
+
+        started = time.perf_counter()
+        try:
+            return callback(client, data)
+        finally:
+            client.stats.callback.add(time.perf_counter() - started)
+
+    def get_stats_snapshot(self) -> dict:
+        """Per client traffic counters keyed by "ip:port", see ClientStats"""
+        return {f"{addr[0]}:{addr[1]}": client.stats.snapshot() for addr, client in list(self.clients.items())}
+
+    def render_prometheus(self) -> str:
+        return stats.render_prometheus(self.get_stats_snapshot(), {"port": self.port})
+
+    def start_metrics_server(self, port: int, host: str = "127.0.0.1"):
+        """Serves render_prometheus() on http://host:port/metrics, returns the HTTP server"""
+        server = stats.start_metrics_server(self.render_prometheus, port, host)
+        self.logger.info("Metrics served on http://%s:%s/metrics", host, port)
+        return server
 
     def __handle_client(self, client: SocketClient):
         while client.is_connected:
-            if not client.auto_recv: continue
+            if not client.auto_recv:
+                client.wait_for_auto_recv()
+                continue
             try:
                 data = self.receive_data(client, client.transfer_options)
                 if not data:
-                    self.logger.info(f"No data received from {client.addr}, disconnecting")
+                    self.logger.info("No data received from %s, disconnecting", client.addr)
                     self.disconnect_client(client)
                     break
 
-                self.logger.debug(f"Data received from {client.addr}: {data}")
+                self.logger.debug("Data received from %s: %s", client.addr, data)
                 callback = self.match_message(data, client)
                 if callback:
-                    self.logger.debug(f"Executing callback ({callback.__name__}) for message from {client.addr}")
-                    die = callback(client, data)
+                    self.logger.debug("Executing callback (%s) for message from %s", callback.__name__, client.addr)
+                    die = self._run_message_callback(callback, client, data)
                     if die:
-                        self.logger.info(f"Client {client.addr} disconnected due to callback execution")
+                        self.logger.info("Client %s disconnected due to callback execution", client.addr)
                         self.disconnect_client(client)
                         break
                 else:
-                    self.logger.warning(f"No matching callback for message from {client.addr}")
-                    self.__handle_callback(constants.SocketServerCallbacks.UNRECOGNIZED_MESSAGE, client, data)
+                    self.logger.warning("No matching callback for message from %s", client.addr)
+                    self._handle_callback(constants.SocketServerCallbacks.UNRECOGNIZED_MESSAGE, client, [bytes(field) for field in data])
             except socket.timeout:
-                self.logger.warning(f"Socket timeout while receiving data from {client.addr}")
+                self.logger.warning("Socket timeout while receiving data from %s", client.addr)
+                break
+            except ValueError as e:
+                self.logger.error("Failed to decode message from %s: %s", client.addr, e)
+                self.disconnect_client(client)
                 break
             # except Exception as e:
-            #     self.logger.error(f"Error handling client {client.addr}: {e}")
-            #     self.__handle_callback(constants.SocketServerCallbacks.CLIENT_ERROR, client, e)
+            #     self.logger.error("Error handling client %s: %s", client.addr, e)
+            #     self._handle_callback(constants.SocketServerCallbacks.CLIENT_ERROR, client, e)
             #     break
             # except Exception as e:
-            #     self.logger.error(f"Error handling client {client.addr}: {e}")
-            #     self.__handle_callback(constants.SocketServerCallbacks.CLIENT_ERROR, client, e)
+            #     self.logger.error("Error handling client %s: %s", client.addr, e)
+            #     self._handle_callback(constants.SocketServerCallbacks.CLIENT_ERROR, client, e)
+
+    def __get_datagram_client(self, addr: tuple) -> SocketClient:
+        client = self.datagram_clients.get(addr)
+        if client is None:
+            if len(self.datagram_clients) >= constants.Options.MAX_DATAGRAM_CLIENTS:
+                del self.datagram_clients[next(iter(self.datagram_clients))]
+            client = SocketClient(self.server_socket, addr, transfer_options=self.datagram_options)
+            self.datagram_clients[addr] = client
+            self._watch_idle(client)
+        return client
+
+    def __receive_datagram_batch(self, buffers: list[bytearray]) -> list[tuple]:
+        """
+        Blocks for one datagram, then drains whatever else is already queued
+        without blocking, up to one datagram per buffer. Without MSG_DONTWAIT
+        (Windows) every batch is a single datagram.
+        """
+        dont_wait = getattr(socket, "MSG_DONTWAIT", None)
+        batch = []
+        flags = 0
+        for buffer in buffers:
+            try:
+                size, addr = self.server_socket.recvfrom_into(buffer, 0, flags)
+            except BlockingIOError:
+                break
+            batch.append((memoryview(buffer)[:size], addr))
+            if dont_wait is None:
+                break
+            flags = dont_wait
+        return batch
+
+    def __handle_datagram(self, message: memoryview, addr: tuple):
+        client = self.__get_datagram_client(addr)
+        try:
+            data = self._decode_message(client, message, client.transfer_options)
+        except ValueError as e:
+            self.logger.error("Failed to decode datagram from %s: %s", addr, e)
+            return
+
+        callback = self.match_message(data, client)
+        if callback is None:
+            self._handle_callback(constants.SocketServerCallbacks.UNRECOGNIZED_MESSAGE, client, [bytes(field) for field in data])
+            return
+
+        # Callbacks run on the receive loop, one exception must not stop it for every other peer
+        try:
+            if self._run_message_callback(callback, client, data):
+                self.datagram_clients.pop(addr, None)
+        except Exception as e:
+            self.logger.error("Datagram callback (%s) for %s raised: %s", callback.__name__, addr, e)
+
+    def __raw_datagram_loop(self):
+        """
+        Receive loop of a RAW UDP server (discovery). RAW datagrams have no size
+        header, cipher or field framing, so there is no per peer state either: no
+        SocketClient, receive stats or idle tracking, only a recvfrom, the split
+        and the dispatch. Batching the reads saved nothing here, the cost is the
+        per datagram work. Callbacks get a DatagramPeer and bytes fields.
+        """
+        sock = self.server_socket
+        sock.settimeout(None)
+        separator = constants.Options.MESSAGE_SEPARATOR
+        match = self.message_dispatcher.match
+        self.logger.info("Entering datagram loop (raw)")
+        while True:
+            try:
+                message, addr = sock.recvfrom(constants.Options.DATAGRAM_BUFFER_SIZE)
+            except OSError as e:
+                if sock.fileno() == -1:
+                    self.logger.info("Server socket closed, leaving datagram loop")
+                    return
+                self.logger.error("Error receiving datagrams: %s", e)
+                continue
+
+            self.datagram_count += 1
+            data = message.split(separator)
+            found = match(data)
+            if found is None:
+                self._handle_callback(constants.SocketServerCallbacks.UNRECOGNIZED_MESSAGE, DatagramPeer(sock, addr), data)
+                continue
+
+            # One exception must not stop the loop for every other peer
+            try:
+                found[1](DatagramPeer(sock, addr), data)
+            except Exception as e:
+                self.logger.error("Datagram callback (%s) for %s raised: %s", found[1].__name__, addr, e)
+
+    def __datagram_loop(self):
+        """
+        UDP receive loop. Datagrams are read into preallocated buffers in
+        batches and dispatched through the message callbacks; the fields are
+        views of those buffers, valid until the callback returns.
+        """
+        buffers = [bytearray(constants.Options.DATAGRAM_BUFFER_SIZE) for _ in range(constants.Options.DATAGRAM_BATCH_SIZE)]
+        self.server_socket.settimeout(None)
+        self.logger.info("Entering datagram loop")
+        while True:
+            try:
+                batch = self.__receive_datagram_batch(buffers)
+            except OSError as e:
+                if self.server_socket.fileno() == -1:
+                    self.logger.info("Server socket closed, leaving datagram loop")
+                    return
+                self.logger.error("Error receiving datagrams: %s", e)
+                continue
+
+            self.datagram_batches += 1
+            self.datagram_count += len(batch)
+            for message, addr in batch:
+                self.__handle_datagram(message, addr)
 
     def main_loop(self):
-          
+        if self.protocol == constants.ServerProtocol.UDP:
+            if self.datagram_options == constants.DataTransferOptions.RAW:
+                self.__raw_datagram_loop()
+            else:
+                self.__datagram_loop()
+            return
+
         self.logger.info("Entering main loop")
         while True:
             # try:
                 client_socket, addr = self.server_socket.accept()
-                client_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4<<20)
-                self.__handle_callback(constants.SocketServerCallbacks.ON_BEFORE_CONNECT, client_socket, addr)
+                self._configure_client_socket(client_socket)
+                self._handle_callback(constants.SocketServerCallbacks.ON_BEFORE_CONNECT, client_socket, addr)
 
                 client = SocketClient(client_socket, addr)
-                self.__handle_callback(constants.SocketServerCallbacks.ON_CONNECT, client)
+                self._handle_callback(constants.SocketServerCallbacks.ON_CONNECT, client)
 
                 transfer_options = constants.DataTransferOptions.WITH_SIZE
-                self.logger.debug(f"Default transfer options set to {transfer_options}")
+                self.logger.debug("Default transfer options set to %s", transfer_options)
 
+                # Registered before the reader starts so an immediate disconnect finds it
+                self.clients[addr] = client
+                self._watch_idle(client)
                 thread = threading.Thread(target=self.__handle_client, args=(client,), daemon=True)
                 thread.start()
                 client.client_thread = thread
 
-                self.clients.append(client)
-                self.logger.info(f"Accepted connection from {addr}")
+                self.logger.info("Accepted connection from %s", addr)
 
             # except Exception as e:
-            #     self.logger.error(f"Error in main loop: {e}")
+            #     self.logger.error("Error in main loop: %s", e)
             #     continue
\ No newline at end of file
@@ -0,0 +1,142 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class TimerStat:
+    __slots__ = ("count", "total", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def snapshot(self) -> dict:
+        return {
+            "samples": self.count,
+            "avg_ms": self.total / self.count * 1000 if self.count else 0,
+            "max_ms": self.max * 1000,
+        }
+
+class ClientStats:
+    """
+    Traffic counters of one SocketClient, cheap enough to stay on for every frame.
+
+    No locks: receive counters are only written by the client's reader (under
+    recv_lock) and send counters by senders holding send_lock. Readers of a
+    snapshot may see a message half counted, nothing worse. Timers are only
+    taken for one message in SAMPLE_EVERY.
+    """
+
+    SAMPLE_EVERY = 16
+
+    def __init__(self):
+        self.created_at = time.monotonic()
+        self.last_seen = self.created_at
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.messages_in = 0
+        self.messages_out = 0
+        self.messages_per_second = 0.0 # messages in during the last full second
+        self.sampling = False # whether the message being handled right now is timed
+
+        self.decrypt = TimerStat()
+        self.callback = TimerStat()
+        self.recv_lock_wait = TimerStat()
+        self.send_lock_wait = TimerStat()
+
+        self.__window_start = self.created_at
+        self.__window_messages = 0
+
+    def sample_next_receive(self) -> bool:
+        return self.messages_in % ClientStats.SAMPLE_EVERY == 0
+
+    def sample_next_send(self) -> bool:
+        return self.messages_out % ClientStats.SAMPLE_EVERY == 0
+
+    def on_receive(self, size: int):
+        now = time.monotonic()
+        self.sampling = self.messages_in % ClientStats.SAMPLE_EVERY == 0
+        self.bytes_in += size
+        self.messages_in += 1
+        self.last_seen = now
+
+        self.__window_messages += 1
+        if now - self.__window_start >= 1:
+            self.messages_per_second = self.__window_messages / (now - self.__window_start)
+            self.__window_start = now
+            self.__window_messages = 0
+
+    def on_send(self, size: int):
+        self.bytes_out += size
+        self.messages_out += 1
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        # A rate nobody has refreshed for a while is stale, the client went quiet
+        rate = self.messages_per_second if now - self.__window_start < 2 else 0.0
+        return {
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "messages_in": self.messages_in,
+            "messages_out": self.messages_out,
+            "messages_per_second": rate,
+            "last_seen": time.time() - (now - self.last_seen),
+            "idle_seconds": now - self.last_seen,
+            "connected_seconds": now - self.created_at,
+            "decrypt": self.decrypt.snapshot(),
+            "callback": self.callback.snapshot(),
+            "recv_lock_wait": self.recv_lock_wait.snapshot(),
+            "send_lock_wait": self.send_lock_wait.snapshot(),
+        }
+
+def render_prometheus(snapshots: dict, labels: dict | None = None) -> str:
+    """Prometheus text format for {client name: ClientStats.snapshot()}"""
+    base = "".join(f'{key}="{value}",' for key, value in (labels or {}).items())
+    counters = (
+        ("bytes_in", "counter"), ("bytes_out", "counter"),
+        ("messages_in", "counter"), ("messages_out", "counter"),
+        ("messages_per_second", "gauge"), ("last_seen", "gauge"),
+    )
+    timers = ("decrypt", "callback", "recv_lock_wait", "send_lock_wait")
+
+    lines = []
+    for name, kind in counters:
+        metric = f"socket_client_{name}" + ("_total" if kind == "counter" else "")
+        lines.append(f"# TYPE {metric} {kind}")
+        for client, snapshot in snapshots.items():
+            lines.append(f'{metric}{{{base}client="{client}"}} {snapshot[name]}')
+
+    for name in timers:
+        for field in ("avg_ms", "max_ms"):
+            metric = f"socket_client_{name}_{field}"
+            lines.append(f"# TYPE {metric} gauge")
+            for client, snapshot in snapshots.items():
+                lines.append(f'{metric}{{{base}client="{client}"}} {snapshot[name][field]}')
+    return "\n".join(lines) + "\n"
+
+def start_metrics_server(render: callable, port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serves render() as text/plain on GET /metrics from a daemon thread, call shutdown() on the result to stop it"""
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            body = render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass # scrapes would flood stdout
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,70 @@
+import threading
+import time
+
+class Timer:
+    __slots__ = ("deadline", "callback", "args", "cancelled")
+
+    def __init__(self, deadline: float, callback: callable, args: tuple):
+        self.deadline = deadline
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+class TimerWheel:
+    """
+    Hashed timing wheel: timers land in one of `slots` buckets of `tick`
+    seconds and a single thread fires a bucket per tick, so thousands of
+    connection timeouts cost one thread and O(1) per schedule. Timers further
+    out than one turn just stay in their bucket until their deadline comes
+    around. Callbacks run on the wheel thread and must not block.
+    """
+
+    def __init__(self, tick: float = 0.5, slots: int = 128, logger=None):
+        self.tick = tick
+        self.slots = slots
+        self.logger = logger
+        self.__buckets: list[list[Timer]] = [[] for _ in range(slots)]
+        self.__lock = threading.Lock()
+        self.__thread = None
+
+    def __bucket_of(self, deadline: float) -> int:
+        # The first tick boundary after the deadline, so the timer is due when its bucket fires
+        return (int(deadline / self.tick) + 1) % self.slots
+
+    def schedule(self, delay: float, callback: callable, *args) -> Timer:
+        timer = Timer(time.monotonic() + delay, callback, args)
+        with self.__lock:
+            if self.__thread is None:
+                self.__thread = threading.Thread(target=self.__run, daemon=True)
+                self.__thread.start()
+            self.__buckets[self.__bucket_of(timer.deadline)].append(timer)
+        return timer
+
+    def __run(self):
+        current = int(time.monotonic() / self.tick)
+        while True:
+            time.sleep(max(0, (current + 1) * self.tick - time.monotonic()))
+            now = time.monotonic()
+            # Catch up on every bucket passed since the last turn, e.g. after a long GC pause
+            while current < int(now / self.tick):
+                current += 1
+                self.__fire(current % self.slots, now)
+
+    def __fire(self, index: int, now: float):
+        with self.__lock:
+            bucket = self.__buckets[index]
+            due = [timer for timer in bucket if timer.deadline <= now]
+            if not due:
+                return
+            self.__buckets[index] = [timer for timer in bucket if timer.deadline > now]
+
+        for timer in due:
+            if timer.cancelled:
+                continue
+            try:
+                timer.callback(*timer.args)
+            except Exception as e:
+                if self.logger: self.logger.error("Timer callback %s raised: %s", getattr(timer.callback, "__name__", timer.callback), e)
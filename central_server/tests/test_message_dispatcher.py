@@ -0,0 +1,100 @@
+import random
+
+import pytest
+
+from package.socket_server_lib import constants
+from package.socket_server_lib.message_dispatcher import MessageDispatcher
+
+ANY = constants.Options.ANY_VALUE_TEMPLATE
+ANY_LENGTH = constants.Options.ANY_VALUE_ANY_LENGTH_TEMPLATE
+
+def linear_match(patterns: dict, data: list):
+    """SocketServer.match_message before the trie, kept as the reference"""
+    for pattern, callback in patterns.items():
+        if len(data) != len(pattern) and not ANY_LENGTH in pattern:
+            continue
+
+        try:
+            for i in range(len(pattern)):
+                if pattern[i] == ANY_LENGTH:
+                    return pattern, callback
+                if pattern[i] != ANY and data[i] != pattern[i]:
+                    break
+            else:
+                return pattern, callback
+        except IndexError:
+            # The old scan raised here for a message shorter than a literal prefix, the trie just doesn't match that pattern
+            continue
+    return None
+
+def dispatcher_of(*patterns) -> tuple:
+    dispatcher, reference = MessageDispatcher(), {}
+    for pattern, callback in patterns:
+        dispatcher.add(pattern, callback)
+        reference[tuple(pattern)] = callback
+    return dispatcher, reference
+
+def test_literal_fields():
+    dispatcher, _ = dispatcher_of(([b"ping"], "ping"), ([b"get", b"cameras"], "cameras"), ([b"get", b"camera"], "camera"))
+    assert dispatcher.match([b"ping"]) == ((b"ping",), "ping")
+    assert dispatcher.match([b"get", b"camera"]) == ((b"get", b"camera"), "camera")
+    assert dispatcher.match([b"get", b"cameras"]) == ((b"get", b"cameras"), "cameras")
+    assert dispatcher.match([b"get"]) is None
+    assert dispatcher.match([b"get", b"camera", b"extra"]) is None
+    assert dispatcher.match([b"pong"]) is None
+
+def test_any_value_matches_one_field():
+    dispatcher, _ = dispatcher_of(([b"frame", ANY, ANY], "frame"))
+    assert dispatcher.match([b"frame", b"aa:bb", b"\xff\xd8" * 1000]) == ((b"frame", ANY, ANY), "frame")
+    assert dispatcher.match([b"frame", b"aa:bb"]) is None
+    assert dispatcher.match([b"frame", b"aa:bb", b"", b""]) is None
+
+def test_any_length_ignores_the_rest():
+    dispatcher, _ = dispatcher_of(([b"log", ANY_LENGTH], "log"))
+    assert dispatcher.match([b"log"]) == ((b"log", ANY_LENGTH), "log")
+    assert dispatcher.match([b"log", b"a", b"b", b"c"]) == ((b"log", ANY_LENGTH), "log")
+    assert dispatcher.match([b"other", b"a"]) is None
+
+def test_memoryview_fields():
+    dispatcher, _ = dispatcher_of(([b"get", ANY], "get"))
+    assert dispatcher.match([memoryview(b"get"), memoryview(b"x")]) == ((b"get", ANY), "get")
+
+def test_first_registered_wins():
+    dispatcher, _ = dispatcher_of(([ANY, b"b"], "wildcard"), ([b"a", b"b"], "literal"), ([b"a", ANY_LENGTH], "any length"))
+    assert dispatcher.match([b"a", b"b"])[1] == "wildcard"
+    assert dispatcher.match([b"a", b"c"])[1] == "any length"
+
+    dispatcher, _ = dispatcher_of(([b"a", ANY_LENGTH], "any length"), ([b"a", b"b"], "literal"))
+    assert dispatcher.match([b"a", b"b"])[1] == "any length"
+
+def test_reregistering_keeps_the_place():
+    dispatcher, reference = dispatcher_of(([b"a", ANY], "first"), ([b"a", b"b"], "second"), ([b"a", ANY], "replaced"))
+    assert dispatcher.match([b"a", b"b"]) == ((b"a", ANY), "replaced")
+    assert dispatcher.match([b"a", b"b"]) == linear_match(reference, [b"a", b"b"])
+
+def test_short_and_empty_messages():
+    dispatcher, reference = dispatcher_of(([b"a", b"b", ANY_LENGTH], "long prefix"), ([b"a", ANY, ANY_LENGTH], "wildcards"), ([ANY_LENGTH], "anything"))
+    for data in ([], [b""], [b"a"], [b"a", b"b"], [b"x"]):
+        assert dispatcher.match(data) == linear_match(reference, data), data
+
+    dispatcher, reference = dispatcher_of(([b"a", b"b", ANY_LENGTH], "long prefix"))
+    for data in ([], [b""], [b"a"]):
+        assert dispatcher.match(data) is None
+        assert linear_match(reference, data) is None
+
+@pytest.mark.parametrize("seed", range(20))
+def test_same_as_linear_scan(seed):
+    rng = random.Random(seed)
+    words = [b"a", b"b", b"ab", b""]
+
+    def field():
+        return rng.choice(words + [ANY, ANY, ANY_LENGTH])
+
+    patterns = [([field() for _ in range(rng.randint(1, 4))], index) for index in range(rng.randint(1, 12))]
+    # Re-registered patterns replace the callback in place
+    patterns += [(list(rng.choice(patterns)[0]), f"again {index}") for index in range(rng.randint(0, 3))]
+    dispatcher, reference = dispatcher_of(*patterns)
+
+    for _ in range(200):
+        data = [rng.choice(words) for _ in range(rng.randint(0, 5))]
+        assert dispatcher.match(data) == linear_match(reference, data), (patterns, data)